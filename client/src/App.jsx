@@ -118,6 +118,7 @@ function App() {
         setPrediction({
           digit: data.prediction,
           confidence: data.confidence,
+          candidates: data.candidates || [],
           filename: data.filename,
           fileKey: fileKey
         });
@@ -228,6 +229,15 @@ function App() {
               <div className="confidence">
                 信頼度: {(prediction.confidence * 100).toFixed(1)}%
               </div>
+              {prediction.candidates.length > 1 && (
+                <div className="candidates">
+                  他の候補:{' '}
+                  {prediction.candidates
+                    .filter((candidate) => candidate.digit !== prediction.digit)
+                    .map((candidate) => `${candidate.digit} (${(candidate.confidence * 100).toFixed(1)}%)`)
+                    .join(', ')}
+                </div>
+              )}
               <div className="filename">
                 ファイル: {prediction.filename}
               </div>
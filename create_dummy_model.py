@@ -4,17 +4,21 @@
 MNISTデータセットの代わりに、簡単なダミーデータでモデルを訓練します。
 """
 
+import argparse
 import numpy as np
 import joblib
 import os
 from sklearn.svm import SVC
 from sklearn.model_selection import train_test_split
 
-def create_dummy_data():
+def create_dummy_data(seed=0):
     """
     ダミーの訓練データを作成します。
     各数字の特徴を模倣した784次元のベクトルを生成します。
+    同じseedからは常に同じデータを生成します。
     """
+    rng = np.random.default_rng(seed)
+
     # 各数字につき100サンプルを生成
     samples_per_digit = 100
     features = 784  # 28x28
@@ -26,7 +30,7 @@ def create_dummy_data():
         for _ in range(samples_per_digit):
             # 各数字に特徴的なパターンを持つダミーデータを生成
             # 実際のMNISTデータではありませんが、テスト用には十分です
-            data = np.random.random(features) * 0.1  # 基本的にはノイズ
+            data = rng.random(features) * 0.1  # 基本的にはノイズ
             
             # 数字に応じて特定の位置に強いシグナルを追加
             if digit == 0:
@@ -78,12 +82,13 @@ def create_dummy_data():
     
     return np.array(X), np.array(y)
 
-def create_dummy_model():
+def create_dummy_model(model_path=None, seed=0):
     """
     ダミーデータでSVMモデルを訓練し、保存します。
+    seedが同じであれば、常に同じモデルを作成します。
     """
     print("ダミーデータを生成中...")
-    X, y = create_dummy_data()
+    X, y = create_dummy_data(seed)
     
     # 訓練・テストデータに分割
     X_train, X_test, y_train, y_test = train_test_split(
@@ -102,11 +107,16 @@ def create_dummy_model():
     print(f"テストデータでの精度: {accuracy:.2f}")
     
     # モデルを保存
-    model_path = os.path.join('ml', 'svm_model.pkl')
+    model_path = model_path or os.path.join('ml', 'svm_model.pkl')
     joblib.dump(clf, model_path)
     print(f"モデルを保存しました: {model_path}")
     
     return clf
 
 if __name__ == "__main__":
-    create_dummy_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="テスト用のダミーSVMモデルを作成します")
+    parser.add_argument("-o", "--output", help="保存先（既定: ml/svm_model.pkl）")
+    parser.add_argument("--seed", type=int, default=0, help="ダミーデータの乱数シード")
+    args = parser.parse_args()
+
+    create_dummy_model(args.output, args.seed)
@@ -0,0 +1,222 @@
+"""
+訓練データのバッチ単位のデータ拡張。
+
+(N, 高さ, 幅) のuint8画像バッチに、画像ごとに異なるパラメータで次の変換を
+配列演算でまとめて適用します。
+
+- shift: 整数画素の平行移動（外側はゼロ）
+- rotate: 整数角度の回転（PILのNEARESTの回転と同じ画素の対応）
+- elastic_distort: 平滑化したランダムな変位場による弾性変形（双線形補間）
+- thicken: 3x3の最大値フィルタを画像ごとの回数だけ適用する線の太線化
+- add_noise: ガウシアンノイズ（値域で切り詰め、入力と同じdtypeで返す）
+
+augment() はこれらのパラメータを乱数で決めて順に適用します。
+augmented_batches() は訓練中に拡張しながらバッチを返すため、
+拡張後のデータセット全体をメモリに展開する必要がありません。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+
+def _per_sample(value, n, dtype=None):
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (n,))
+
+
+def shift(images, dx, dy):
+    """
+    images[i] を (dx[i], dy[i]) 画素ずらします。外側から入る画素はゼロです。
+    """
+    n, height, width = images.shape
+    dx = _per_sample(dx, n, np.intp)
+    dy = _per_sample(dy, n, np.intp)
+    margin = int(max(np.abs(dx).max(initial=0), np.abs(dy).max(initial=0)))
+    if margin == 0:
+        return images.copy()
+
+    padded = np.pad(images, ((0, 0), (margin, margin), (margin, margin)))
+    rows = (margin - dy)[:, None] + np.arange(height)
+    cols = (margin - dx)[:, None] + np.arange(width)
+    return padded[np.arange(n)[:, None, None], rows[:, :, None], cols[:, None, :]]
+
+
+@lru_cache(maxsize=None)
+def _rotation_indices(angle, size):
+    """
+    angle度回転したとき、回転後の各画素が回転前のどの画素から来るかを返します。
+    画像の外から来る画素は 高さ*幅（末尾に追加するゼロの列）を指します。
+    PILのrotate（NEARESTとfillcolor）と同じ対応になるよう、
+    画素番号を値に持つ画像をPILで回転して求めます。
+    """
+    from PIL import Image
+
+    width, height = size
+    index_image = Image.fromarray(
+        np.arange(width * height, dtype=np.int32).reshape(height, width), mode="I"
+    )
+    rotated = np.asarray(index_image.rotate(angle, fillcolor=-1), dtype=np.intp)
+    return np.where(rotated < 0, width * height, rotated).reshape(-1)
+
+
+def rotate(images, angles):
+    """
+    images[i] を angles[i] 度（整数）回転します。外側はゼロで埋めます。
+    角度ごとの画素の対応表はキャッシュし、並べ替えは全画像で1回です。
+    """
+    n, height, width = images.shape
+    if n == 0:
+        return images.copy()
+    angles = _per_sample(angles, n, np.int64)
+    unique, inverse = np.unique(angles, return_inverse=True)
+    table = np.stack(
+        [_rotation_indices(int(angle), (width, height)) for angle in unique]
+    )
+
+    flat = np.zeros((n, height * width + 1), dtype=images.dtype)
+    flat[:, :-1] = images.reshape(n, -1)
+    rotated = np.take_along_axis(flat, table[inverse.reshape(-1)], axis=1)
+    return rotated.reshape(n, height, width)
+
+
+@lru_cache(maxsize=None)
+def _gaussian_matrix(size, sigma):
+    """
+    長さsizeの信号をガウシアンで平滑化する行列（行の和が1）を返します。
+    """
+    x = np.arange(size)
+    matrix = np.exp(-((x[:, None] - x[None, :]) ** 2) / (2.0 * sigma**2))
+    return matrix / matrix.sum(axis=1, keepdims=True)
+
+
+def _bilinear(images, ys, xs):
+    """
+    images[i] を座標 (ys[i], xs[i]) で双線形補間します。外側はゼロです。
+    """
+    n, height, width = images.shape
+    padded = np.pad(images.astype(np.float32), ((0, 0), (1, 1), (1, 1)))
+    ys = np.clip(ys + 1, 0, height)
+    xs = np.clip(xs + 1, 0, width)
+    y0 = np.floor(ys).astype(np.intp)
+    x0 = np.floor(xs).astype(np.intp)
+    wy = ys - y0
+    wx = xs - x0
+    index = np.arange(n)[:, None, None]
+
+    top = padded[index, y0, x0] * (1 - wx) + padded[index, y0, x0 + 1] * wx
+    bottom = padded[index, y0 + 1, x0] * (1 - wx) + padded[index, y0 + 1, x0 + 1] * wx
+    return top * (1 - wy) + bottom * wy
+
+
+def elastic_distort(images, alpha, rng, sigma=4.0):
+    """
+    一様乱数の変位場をガウシアン（標準偏差sigma画素）で平滑化し、
+    images[i] を強さ alpha[i] で変形します（Simardらの弾性変形）。
+    """
+    n, height, width = images.shape
+    alpha = _per_sample(alpha, n, np.float64)
+
+    # (2, N, 高さ, 幅) の変位場を行列積で縦横に平滑化する
+    field = rng.uniform(-1.0, 1.0, size=(2, n, height, width))
+    field = _gaussian_matrix(height, sigma) @ field @ _gaussian_matrix(width, sigma).T
+    dy, dx = field * alpha[None, :, None, None]
+
+    ys = np.arange(height)[None, :, None] + dy
+    xs = np.arange(width)[None, None, :] + dx
+    distorted = _bilinear(images, ys, xs)
+    return np.clip(np.rint(distorted), 0, 255).astype(images.dtype)
+
+
+def _dilate(images):
+    padded = np.pad(images, ((0, 0), (1, 1), (1, 1)))
+    height, width = images.shape[1:]
+    return np.max(
+        [padded[:, y : y + height, x : x + width] for y in range(3) for x in range(3)],
+        axis=0,
+    )
+
+
+def thicken(images, iterations):
+    """
+    images[i] に3x3の最大値フィルタを iterations[i] 回適用し、線を太くします。
+    """
+    n = len(images)
+    iterations = _per_sample(iterations, n, np.intp)
+    thickened = images.copy()
+    for step in range(1, int(iterations.max(initial=0)) + 1):
+        target = iterations >= step
+        thickened[target] = _dilate(thickened[target])
+    return thickened
+
+
+def add_noise(images, std, rng, high=None):
+    """
+    images[i] に標準偏差 std[i] のガウシアンノイズを加え、0〜highで切り詰めます。
+    highの既定は整数型ならその最大値、浮動小数点型なら1です。
+    整数型の場合は四捨五入して入力と同じdtypeで返します。
+    """
+    n = len(images)
+    std = _per_sample(std, n, np.float64).reshape((n,) + (1,) * (images.ndim - 1))
+    integer = np.issubdtype(images.dtype, np.integer)
+    if high is None:
+        high = np.iinfo(images.dtype).max if integer else 1.0
+
+    noisy = images + rng.normal(0.0, 1.0, images.shape) * std
+    if integer:
+        noisy = np.rint(noisy)
+    return np.clip(noisy, 0, high).astype(images.dtype)
+
+
+def augment(
+    images,
+    rng,
+    max_shift=0,
+    max_angle=0,
+    rotation_probability=1.0,
+    elastic_alpha=0.0,
+    elastic_sigma=4.0,
+    max_thickness=0,
+    noise_std=0.0,
+):
+    """
+    (N, 高さ, 幅) のuint8画像に、画像ごとに乱数で決めたパラメータで
+    太線化（0〜max_thickness回）・弾性変形・回転（rotation_probabilityの確率で
+    -max_angle〜max_angle度）・平行移動（-max_shift〜max_shift画素）・
+    ノイズをこの順に適用したuint8配列を返します。0の変換は行いません。
+    """
+    n = len(images)
+    if max_thickness:
+        images = thicken(images, rng.integers(0, max_thickness + 1, size=n))
+    if elastic_alpha:
+        images = elastic_distort(images, elastic_alpha, rng, sigma=elastic_sigma)
+    if max_angle:
+        angles = rng.integers(-max_angle, max_angle + 1, size=n)
+        angles[rng.random(n) >= rotation_probability] = 0
+        images = rotate(images, angles)
+    if max_shift:
+        images = shift(
+            images,
+            rng.integers(-max_shift, max_shift + 1, size=n),
+            rng.integers(-max_shift, max_shift + 1, size=n),
+        )
+    if noise_std:
+        images = add_noise(images, noise_std, rng)
+    return images
+
+
+def augmented_batches(images, labels, batch_size, rng, epochs=1, **params):
+    """
+    imagesをエポックごとにシャッフルし、batch_size件ずつ augment(**params) を
+    適用した (X, y) を返すジェネレータ。Xは (B, 高さ*幅) の0〜1のfloat32です。
+    imagesはメモリマップでもよく、読み込むのは各バッチの分だけです。
+    """
+    n = len(images)
+    for _ in range(epochs):
+        order = rng.permutation(n)
+        for start in range(0, n, batch_size):
+            index = np.sort(order[start : start + batch_size])
+            batch = augment(np.asarray(images[index]), rng, **params)
+            yield (
+                batch.reshape(len(index), -1).astype(np.float32) / np.float32(255),
+                np.asarray(labels)[index],
+            )
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+RBFカーネルSVCと近似カーネルモデル（rff / nystroem）の比較ベンチマーク。
+train_simple_model.py と同じ生成データ・同じ訓練/テスト分割で各モデルを訓練し、
+テスト精度・テスト画像の正解数・予測レイテンシ・推論時のメモリ・
+アーティファクトのサイズを表示します。
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.utils import shuffle
+
+from classifiers import build_classifier
+from dataset_cache import to_float32
+from inference_engine import export_model, load_engine
+from predict import preprocess_image
+from train_simple_model import generate_digit_data
+
+TEST_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "test", "images")
+
+
+def load_fixtures():
+    """
+    ファイル名の先頭が正解の数字になっているテスト画像を読み込みます。
+    """
+    features = []
+    labels = []
+    for path in sorted(glob.glob(os.path.join(TEST_IMAGE_DIR, "digits", "*.png"))):
+        features.append(preprocess_image(path))
+        labels.append(int(os.path.basename(path)[0]))
+    return np.array(features), np.array(labels)
+
+
+def load_split(seed):
+    """
+    train_simple_model.py と同じ手順でデータを生成し、訓練/テストに分割します。
+    画素値は0〜1のfloat32です。
+    """
+    X, y = generate_digit_data(seed=seed, n_jobs=None)
+    X, y = shuffle(X, y, random_state=42)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    return to_float32(X_train), to_float32(X_test), y_train, y_test
+
+
+def measure_latency(engine, features, repeat):
+    """
+    1件ずつ予測したときの中央値とp95（ミリ秒）を返します。
+    """
+    timings = []
+    for i in range(repeat):
+        row = features[i % len(features)][None, :]
+        start = time.perf_counter()
+        engine.scores(row)
+        timings.append((time.perf_counter() - start) * 1e3)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def measure_batch(engine, features, batch_size=256):
+    """
+    batch_size件をまとめて予測したときの1件あたりの時間（ミリ秒）と、
+    その間に確保された作業メモリのピーク（バイト）を返します。
+    """
+    batch = np.resize(features, (batch_size, features.shape[1]))
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine.scores(batch)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / batch_size * 1e3, peak
+
+
+def benchmark_model(name, clf, X_train, y_train, X_test, y_test, fixtures, repeat):
+    start = time.perf_counter()
+    clf.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        artifact_path = os.path.join(directory, "model.bin")
+        export_model(clf, artifact_path)
+        artifact_size = os.path.getsize(artifact_path)
+        engine = load_engine(artifact_path)
+
+        labels = engine.scores(X_test)[0]
+        if not np.array_equal(labels, clf.predict(X_test)):
+            raise Exception(f"{name}: 推論エンジンの予測がモデルと一致しません")
+
+        fixture_X, fixture_y = fixtures
+        fixture_correct = int(np.sum(engine.scores(fixture_X)[0] == fixture_y))
+        p50, p95 = measure_latency(engine, X_test, repeat)
+        per_sample, peak = measure_batch(engine, X_test)
+
+    return {
+        "model": name,
+        "fit_seconds": fit_seconds,
+        "test_accuracy": float(np.mean(labels == y_test)),
+        "fixture_correct": fixture_correct,
+        "fixture_total": len(fixture_y),
+        "latency_p50_ms": p50,
+        "latency_p95_ms": p95,
+        "batch_ms_per_sample": per_sample,
+        "batch_peak_bytes": peak,
+        "artifact_bytes": artifact_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SVCと近似カーネルモデルの比較")
+    parser.add_argument(
+        "--components",
+        type=int,
+        nargs="+",
+        default=[250, 500, 1000, 2000],
+        help="近似カーネルの特徴写像の次元数",
+    )
+    parser.add_argument("--repeat", type=int, default=200, help="レイテンシ計測回数")
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, y_test = load_split(args.seed)
+    fixtures = load_fixtures()
+    print(f"訓練: {len(X_train)} サンプル / テスト: {len(X_test)} サンプル")
+
+    candidates = [("svc", build_classifier("svc", X_train, C=10.0))]
+    for model_type in ("rff", "nystroem"):
+        for n_components in args.components:
+            candidates.append(
+                (
+                    f"{model_type}-{n_components}",
+                    build_classifier(
+                        model_type, X_train, C=10.0, n_components=n_components
+                    ),
+                )
+            )
+
+    print(
+        f"{'モデル':<16}{'訓練(s)':>9}{'テスト精度':>11}{'画像正解':>10}"
+        f"{'p50(ms)':>9}{'p95(ms)':>9}{'一括(ms/件)':>13}{'作業メモリ':>12}"
+        f"{'ファイル':>11}"
+    )
+    for name, clf in candidates:
+        result = benchmark_model(
+            name, clf, X_train, y_train, X_test, y_test, fixtures, args.repeat
+        )
+        if name == "svc":
+            name = f"svc ({len(clf.support_vectors_)} SV)"
+        print(
+            f"{name:<16}{result['fit_seconds']:>9.2f}"
+            f"{result['test_accuracy']:>11.4f}"
+            f"{result['fixture_correct']:>6}/{result['fixture_total']:<3}"
+            f"{result['latency_p50_ms']:>9.3f}{result['latency_p95_ms']:>9.3f}"
+            f"{result['batch_ms_per_sample']:>13.4f}"
+            f"{result['batch_peak_bytes'] / 2**20:>10.1f}MB"
+            f"{result['artifact_bytes'] / 2**20:>9.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+一対一分類器の並列訓練（parallel_svc.py）のスケーリングのベンチマーク。
+同じ訓練データで svm.SVC と ParallelSVC（プロセス数ごと）を訓練し、
+訓練時間・svm.SVCに対する速度比と、サポートベクター・双対係数・切片・
+テストデータの予測が svm.SVC と一致するかを表示します。
+
+    python bench_parallel_svc.py --jobs 1 2 4 8
+    python bench_parallel_svc.py --data mnist --samples 20000
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from sklearn import svm
+
+from dataset_cache import to_float32
+from parallel_svc import ParallelSVC
+
+
+def load_data(source, n_samples, seed):
+    """
+    訓練用とテスト用の (X, y) を返します。syntheticは train_improved_model.py の
+    生成データ、mnistはローカルのMNIST（mnist_data.py）です。
+    """
+    from sklearn.model_selection import train_test_split
+
+    if source == "mnist":
+        from mnist_data import load_subset
+
+        X, y = load_subset(n_samples, "train", seed)
+    else:
+        from train_improved_model import generate_balanced_dataset
+
+        X, y = generate_balanced_dataset(seed=seed, n_jobs=None)
+        if n_samples < len(y):
+            X, _, y, _ = train_test_split(
+                X, y, train_size=n_samples, random_state=seed, stratify=y
+            )
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+    return to_float32(X_train), y_train, to_float32(X_test), y_test
+
+
+def same_model(reference, clf, X_test):
+    """
+    サポートベクター・双対係数・切片・予測がsvm.SVCと完全に一致するかを返します。
+    """
+    return (
+        np.array_equal(reference.support_, clf.support_)
+        and np.array_equal(reference._dual_coef_, clf._dual_coef_)
+        and np.array_equal(reference._intercept_, clf._intercept_)
+        and np.array_equal(reference.predict(X_test), clf.predict(X_test))
+    )
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="一対一分類器の並列訓練の比較")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1))),
+        help="比較するプロセス数（既定: CPUコア数までの1, 2, 4, 8）",
+    )
+    parser.add_argument(
+        "--data", choices=("synthetic", "mnist"), default="synthetic", help="データ"
+    )
+    parser.add_argument("--samples", type=int, default=5000, help="データの件数")
+    parser.add_argument("--C", type=float, default=10.0, help="SVMのC")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    args = parser.parse_args()
+
+    X_train, y_train, X_test, y_test = load_data(args.data, args.samples, args.seed)
+    print(f"訓練: {len(X_train)} サンプル / テスト: {len(X_test)} サンプル")
+    print(f"CPUコア数: {cpus}")
+
+    start = time.perf_counter()
+    reference = svm.SVC(kernel="rbf", C=args.C).fit(X_train, y_train)
+    serial_seconds = time.perf_counter() - start
+    accuracy = reference.score(X_test, y_test)
+    print(
+        f"svm.SVC: {serial_seconds:.2f}s  テスト精度 {accuracy:.4f}  "
+        f"サポートベクター {len(reference.support_)}"
+    )
+
+    print(f"{'プロセス数':<8}{'訓練(s)':>9}{'速度比':>8}{'SVCと一致':>10}")
+    for n_jobs in args.jobs:
+        start = time.perf_counter()
+        clf = ParallelSVC(C=args.C, n_jobs=n_jobs).fit(X_train, y_train)
+        seconds = time.perf_counter() - start
+        identical = "はい" if same_model(reference, clf, X_test) else "いいえ"
+        print(
+            f"{n_jobs:<8}{seconds:>9.2f}{serial_seconds / seconds:>8.2f}{identical:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
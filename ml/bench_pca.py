@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+PCAの次元数kと予測レイテンシ・精度の関係を調べるスイープ。
+train_simple_model.py と同じ生成データ・同じ訓練/テスト分割で、
+kを変えてモデルを訓練し、bench_models.py と同じ項目を表示します。
+k=0 はPCAなし（784次元）です。
+"""
+
+import argparse
+
+from bench_models import benchmark_model, load_fixtures, load_split
+from classifiers import DEFAULT_COMPONENTS, MODEL_TYPES, build_classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PCAの次元数のスイープ")
+    parser.add_argument(
+        "--k",
+        type=int,
+        nargs="+",
+        default=[0, 16, 32, 50, 100, 200],
+        help="PCAの次元数（0はPCAなし）",
+    )
+    parser.add_argument("--model", choices=MODEL_TYPES, default="svc")
+    parser.add_argument("--components", type=int, default=DEFAULT_COMPONENTS)
+    parser.add_argument("--repeat", type=int, default=200, help="レイテンシ計測回数")
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, y_test = load_split(args.seed)
+    fixtures = load_fixtures()
+    print(f"訓練: {len(X_train)} サンプル / テスト: {len(X_test)} サンプル")
+    print(f"モデル: {args.model}")
+
+    print(
+        f"{'k':>5}{'訓練(s)':>9}{'テスト精度':>11}{'画像正解':>10}"
+        f"{'p50(ms)':>9}{'p95(ms)':>9}{'一括(ms/件)':>13}{'ファイル':>11}"
+    )
+    for k in args.k:
+        clf = build_classifier(
+            args.model,
+            X_train,
+            C=10.0,
+            n_components=args.components,
+            pca=k or None,
+        )
+        result = benchmark_model(
+            f"pca-{k}", clf, X_train, y_train, X_test, y_test, fixtures, args.repeat
+        )
+        print(
+            f"{k or 784:>5}{result['fit_seconds']:>9.2f}"
+            f"{result['test_accuracy']:>11.4f}"
+            f"{result['fixture_correct']:>6}/{result['fixture_total']:<3}"
+            f"{result['latency_p50_ms']:>9.3f}{result['latency_p95_ms']:>9.3f}"
+            f"{result['batch_ms_per_sample']:>13.4f}"
+            f"{result['artifact_bytes'] / 2**20:>9.2f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+画像前処理のマイクロベンチマーク。
+PILベースの従来実装とNumPyベースのpreprocess_arrayを、テスト画像と
+大きめの合成画像で比較し、出力の一致と処理時間を表示します。
+--large を指定すると、スマートフォン写真相当の大きなJPEG/PNGファイルで
+縮小デコード（draft + reduce）の高速パスと従来の処理を比較します。
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from predict import (
+    detect_background_color,
+    load_model,
+    preprocess_array,
+    score_features,
+)
+
+TEST_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "test", "images")
+
+
+def legacy_detect_background_color(image):
+    """
+    getpixelのループで縁をサンプリングする従来の背景色検出（比較用）。
+    """
+    width, height = image.size
+    pixels = [
+        image.getpixel((0, 0)),
+        image.getpixel((width - 1, 0)),
+        image.getpixel((0, height - 1)),
+        image.getpixel((width - 1, height - 1)),
+    ]
+    for i in range(0, width, max(1, width // 10)):
+        pixels.append(image.getpixel((i, 0)))
+        pixels.append(image.getpixel((i, height - 1)))
+    for i in range(0, height, max(1, height // 10)):
+        pixels.append(image.getpixel((0, i)))
+        pixels.append(image.getpixel((width - 1, i)))
+    return "white" if np.mean(pixels) > 127 else "black"
+
+
+def legacy_preprocess(image):
+    """
+    正方形キャンバスに貼り付けてからリサイズする従来の前処理（比較用）。
+    """
+    image = image.convert("L")
+    if legacy_detect_background_color(image) == "white":
+        image = ImageOps.invert(image)
+
+    width, height = image.size
+    max_dim = max(width, height)
+    square_image = Image.new("L", (max_dim, max_dim), color=0)
+    square_image.paste(image, ((max_dim - width) // 2, (max_dim - height) // 2))
+    resized_image = square_image.resize((28, 28), Image.Resampling.LANCZOS)
+    return (np.array(resized_image).astype(np.float32) / 255.0).flatten()
+
+
+def load_images(sizes):
+    """
+    テスト画像と、テスト画像を拡大・横長にした合成画像を読み込みます。
+    """
+    images = {}
+    for path in sorted(glob.glob(os.path.join(TEST_IMAGE_DIR, "*", "*.png"))):
+        with Image.open(path) as image:
+            images[os.path.relpath(path, TEST_IMAGE_DIR)] = image.convert("L")
+
+    base = images.get(os.path.join("digits", "5.png"))
+    if base is not None:
+        for size in sizes:
+            images[f"synthetic {size}x{size * 3 // 4}"] = base.resize(
+                (size, size * 3 // 4), Image.Resampling.BILINEAR
+            )
+    return images
+
+
+def time_call(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - start) / repeat
+
+
+def run_benchmark(repeat=20, sizes=(256, 1024, 3000), tolerance=1e-6):
+    images = load_images(sizes)
+    max_diff = 0.0
+    mismatched_bg = 0
+
+    print(f"{'画像':<28}{'背景検出(従来/新)':>22}{'前処理(従来/新)':>22}{'倍率':>8}")
+    for name, image in images.items():
+        pixels = np.asarray(image)
+        exact = preprocess_array(pixels, fast=False)
+        diff = np.abs(legacy_preprocess(image) - exact).max()
+        max_diff = max(max_diff, float(diff))
+        if legacy_detect_background_color(image) != detect_background_color(pixels):
+            mismatched_bg += 1
+
+        n = repeat if image.size[0] <= 256 else max(1, repeat // 10)
+        bg_old = time_call(legacy_detect_background_color, image, n)
+        bg_new = time_call(detect_background_color, pixels, n)
+        pre_old = time_call(legacy_preprocess, image, n)
+        pre_new = time_call(lambda p: preprocess_array(p, fast=False), pixels, n)
+
+        print(
+            f"{name:<28}"
+            f"{bg_old * 1e6:>10.1f}/{bg_new * 1e6:<8.1f}us"
+            f"{pre_old * 1e3:>12.3f}/{pre_new * 1e3:<7.3f}ms"
+            f"{pre_old / pre_new:>7.2f}x"
+        )
+
+    print(f"\n最大差分: {max_diff:.2e} (許容値: {tolerance:.0e})")
+    print(f"背景色判定の不一致: {mismatched_bg}件")
+    return max_diff <= tolerance and mismatched_bg == 0
+
+
+def legacy_load_and_preprocess(path):
+    with Image.open(path) as image:
+        return legacy_preprocess(image)
+
+
+def fast_load_and_preprocess(path):
+    with Image.open(path) as image:
+        return preprocess_array(image)
+
+
+def write_large_fixtures(directory, size=(3024, 4032)):
+    """
+    digits/のテスト画像を縦長の大きな画像に拡大し、JPEGとPNGで書き出します。
+    """
+    digit_dir = os.path.join(TEST_IMAGE_DIR, "digits")
+    fixtures = []
+    for name in sorted(os.listdir(digit_dir)):
+        if not name.endswith(".png"):
+            continue
+        with Image.open(os.path.join(digit_dir, name)) as image:
+            image = image.convert("RGB").resize(
+                (size[0], size[0]), Image.Resampling.BICUBIC
+            )
+        canvas = Image.new("RGB", size, image.getpixel((0, 0)))
+        canvas.paste(image, (0, (size[1] - size[0]) // 2))
+
+        digit = int(name.split("_")[0].split(".")[0])
+        for ext in ("jpg", "png"):
+            path = os.path.join(directory, f"{os.path.splitext(name)[0]}.{ext}")
+            canvas.save(path, **({"quality": 90} if ext == "jpg" else {}))
+            fixtures.append((path, digit))
+    return fixtures
+
+
+def run_large_benchmark(repeat=3):
+    """
+    大きな画像ファイルで、読み込みから前処理までを従来実装と高速パスで比較します。
+    """
+    model_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+    clf = load_model(model_path) if os.path.exists(model_path) else None
+
+    with tempfile.TemporaryDirectory() as directory:
+        fixtures = write_large_fixtures(directory)
+
+        print(f"\n{'形式':<6}{'従来':>12}{'高速パス':>12}{'倍率':>8}{'最大差分':>12}")
+        agreed = legacy_correct = fast_correct = total = 0
+        for ext in ("jpg", "png"):
+            paths = [path for path, _ in fixtures if path.endswith(ext)]
+            digits = [digit for path, digit in fixtures if path.endswith(ext)]
+            old = np.mean(
+                [time_call(legacy_load_and_preprocess, p, repeat) for p in paths]
+            )
+            new = np.mean(
+                [time_call(fast_load_and_preprocess, p, repeat) for p in paths]
+            )
+
+            legacy = np.vstack([legacy_load_and_preprocess(p) for p in paths])
+            fast = np.vstack([fast_load_and_preprocess(p) for p in paths])
+            diff = np.abs(legacy - fast).max()
+            print(
+                f"{ext:<6}{old * 1e3:>10.1f}ms{new * 1e3:>10.1f}ms"
+                f"{old / new:>7.1f}x{diff:>12.4f}"
+            )
+
+            if clf is not None:
+                legacy_digits = [r["digit"] for r in score_features(clf, legacy)]
+                fast_digits = [r["digit"] for r in score_features(clf, fast)]
+                agreed += sum(a == b for a, b in zip(legacy_digits, fast_digits))
+                legacy_correct += sum(a == b for a, b in zip(legacy_digits, digits))
+                fast_correct += sum(a == b for a, b in zip(fast_digits, digits))
+                total += len(paths)
+
+        if clf is None:
+            print("モデルファイルがないため予測結果の比較を省略しました")
+        else:
+            print(f"予測結果の一致: {agreed}/{total}")
+            print(
+                f"正解数: 従来 {legacy_correct}/{total}, 高速パス {fast_correct}/{total}"
+            )
+        return clf is None or agreed == total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画像前処理のマイクロベンチマーク")
+    parser.add_argument("--repeat", type=int, default=20, help="1画像あたりの反復回数")
+    parser.add_argument(
+        "--large", action="store_true", help="大きな画像ファイルの高速パスも比較する"
+    )
+    args = parser.parse_args()
+
+    ok = run_benchmark(repeat=args.repeat)
+    if args.large:
+        ok = run_large_benchmark() and ok
+
+    if not ok:
+        print("従来実装との出力が一致しません")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+train_with_test_images.py のテスト画像の重み付け方法の比較ベンチマーク。
+テスト画像を複製してノイズを加える方法と、複製せずにsample_weightで
+重みを付ける方法について、訓練時間・最大RSS・テスト画像の正解数・
+別シードの合成データでの精度を表示します。
+各構成は新しいプロセスで訓練するため、最大RSSは構成ごとの値です。
+
+    python bench_sample_weights.py --configs 50:50 1:50 5:50 --model svc
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def parse_config(text):
+    """
+    「複製数:重み」の形式の構成を (copies, weight) に変換します。
+    """
+    try:
+        copies, weight = text.split(":")
+        return int(copies), float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"複製数:重み の形式で指定してください: {text}"
+        )
+
+
+def run_config(copies, weight, model_type, seed):
+    """
+    1つの構成でデータを作成して訓練し、計測結果を返します。
+    """
+    from bench_models import load_fixtures
+    from bench_suite import peak_rss
+    from classifiers import build_classifier, fit_classifier
+    from dataset_cache import to_float32
+    from train_with_test_images import build_hybrid_dataset, generate_synthetic_data
+
+    start = time.perf_counter()
+    X, y, weights = build_hybrid_dataset(
+        seed, n_jobs=1, fixture_weight=weight, fixture_copies=copies
+    )
+    data_seconds = time.perf_counter() - start
+
+    clf = build_classifier(model_type, X, C=1.0)
+    start = time.perf_counter()
+    fit_classifier(clf, X, y, sample_weight=weights)
+    fit_seconds = time.perf_counter() - start
+
+    fixture_X, fixture_y = load_fixtures()
+    holdout_X, holdout_y = generate_synthetic_data(seed + 1, n_jobs=1)
+    holdout_X = to_float32(holdout_X)
+    result = {
+        "copies": copies,
+        "weight": weight,
+        "samples": len(X),
+        "data_bytes": X.nbytes,
+        "data_seconds": data_seconds,
+        "fit_seconds": fit_seconds,
+        "peak_rss_bytes": peak_rss(),
+        "fixture_correct": int(np.sum(clf.predict(fixture_X) == fixture_y)),
+        "fixture_total": len(fixture_y),
+        "holdout_accuracy": float(clf.score(holdout_X, holdout_y)),
+    }
+    if hasattr(clf, "support_vectors_"):
+        result["support_vectors"] = len(clf.support_vectors_)
+    return result
+
+
+def measure_config(copies, weight, model_type, seed):
+    """
+    新しいプロセスで run_config を実行し、その結果を返します。
+    """
+    completed = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--run",
+            f"{copies}:{weight:g}",
+            "--model",
+            model_type,
+            "--seed",
+            str(seed),
+        ],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if completed.returncode != 0:
+        raise Exception(f"{copies}:{weight:g} の計測に失敗しました: {completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="テスト画像の重み付け方法の比較")
+    parser.add_argument(
+        "--configs",
+        type=parse_config,
+        nargs="+",
+        default=[(50, 50.0), (1, 50.0), (5, 50.0)],
+        metavar="COPIES:WEIGHT",
+        help="複製数:テスト画像1枚あたりの合計の重み（既定: 50:50 1:50 5:50）",
+    )
+    parser.add_argument(
+        "--model", choices=("svc", "rff", "nystroem"), default="svc", help="モデル"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    parser.add_argument("--run", type=parse_config, help=argparse.SUPPRESS)
+    parser.add_argument("-o", "--output", help="結果をJSONで書き出すパス")
+    args = parser.parse_args()
+
+    if args.run:
+        # 子プロセス: 計測結果だけを最後の行にJSONで出力する
+        result = run_config(*args.run, args.model, args.seed)
+        print(json.dumps(result))
+        return
+
+    print(
+        f"{'複製:重み':<10}{'サンプル':>9}{'データ':>10}{'訓練(s)':>9}"
+        f"{'最大RSS':>10}{'画像正解':>10}{'合成精度':>10}{'SV数':>7}"
+    )
+    results = []
+    for copies, weight in args.configs:
+        result = measure_config(copies, weight, args.model, args.seed)
+        results.append(result)
+        print(
+            f"{f'{copies}:{weight:g}':<10}{result['samples']:>9}"
+            f"{result['data_bytes'] / 2**20:>8.1f}MB"
+            f"{result['fit_seconds']:>9.2f}"
+            f"{result['peak_rss_bytes'] / 2**20:>8.1f}MB"
+            f"{result['fixture_correct']:>6}/{result['fixture_total']:<3}"
+            f"{result['holdout_accuracy']:>10.4f}"
+            f"{result.get('support_vectors', '-'):>7}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"model": args.model, "seed": args.seed, "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+predict.py のコールドスタート時間の計測と回帰チェック。
+新しいPythonプロセスで1枚の画像を予測する時間を複数回計測し、中央値を
+コミット済みのベースライン（baselines/startup.json）と比較します。
+中央値がベースラインの (1 + tolerance) 倍を超えた場合は終了コード1で終了します。
+同じ比較は pytest -m benchmark test_startup.py でも実行できます。
+
+計測には訓練済みモデルではなく、reference_model() が一時ディレクトリに書き出す
+小さなRBF SVCのアーティファクトを使います。そのため、モデルを訓練していない
+チェックアウトでも同じ条件で計測できます。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGE = os.path.join(ML_DIR, "..", "test", "images", "digits", "5.png")
+DEFAULT_BASELINE = os.path.join(ML_DIR, "baselines", "startup.json")
+# ベースラインに対して許容する増加率の既定値（CIのマシンとの差を見込んで広めにとる）
+DEFAULT_TOLERANCE = 1.0
+
+
+def reference_model(path):
+    """
+    計測用の小さなRBF SVC（乱数の200サンプル・10クラス）を訓練し、
+    推論エンジンのアーティファクトとしてpathに書き出します。
+    """
+    import numpy as np
+    from sklearn import svm
+
+    from inference_engine import export_model
+
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784), dtype=np.float32)
+    y = np.arange(200) % 10
+    export_model(svm.SVC(kernel="rbf", C=10.0).fit(X, y), path)
+    return path
+
+
+def measure_cold_start(image_path, runs, model_path=None):
+    """
+    predict.py を新しいプロセスで runs 回実行し、各回の経過時間（秒）を返します。
+    model_pathを指定した場合は PREDICT_MODEL_PATH でそのモデルを使わせます。
+    """
+    command = [sys.executable, os.path.join(ML_DIR, "predict.py"), image_path]
+    env = dict(os.environ)
+    if model_path is not None:
+        env["PREDICT_MODEL_PATH"] = model_path
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True, env=env)
+        timings.append(time.perf_counter() - start)
+
+        if completed.returncode != 0:
+            raise Exception(f"predict.py の実行に失敗しました: {completed.stdout}")
+    return timings
+
+
+def measure_reference(image_path=DEFAULT_IMAGE, runs=5):
+    """
+    計測用モデルでのコールドスタート時間の中央値（秒）を返します。
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = reference_model(os.path.join(directory, "startup-model.bin"))
+        return statistics.median(measure_cold_start(image_path, runs, model_path))
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    """
+    ベースラインを読み込みます。ファイルがない場合はNoneを返します。
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="predict.py のコールドスタート計測")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="予測する画像")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="ベースライン")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        help="ベースラインに対して許容する増加率"
+        "（既定: ベースラインの tolerance。1.0 = 2倍まで）",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="計測結果をベースラインに保存"
+    )
+    args = parser.parse_args()
+
+    median = measure_reference(args.image, args.runs)
+    print(f"コールドスタート中央値: {median * 1e3:.1f}ms ({args.runs}回)")
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        tolerance = args.threshold
+        if tolerance is None:
+            tolerance = baseline["tolerance"] if baseline else DEFAULT_TOLERANCE
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "median_seconds": median,
+                    "tolerance": tolerance,
+                    "runs": args.runs,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return
+
+    if baseline is None:
+        print(
+            f"ベースラインがありません: {args.baseline}"
+            "（--update-baseline で作成してください）"
+        )
+        sys.exit(1)
+
+    tolerance = args.threshold
+    if tolerance is None:
+        tolerance = baseline.get("tolerance", DEFAULT_TOLERANCE)
+    limit = baseline["median_seconds"] * (1 + tolerance)
+    print(
+        f"ベースライン: {baseline['median_seconds'] * 1e3:.1f}ms "
+        f"(上限: {limit * 1e3:.1f}ms)"
+    )
+    if median > limit:
+        print("コールドスタート時間がベースラインを超えて悪化しています")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
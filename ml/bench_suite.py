@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+推論処理の段階別ベンチマーク。
+test/images の digits・edge_cases・invalid の画像を使い、次の段階を別々に
+計測して p50 / p95 / p99 と段階ごとの最大RSSを表示します。
+
+    background     detect_background_color（デコード済みの画素）
+    preprocess     preprocess_image（ファイルのデコードから28x28まで）
+    model_load     load_model（同じプロセス内での再読み込み）
+    scores         推論エンジンの予測（ラベルと決定値を1回で求める）
+    predict        scikit-learnの predict（pickleのモデルのみ）
+    decision       scikit-learnの decision_function（pickleのモデルのみ）
+    end_to_end     predict_digit（読み込み済みモデル、キャッシュなし）
+
+--output で結果をJSONに書き出し、--baseline のJSONと比較します。
+いずれかの段階の --metric がしきい値を超えて悪化した場合と、ベースラインが
+ない場合は終了コード1で終了します。ベースラインは訓練済みのモデルとマシンに
+依存するため、--update-baseline で各環境に作成します（コミットしません）。
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from predict import (
+    detect_background_color,
+    load_model,
+    predict_digit,
+    preprocess_image,
+    to_grayscale_array,
+)
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_IMAGE_DIR = os.path.join(ML_DIR, "..", "test", "images")
+FIXTURE_SETS = ("digits", "edge_cases", "invalid")
+DEFAULT_BASELINE = os.path.join(ML_DIR, "baselines", "bench_suite.json")
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_bytes")
+
+
+def load_fixture_paths():
+    """
+    テスト画像のパスを {セット名: [パス, ...]} で返します。
+    """
+    fixtures = {}
+    for name in FIXTURE_SETS:
+        paths = sorted(glob.glob(os.path.join(TEST_IMAGE_DIR, name, "*.png")))
+        if not paths:
+            raise Exception(f"テスト画像が見つかりません: {name}")
+        fixtures[name] = paths
+    return fixtures
+
+
+def peak_rss():
+    """
+    このプロセスの最大RSS（バイト）を返します。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            return int(f.read().split("VmHWM:")[1].split()[0]) * 1024
+    except (OSError, IndexError):
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _reset_peak_rss():
+    """
+    段階ごとの最大RSSを測れるよう、Linuxでは最大RSSをリセットします。
+    リセットできない環境では、それまでの最大値が引き継がれます。
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def summarize(samples):
+    """
+    所要時間（秒）のリストから百分位数（ミリ秒）をまとめた辞書を返します。
+    """
+    milliseconds = np.asarray(samples) * 1e3
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        "n": len(samples),
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def measure(function, inputs, repeat, warmup=1):
+    """
+    inputsの各要素について function を repeat 回ずつ呼び出し、
+    呼び出しごとの所要時間と、計測中の最大RSSをまとめた辞書を返します。
+    """
+    for _ in range(warmup):
+        for item in inputs:
+            function(item)
+
+    _reset_peak_rss()
+    samples = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            function(item)
+            samples.append(time.perf_counter() - start)
+    return {**summarize(samples), "peak_rss_bytes": peak_rss()}
+
+
+def run_suite(model_path=None, repeat=20, load_repeat=10):
+    """
+    すべての段階を計測し、JSONに書き出せる辞書を返します。
+    """
+    from PIL import Image
+
+    fixtures = load_fixture_paths()
+    paths = [path for name in FIXTURE_SETS for path in fixtures[name]]
+
+    pixels = []
+    for path in paths:
+        with Image.open(path) as image:
+            pixels.append(to_grayscale_array(image))
+
+    engine = load_model(model_path)
+    features = np.stack([preprocess_image(path) for path in paths])
+    rows = list(features.reshape(len(paths), 1, -1))
+
+    stages = {
+        "background": measure(detect_background_color, pixels, repeat),
+        "preprocess": measure(preprocess_image, paths, repeat),
+        "model_load": measure(load_model, [model_path], load_repeat),
+        "scores": measure(engine.scores, rows, repeat),
+    }
+
+    estimator = _load_estimator(model_path)
+    if estimator is not None:
+        stages["predict"] = measure(estimator.predict, rows, repeat)
+        stages["decision"] = measure(estimator.decision_function, rows, repeat)
+
+    stages["end_to_end"] = measure(
+        lambda path: predict_digit(path, clf=engine), paths, repeat
+    )
+
+    return {
+        "stages": stages,
+        "peak_rss_bytes": peak_rss(),
+        "fixtures": {name: len(fixtures[name]) for name in FIXTURE_SETS},
+        "model": os.path.relpath(model_path, ML_DIR) if model_path else "default",
+        "repeat": repeat,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def _load_estimator(model_path):
+    """
+    モデルがpickleの場合はscikit-learnの推定器を返し、それ以外はNoneを返します。
+    """
+    from model_artifact import is_artifact
+    from predict import default_model_path
+
+    model_path = model_path or default_model_path()
+    if is_artifact(model_path):
+        return None
+
+    import joblib
+
+    estimator = joblib.load(model_path)
+    return estimator if hasattr(estimator, "decision_function") else None
+
+
+def compare(result, baseline, metric, threshold):
+    """
+    ベースラインと比較し、悪化した段階の (名前, 今回, ベースライン) のリストを返します。
+    """
+    regressions = []
+    for name, stage in result["stages"].items():
+        reference = baseline["stages"].get(name)
+        if reference is None or metric not in reference:
+            continue
+        if stage[metric] > reference[metric] * (1 + threshold):
+            regressions.append((name, stage[metric], reference[metric]))
+    return regressions
+
+
+def print_result(result):
+    print(
+        f"{'段階':<12}{'回数':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+        f"{'最大RSS':>10}"
+    )
+    for name, stage in result["stages"].items():
+        print(
+            f"{name:<12}{stage['n']:>6}{stage['p50_ms']:>10.3f}"
+            f"{stage['p95_ms']:>10.3f}{stage['p99_ms']:>10.3f}"
+            f"{stage['peak_rss_bytes'] / 2**20:>8.1f}MB"
+        )
+    print(f"プロセス全体の最大RSS: {result['peak_rss_bytes'] / 2**20:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推論処理の段階別ベンチマーク")
+    parser.add_argument("--model", help="計測するモデル（既定: predict.pyと同じ）")
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="画像1枚あたりの計測回数"
+    )
+    parser.add_argument(
+        "--load-repeat", type=int, default=10, help="モデル読み込みの計測回数"
+    )
+    parser.add_argument("-o", "--output", help="結果を書き出すJSONファイル")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="ベースライン")
+    parser.add_argument(
+        "--metric", choices=METRICS, default="p50_ms", help="比較に使う指標"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="ベースラインに対して許容する増加率（0.25 = 25%%）",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="計測結果をベースラインに保存"
+    )
+    args = parser.parse_args()
+
+    result = run_suite(args.model, args.repeat, args.load_repeat)
+    print_result(result)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"結果を書き出しました: {args.output}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(
+            f"ベースラインがありません: {args.baseline}"
+            "（--update-baseline で作成してください）"
+        )
+        sys.exit(1)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(result, baseline, args.metric, args.threshold)
+    for name, value, reference in regressions:
+        print(
+            f"{name}: {args.metric} が悪化しています "
+            f"({value:.3f} / ベースライン {reference:.3f})"
+        )
+    if regressions:
+        sys.exit(1)
+    print(f"ベースラインとの比較: 悪化なし（{args.metric}, 許容 {args.threshold:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+訓練スクリプト共通の分類器の構成。
+
+既定はRBFカーネルのSVCです。SVCは予測時にすべてのサポートベクターとの
+カーネル計算が必要なため、サポートベクターが数千になると予測が遅くなります。
+--model rff / nystroem を指定すると、カーネルを近似する明示的な特徴写像
+（ランダムフーリエ特徴 / Nystroem法）と線形分類器を組み合わせたモデルを訓練します。
+予測コストは特徴写像の次元数で決まり、訓練データの量に依存しません。
+--model ovo は svc と同じモデルを、一対一の二値分類器をプロセスプールで
+並列に訓練して求めます（parallel_svc.py）。
+--pca K を指定すると、784次元の画素をPCAでK次元に射影してから訓練します。
+射影はモデルと一緒に保存され、推論時にも自動で適用されます。
+fit_classifier() はサンプルごとの重みをPipelineの最後の分類器に渡して訓練します。
+"""
+
+MODEL_TYPES = ("svc", "ovo", "rff", "nystroem")
+DEFAULT_COMPONENTS = 1000
+
+
+def add_model_arguments(parser):
+    """
+    訓練スクリプトの引数パーサーにモデル選択の引数を追加します。
+    """
+    parser.add_argument(
+        "--model",
+        choices=MODEL_TYPES,
+        default="svc",
+        help=(
+            "svc: RBFカーネルSVC / ovo: svcの一対一分類器を並列に訓練 / "
+            "rff: ランダムフーリエ特徴 / nystroem: Nystroem法"
+        ),
+    )
+    parser.add_argument(
+        "--pca",
+        type=int,
+        default=None,
+        metavar="K",
+        help="PCAでK次元に射影してから訓練する（推論時も自動で射影）",
+    )
+    parser.add_argument(
+        "--components",
+        type=int,
+        default=DEFAULT_COMPONENTS,
+        help="近似カーネルの特徴写像の次元数（rff / nystroem のみ）",
+    )
+
+
+def scale_gamma(X):
+    """
+    SVC(gamma="scale")と同じgammaの値を返します。
+    """
+    import numpy as np
+
+    X = np.asarray(X)
+    variance = X.var()
+    return 1.0 / (X.shape[1] * variance) if variance > 0 else 1.0
+
+
+def build_classifier(
+    model_type,
+    X_train,
+    C=1.0,
+    class_weight=None,
+    n_components=DEFAULT_COMPONENTS,
+    random_state=42,
+    pca=None,
+    n_jobs=None,
+):
+    """
+    未訓練の分類器を作成します。近似カーネルの場合は、SVCのgamma="scale"と
+    同じ値をX_trainから求めて特徴写像に設定します。
+    pcaに次元数を指定すると、先頭にPCAの射影を追加したPipelineを返します。
+    近似カーネルの場合、射影はX_trainで訓練済みの状態で追加されます。
+    n_jobsは ovo の訓練に使うプロセス数です（NoneはCPUコア数）。
+    """
+    from sklearn import svm
+    from sklearn.pipeline import Pipeline
+
+    if pca:
+        from sklearn.decomposition import PCA
+
+        projection = PCA(n_components=pca, random_state=random_state)
+        if model_type not in ("svc", "ovo"):
+            from sklearn.frozen import FrozenEstimator
+
+            # 近似カーネルのgammaは射影後のデータから求める。ここで訓練した射影を
+            # Pipeline.fit で再び訓練しないよう、訓練済みのまま固定して使う
+            X_train = projection.fit_transform(X_train)
+            projection = FrozenEstimator(projection)
+        return Pipeline(
+            [
+                ("pca", projection),
+                (
+                    "model",
+                    build_classifier(
+                        model_type,
+                        X_train,
+                        C=C,
+                        class_weight=class_weight,
+                        n_components=n_components,
+                        random_state=random_state,
+                        n_jobs=n_jobs,
+                    ),
+                ),
+            ]
+        )
+
+    if model_type == "svc":
+        return svm.SVC(
+            kernel="rbf",
+            gamma="scale",
+            C=C,
+            random_state=random_state,
+            class_weight=class_weight,
+        )
+    if model_type == "ovo":
+        from parallel_svc import ParallelSVC
+
+        return ParallelSVC(C=C, class_weight=class_weight, n_jobs=n_jobs)
+
+    from sklearn.kernel_approximation import Nystroem, RBFSampler
+
+    gamma = scale_gamma(X_train)
+    if model_type == "rff":
+        feature_map = RBFSampler(
+            gamma=gamma, n_components=n_components, random_state=random_state
+        )
+    elif model_type == "nystroem":
+        feature_map = Nystroem(
+            kernel="rbf",
+            gamma=gamma,
+            n_components=min(n_components, len(X_train)),
+            random_state=random_state,
+        )
+    else:
+        raise ValueError(f"未対応のモデル種類です: {model_type}")
+
+    return Pipeline(
+        [
+            ("feature_map", feature_map),
+            (
+                "linear",
+                svm.LinearSVC(
+                    C=C, class_weight=class_weight, random_state=random_state
+                ),
+            ),
+        ]
+    )
+
+
+def fit_classifier(clf, X, y, sample_weight=None):
+    """
+    分類器を訓練します。sample_weightを指定すると、Pipeline（入れ子を含む）の
+    場合は最後の分類器に「ステップ名__sample_weight」として渡します。
+    """
+    if sample_weight is None:
+        return clf.fit(X, y)
+
+    from sklearn.pipeline import Pipeline
+
+    names = []
+    estimator = clf
+    while isinstance(estimator, Pipeline):
+        name, estimator = estimator.steps[-1]
+        names.append(name)
+    return clf.fit(X, y, **{"__".join(names + ["sample_weight"]): sample_weight})
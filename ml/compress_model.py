@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+訓練済みのRBFカーネルSVCを圧縮するスクリプト。
+
+1. クラスごとにサポートベクターをk-meansでクラスタリングし、
+   クラスタ中心を新しいサポートベクターにします（--ratio で残す割合を指定）
+2. サポートベクターをfloat16またはuint8（モデル全体で共通のスケール）で保存します
+3. 一対一分類器ごとに、元のサポートベクター上の決定値を再現するよう
+   クラスタ中心の係数を最小二乗法で求めます（縮小集合法）
+
+圧縮したモデルは通常のアーティファクトとして書き出され、predict.py の
+load_model() でそのまま読み込めます。元のモデルとのテスト精度の差、
+レイテンシ、メモリ使用量、ファイルサイズを比較して表示します。
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from inference_engine import (
+    ProjectedEngine,
+    RBFSVCEngine,
+    as_engine,
+    decode_vectors,
+    encode_vectors,
+    export_model,
+)
+from model_artifact import artifact_path_for
+from model_store import publish_model
+from predict import load_model
+
+ENCODINGS = ("float64", "float16", "uint8")
+RIDGE = 1e-6
+
+
+def vector_encoding(vectors, dtype):
+    """
+    サポートベクター全体で共通のエンコーディング情報を返します。
+    """
+    if dtype == "float64":
+        return None
+    if dtype == "float16":
+        return {"dtype": "float16"}
+
+    low = float(vectors.min())
+    high = float(vectors.max())
+    return {"dtype": "uint8", "scale": (high - low) / 255 or 1.0, "offset": low}
+
+
+def _cluster(vectors, n_clusters, random_state):
+    """
+    vectorsをn_clusters個にクラスタリングし、クラスタ中心を返します。
+    """
+    from sklearn.cluster import KMeans
+
+    if n_clusters >= len(vectors):
+        return vectors
+
+    kmeans = KMeans(n_clusters=n_clusters, n_init=3, random_state=random_state)
+    return kmeans.fit(vectors).cluster_centers_
+
+
+def _kernel(engine, a, b):
+    squared_distances = (
+        np.einsum("ij,ij->i", a, a)[:, None]
+        + np.einsum("ij,ij->i", b, b)[None, :]
+        - 2.0 * a @ b.T
+    )
+    return np.exp(-engine.gamma * np.maximum(squared_distances, 0.0))
+
+
+def _fit_coef(engine, vectors, n_support):
+    """
+    一対一分類器(i, j)ごとに、元のサポートベクター上の決定値
+    （切片を除く）を最もよく再現するよう、クラスiとjの新しいサポートベクターの
+    係数をリッジ付き最小二乗法で求め、libsvmと同じ並びの係数行列を返します。
+    """
+    coef = np.zeros((len(engine.classes) - 1, len(vectors)))
+    old_starts = np.concatenate([[0], np.cumsum(engine.n_support)])
+    new_starts = np.concatenate([[0], np.cumsum(n_support)])
+
+    for p, (i, j) in enumerate(engine.pairs):
+        old_index = np.r_[
+            old_starts[i] : old_starts[i + 1], old_starts[j] : old_starts[j + 1]
+        ]
+        new_index = np.r_[
+            new_starts[i] : new_starts[i + 1], new_starts[j] : new_starts[j + 1]
+        ]
+        reference = engine.support_vectors[old_index]
+        target = _kernel(engine, reference, reference) @ engine.pair_coef[old_index, p]
+
+        design = _kernel(engine, reference, vectors[new_index])
+        gram = design.T @ design
+        gram[np.diag_indices_from(gram)] += RIDGE * max(np.trace(gram), 1.0)
+        solution = np.linalg.solve(gram, design.T @ target)
+
+        # libsvmと同じ並び（クラスiの係数は j-1 行目、クラスjの係数は i 行目）に戻す
+        n_i = n_support[i]
+        coef[j - 1, new_starts[i] : new_starts[i + 1]] = solution[:n_i]
+        coef[i, new_starts[j] : new_starts[j + 1]] = solution[n_i:]
+    return coef
+
+
+def compress_engine(model, ratio=0.25, dtype="float16", random_state=0):
+    """
+    RBFカーネルSVCのサポートベクターをクラスごとに ratio の割合まで減らし、
+    dtypeで保存する圧縮済みの推論エンジンを返します。
+    """
+    engine = as_engine(model)
+    if engine.kind == ProjectedEngine.kind:
+        # PCAの射影はそのままにして、射影後の空間のSVCを圧縮する
+        return ProjectedEngine(
+            engine.mean,
+            engine.components,
+            compress_engine(engine.engine, ratio, dtype, random_state),
+        )
+    if engine.kind != RBFSVCEngine.kind:
+        raise ValueError("圧縮できるのはRBFカーネルSVCのみです")
+    if dtype not in ENCODINGS:
+        raise ValueError(f"未対応の保存形式です: {dtype}")
+
+    starts = np.concatenate([[0], np.cumsum(engine.n_support)])
+    vectors = []
+    for c in range(len(engine.classes)):
+        members = slice(starts[c], starts[c + 1])
+        n_clusters = max(1, int(round(engine.n_support[c] * ratio)))
+        vectors.append(
+            _cluster(
+                np.asarray(engine.support_vectors[members], dtype=np.float64),
+                n_clusters,
+                random_state,
+            )
+        )
+    n_support = np.array([len(centers) for centers in vectors])
+    vectors = np.vstack(vectors)
+
+    # 保存形式で丸めた値を使って係数を求め、丸め誤差も補正する
+    encoding = vector_encoding(vectors, dtype)
+    vectors = np.asarray(
+        decode_vectors(encode_vectors(vectors, encoding), encoding), dtype=np.float64
+    )
+    coef = _fit_coef(engine, vectors, n_support)
+
+    return RBFSVCEngine(
+        vectors,
+        coef,
+        engine.intercept,
+        n_support,
+        engine.gamma,
+        engine.classes,
+        sv_encoding=encoding,
+    )
+
+
+def measure_rss(model_path, n_features):
+    """
+    新しいプロセスでモデルを読み込んで256件を予測し、最大RSS（バイト）を返します。
+    """
+    # Linuxのru_maxrssはfork元の値を引き継ぐため、/proc/self/statusのVmHWMを優先する
+    script = (
+        "import json, resource, sys, numpy as np\n"
+        "from predict import load_model\n"
+        "engine = load_model(sys.argv[1])\n"
+        "engine.scores(np.random.default_rng(0).random((256, int(sys.argv[2]))))\n"
+        "try:\n"
+        "    status = open('/proc/self/status').read().split('VmHWM:')[1]\n"
+        "    rss = int(status.split()[0]) * 1024\n"
+        "except OSError:\n"
+        "    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        "    rss *= 1 if sys.platform == 'darwin' else 1024\n"
+        "print(json.dumps(rss))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script, model_path, str(n_features)],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if completed.returncode != 0:
+        raise Exception(f"メモリ使用量の計測に失敗しました: {completed.stderr}")
+    return json.loads(completed.stdout)
+
+
+def support_vector_count(engine):
+    """
+    エンジンのサポートベクター数を返します。PCAの射影付きのエンジンは内側のSVCの数です。
+    """
+    return len(getattr(engine, "engine", engine).support_vectors)
+
+
+def report(original, compressed, original_path, compressed_path, seed):
+    """
+    train_simple_model.py と同じテスト分割とテスト画像で、圧縮前後を比較します。
+    """
+    from bench_models import load_fixtures, load_split, measure_latency
+
+    _, X_test, _, y_test = load_split(seed)
+    fixture_X, fixture_y = load_fixtures()
+
+    rows = []
+    for name, engine, path in (
+        ("元のモデル", original, original_path),
+        ("圧縮後", compressed, compressed_path),
+    ):
+        labels = engine.scores(X_test)[0]
+        p50, p95 = measure_latency(engine, X_test, repeat=200)
+        rows.append(
+            {
+                "name": name,
+                "support_vectors": support_vector_count(engine),
+                "accuracy": float(np.mean(labels == y_test)),
+                "fixture": int(np.sum(engine.scores(fixture_X)[0] == fixture_y)),
+                "p50": p50,
+                "rss": measure_rss(path, engine.n_features),
+                "size": os.path.getsize(path),
+            }
+        )
+
+    print(
+        f"{'':<12}{'SV数':>8}{'テスト精度':>12}{'画像正解':>10}"
+        f"{'p50(ms)':>10}{'RSS':>10}{'ファイル':>10}"
+    )
+    for row in rows:
+        print(
+            f"{row['name']:<12}{row['support_vectors']:>8}{row['accuracy']:>12.4f}"
+            f"{row['fixture']:>6}/{len(fixture_y):<3}{row['p50']:>10.3f}"
+            f"{row['rss'] / 2**20:>8.1f}MB{row['size'] / 2**20:>8.2f}MB"
+        )
+    before, after = rows
+    print(
+        f"精度の差: {after['accuracy'] - before['accuracy']:+.4f} / "
+        f"レイテンシ: {after['p50'] / before['p50']:.2f}倍 / "
+        f"RSS: {(after['rss'] - before['rss']) / 2**20:+.1f}MB / "
+        f"ファイルサイズ: {after['size'] / before['size']:.2f}倍"
+    )
+
+
+def main():
+    default_model = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+
+    parser = argparse.ArgumentParser(description="RBFカーネルSVCを圧縮します")
+    parser.add_argument("model", nargs="?", default=default_model, help="元のモデル")
+    parser.add_argument(
+        "-o", "--output", help="出力先（既定: <モデル名>-compressed.bin）"
+    )
+    parser.add_argument(
+        "--ratio", type=float, default=0.25, help="残すサポートベクターの割合"
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=ENCODINGS,
+        default="float16",
+        help="サポートベクターの保存形式",
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="圧縮したモデルを公開する（predict.pyの既定のモデルになる）",
+    )
+    parser.add_argument(
+        "--no-report", action="store_true", help="圧縮前後の比較を表示しない"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="比較用データ生成の乱数シード"
+    )
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + "-compressed.bin"
+
+    try:
+        original = load_model(args.model)
+        compressed = compress_engine(original, ratio=args.ratio, dtype=args.dtype)
+        export_model(compressed, output)
+        print(f"圧縮したモデルを書き出しました: {output}")
+
+        if args.publish:
+            manifest = publish_model(
+                compressed,
+                metadata={
+                    "script": "compress_model",
+                    "source": os.path.abspath(args.model),
+                    "ratio": args.ratio,
+                    "dtype": args.dtype,
+                },
+            )
+            print(f"モデルを公開しました: バージョン {manifest['version']}")
+
+        if not args.no_report:
+            with tempfile.TemporaryDirectory() as directory:
+                # 元のモデルもアーティファクトにして同じ条件で比較する
+                original_path = args.model
+                if not original_path.endswith(".bin"):
+                    original_path = os.path.join(
+                        directory, os.path.basename(artifact_path_for(args.model))
+                    )
+                    export_model(original, original_path)
+                report(original, load_model(output), original_path, output, args.seed)
+    except Exception as e:
+        print(f"圧縮中にエラーが発生しました: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
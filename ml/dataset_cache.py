@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+生成したデータセットと前処理済みのテスト画像の特徴量のディスクキャッシュ。
+
+データは画素値をそのまま表すuint8の (N, 784) 配列として datasets/ に
+.npy で保存し、datasets/manifest.json に一覧を記録します。キーは次の値の
+ハッシュで、どれかが変わると別のエントリになります。
+
+- データセット名と生成パラメータ（乱数シードを含む）
+- 生成に使うコード（呼び出し元が指定したファイルと共通の生成モジュール）の内容
+- NumPy・Pillowのバージョン
+- 元画像のファイルの内容
+
+読み込みは np.load(mmap_mode="r") で行うため、ハイパーパラメータを変えて
+訓練し直すときはデータ生成を省いて学習だけを実行できます。
+訓練の直前に to_float32() で0〜1のfloat32に変換します。
+保存先は環境変数 ML_DATASET_CACHE_DIR で変更できます（既定: ml/datasets）。
+
+    python dataset_cache.py          # エントリの一覧
+    python dataset_cache.py --clear  # すべて削除
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from model_store import atomic_write
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(ML_DIR, "datasets")
+MANIFEST_NAME = "manifest.json"
+# to_float32() が一度に変換する行数
+CHUNK_SIZE = 4096
+# すべてのデータセットの生成に関わるモジュール
+GENERATION_CODE = ("augment.py", "glyph_atlas.py", "sharded_generation.py")
+
+
+def cache_dir():
+    return os.environ.get("ML_DATASET_CACHE_DIR") or DEFAULT_CACHE_DIR
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(name, params, code_files=(), source_files=()):
+    """
+    データセット名・パラメータ・コード・元画像からキャッシュのキーを求めます。
+    """
+    import PIL
+
+    code_files = [os.path.join(ML_DIR, path) for path in GENERATION_CODE] + [
+        os.path.abspath(path) for path in code_files
+    ]
+    description = {
+        "name": name,
+        "params": params,
+        "code": {
+            os.path.relpath(path, ML_DIR): _file_digest(path)
+            for path in sorted(set(code_files))
+        },
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "sources": [_file_digest(path) for path in source_files],
+    }
+    encoded = json.dumps(description, sort_keys=True).encode()
+    return f"{name}-{hashlib.sha256(encoded).hexdigest()[:16]}"
+
+
+def to_uint8(X):
+    """
+    0〜1に正規化された画素値（k/255）をuint8に戻します。
+    uint8で表せない値を含む場合は例外を送出します。
+    """
+    X = np.asarray(X)
+    if X.dtype == np.uint8:
+        return X
+    quantized = np.rint(X * 255.0).astype(np.uint8)
+    if not np.array_equal(quantized / X.dtype.type(255.0), X):
+        raise ValueError("uint8の画素値で表せないデータはキャッシュできません")
+    return quantized
+
+
+def to_float32(X, chunk_size=CHUNK_SIZE):
+    """
+    uint8の画素値を0〜1のfloat32（k/255）に変換します。出力を事前に確保して
+    chunk_size行ずつ埋めるため、メモリマップは少しずつ読み込まれ、
+    float64の一時配列も作りません。uint8以外はfloat32にするだけです。
+    """
+    if X.dtype != np.uint8:
+        return np.asarray(X, dtype=np.float32)
+
+    converted = np.empty(X.shape, dtype=np.float32)
+    for start in range(0, len(X), chunk_size):
+        stop = start + chunk_size
+        np.divide(X[start:stop], np.float32(255), out=converted[start:stop])
+    return converted
+
+
+def read_manifest(directory=None):
+    try:
+        with open(os.path.join(directory or cache_dir(), MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_array(path, array):
+    def write(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+
+    atomic_write(path, write)
+
+
+def cached_dataset(name, build, params, code_files=(), source_files=(), use_cache=True):
+    """
+    キャッシュ済みのデータセット (X, y) を返します。Xはメモリマップした
+    uint8の (N, 784) 配列です。キャッシュがなければ build() で生成して保存します。
+    build() は0〜1の画素値（k/255）またはuint8の X と、ラベル y を返します。
+    use_cacheが偽の場合は常に生成し、保存もしません。
+    """
+    if not use_cache:
+        X, y = build()
+        return to_uint8(X), np.asarray(y)
+
+    directory = cache_dir()
+    key = cache_key(name, params, code_files, source_files)
+    X_path = os.path.join(directory, f"{key}-X.npy")
+    y_path = os.path.join(directory, f"{key}-y.npy")
+
+    if key in read_manifest(directory):
+        try:
+            return np.load(X_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+        except (OSError, ValueError):
+            pass  # 壊れたエントリは作り直す
+
+    X, y = build()
+    X = to_uint8(X)
+    y = np.asarray(y)
+
+    os.makedirs(directory, exist_ok=True)
+    _save_array(X_path, X)
+    _save_array(y_path, y)
+
+    # 他のプロセスが追加したエントリを消さないよう、書き込む直前に読み直す
+    manifest = read_manifest(directory)
+    manifest[key] = {
+        "name": name,
+        "params": params,
+        "shape": list(X.shape),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    atomic_write(
+        os.path.join(directory, MANIFEST_NAME),
+        lambda tmp_path: _write_json(tmp_path, manifest),
+    )
+    print(f"データセットをキャッシュしました: {key}")
+    return np.load(X_path, mmap_mode="r"), np.load(y_path, mmap_mode="r")
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    import argparse
+    import shutil
+
+    parser = argparse.ArgumentParser(description="データセットのキャッシュの管理")
+    parser.add_argument("--clear", action="store_true", help="すべて削除する")
+    args = parser.parse_args()
+
+    directory = cache_dir()
+    if args.clear:
+        shutil.rmtree(directory, ignore_errors=True)
+        print(f"キャッシュを削除しました: {directory}")
+        return
+
+    for key, entry in sorted(read_manifest(directory).items()):
+        size = sum(
+            os.path.getsize(os.path.join(directory, f"{key}-{part}.npy"))
+            for part in ("X", "y")
+            if os.path.exists(os.path.join(directory, f"{key}-{part}.npy"))
+        )
+        print(
+            f"{key}  {entry['shape']}  {size / 2**20:.1f}MB  {entry['created_at']}"
+            f"  {json.dumps(entry['params'], ensure_ascii=False)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
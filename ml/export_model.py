@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+訓練済みのpickleモデルを、推論エンジン用のアーティファクトに書き出すスクリプト。
+書き出したアーティファクトはpredict.pyがメモリマップで読み込み、
+scikit-learnをインポートせずに推論します。
+"""
+
+import argparse
+import os
+import sys
+
+import joblib
+import numpy as np
+
+from inference_engine import export_model, load_engine
+from model_artifact import artifact_path_for
+
+
+def main():
+    default_model = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+
+    parser = argparse.ArgumentParser(
+        description="モデルをアーティファクトに書き出します"
+    )
+    parser.add_argument("model", nargs="?", default=default_model, help="pickleモデル")
+    parser.add_argument("-o", "--output", help="出力先（既定: モデルと同名の.bin）")
+    args = parser.parse_args()
+
+    output = args.output or artifact_path_for(args.model)
+
+    try:
+        clf = joblib.load(args.model)
+        export_model(clf, output)
+
+        # 書き出したアーティファクトを読み戻して予測が一致することを確認
+        engine = load_engine(output)
+        n_features = clf.n_features_in_
+        probe = np.random.default_rng(0).random((16, n_features))
+        if not np.array_equal(engine.scores(probe)[0], clf.predict(probe)):
+            raise Exception("書き出したモデルの予測結果が元のモデルと一致しません")
+
+        print(f"アーティファクトを書き出しました: {output}")
+        print(f"ファイルサイズ: {os.path.getsize(output)} bytes")
+    except Exception as e:
+        print(f"書き出し中にエラーが発生しました: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+フォントで描画した数字のグリフをキャッシュし、バリエーションを配列演算で作る層。
+
+数字のグリフはフォントと画像サイズごとに1回だけ描画します。各バリエーションは
+キャッシュしたビットマップを余白付きのグリフからの切り出しで平行移動し、
+回転とノイズは augment.py でまとめて加えます。
+
+テキストの描画は整数の平行移動に対して不変なため、平行移動の結果は
+オフセット付きで描画した画像と一致します。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from augment import augment
+
+
+class GlyphAtlas:
+    """
+    1つのフォントと画像サイズについて、0〜9のグリフを描画してキャッシュします。
+    グリフは max_offset 画素の余白付きで保持し、平行移動を切り出しで行います。
+    """
+
+    def __init__(self, size=(28, 28), font_path=None, font_size=None, max_offset=3):
+        self.size = size
+        self.max_offset = max_offset
+        self.font = _load_font(font_path, font_size)
+        self.glyphs = np.stack([self._render_glyph(digit) for digit in range(10)])
+
+    def _render_glyph(self, digit):
+        """
+        数字を画像の中央に描画し、余白付きのuint8配列を返します。
+        """
+        from PIL import Image, ImageDraw
+
+        width, height = self.size
+        margin = self.max_offset
+        img = Image.new("L", (width + 2 * margin, height + 2 * margin), color=0)
+        draw = ImageDraw.Draw(img)
+
+        try:
+            # テキストのサイズを取得して中央配置
+            bbox = draw.textbbox((0, 0), str(digit), font=self.font)
+            text_x = (width - (bbox[2] - bbox[0])) // 2
+            text_y = (height - (bbox[3] - bbox[1])) // 2
+            draw.text(
+                (text_x + margin, text_y + margin), str(digit), fill=255, font=self.font
+            )
+        except Exception as e:
+            print(f"フォント描画エラー（数字{digit}）: {e}")
+            # フォールバック: 中央に大きなテキスト
+            draw.text((10 + margin, 8 + margin), str(digit), fill=255)
+
+        return np.asarray(img, dtype=np.uint8)
+
+    def shifted(self, digits, x_offsets, y_offsets):
+        """
+        digits[i] のグリフを (x_offsets[i], y_offsets[i]) 画素ずらした
+        (N, 高さ, 幅) のuint8配列を返します。
+        """
+        width, height = self.size
+        margin = self.max_offset
+        rows = (margin - np.asarray(y_offsets))[:, None] + np.arange(height)
+        cols = (margin - np.asarray(x_offsets))[:, None] + np.arange(width)
+        return self.glyphs[
+            np.asarray(digits)[:, None, None], rows[:, :, None], cols[:, None, :]
+        ]
+
+    def render(
+        self,
+        digits,
+        rng,
+        max_offset=2,
+        noise_std=5.0,
+        rotation_probability=0.3,
+        max_angle=10,
+    ):
+        """
+        digitsの各数字について、-max_offset〜max_offset画素の平行移動、
+        rotation_probabilityの確率で -max_angle〜max_angle度の回転、
+        標準偏差noise_stdのガウシアンノイズを加えた (N, 高さ, 幅) のuint8配列を返します。
+        """
+        if max_offset > self.max_offset:
+            raise ValueError(f"max_offsetは{self.max_offset}以下にしてください")
+
+        n = len(digits)
+        x_offsets = rng.integers(-max_offset, max_offset + 1, size=n)
+        y_offsets = rng.integers(-max_offset, max_offset + 1, size=n)
+        images = self.shifted(digits, x_offsets, y_offsets)
+        return augment(
+            images,
+            rng,
+            max_angle=max_angle if rotation_probability else 0,
+            rotation_probability=rotation_probability,
+            noise_std=noise_std,
+        )
+
+
+def _load_font(font_path, font_size):
+    from PIL import ImageFont
+
+    if font_path is None:
+        return (
+            ImageFont.load_default(font_size) if font_size else ImageFont.load_default()
+        )
+    return ImageFont.truetype(font_path, font_size or 20)
+
+
+@lru_cache(maxsize=None)
+def get_atlas(size=(28, 28), font_path=None, font_size=None):
+    """
+    フォントと画像サイズごとにキャッシュしたGlyphAtlasを返します。
+    """
+    return GlyphAtlas(size=size, font_path=font_path, font_size=font_size)
@@ -0,0 +1,431 @@
+"""
+scikit-learnに依存しない推論エンジン。
+
+訓練済みモデルのパラメータだけを保持し、NumPyで決定値を計算します。
+export_model()で書き出したアーティファクトをload_engine()でメモリマップして
+読み込めば、予測時にscikit-learnをインポートする必要がありません。
+"""
+
+import weakref
+
+import numpy as np
+
+from model_artifact import load_artifact, save_artifact
+
+
+class RBFSVCEngine:
+    """
+    RBFカーネルSVC（一対一方式）の決定値を、サポートベクターとのカーネル計算
+    1回から求めます。predict()とdecision_function()を別々に呼ぶと同じカーネル
+    行列を2回計算するため、ラベル・信頼度・順位をこの1回の結果から導出します。
+    """
+
+    kind = "svc_rbf"
+
+    def __init__(
+        self,
+        support_vectors,
+        dual_coef,
+        intercept,
+        n_support,
+        gamma,
+        classes,
+        sv_squared_norms=None,
+        sv_encoding=None,
+    ):
+        # 圧縮したモデル（compress_model.py）はサポートベクターを低精度で保存しており、
+        # float32に戻して計算する。それ以外はscikit-learnと同じfloat64で計算する
+        dtype = np.float32 if sv_encoding else np.float64
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=dtype)
+        self.sv_encoding = sv_encoding
+        if sv_squared_norms is None:
+            sv_squared_norms = np.einsum(
+                "ij,ij->i", self.support_vectors, self.support_vectors
+            )
+        self.sv_squared_norms = sv_squared_norms
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.n_support = np.asarray(n_support, dtype=np.int64)
+        self.gamma = float(gamma)
+        self.classes = np.asarray(classes)
+
+        # 一対一分類器(i, j)ごとの係数を (サポートベクター数, 分類器数) の
+        # 行列にまとめ、全分類器の決定値を1回の行列積で求められるようにする
+        n_classes = len(self.classes)
+        starts = np.concatenate([[0], np.cumsum(self.n_support)])
+        self.pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        self.pair_coef = np.zeros((len(self.support_vectors), len(self.pairs)))
+        for p, (i, j) in enumerate(self.pairs):
+            si = slice(starts[i], starts[i + 1])
+            sj = slice(starts[j], starts[j + 1])
+            self.pair_coef[si, p] = self.dual_coef[j - 1, si]
+            self.pair_coef[sj, p] = self.dual_coef[i, sj]
+
+    @property
+    def n_features(self):
+        return self.support_vectors.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, clf):
+        return cls(
+            clf.support_vectors_,
+            clf._dual_coef_,
+            clf._intercept_,
+            clf._n_support,
+            clf._gamma,
+            clf.classes_,
+        )
+
+    @classmethod
+    def from_artifact(cls, meta, arrays):
+        sv_encoding = meta.get("sv_encoding")
+        return cls(
+            decode_vectors(arrays["support_vectors"], sv_encoding),
+            arrays["dual_coef"],
+            arrays["intercept"],
+            arrays["n_support"],
+            meta["gamma"],
+            arrays["classes"],
+            sv_squared_norms=arrays["sv_squared_norms"],
+            sv_encoding=sv_encoding,
+        )
+
+    def to_artifact(self):
+        """
+        アーティファクトに保存するメタデータと配列を返します。
+        """
+        meta = {"gamma": self.gamma}
+        if self.sv_encoding:
+            meta["sv_encoding"] = self.sv_encoding
+        arrays = {
+            "support_vectors": encode_vectors(self.support_vectors, self.sv_encoding),
+            "sv_squared_norms": self.sv_squared_norms,
+            "dual_coef": self.dual_coef,
+            "intercept": self.intercept,
+            "n_support": self.n_support,
+            "classes": self.classes,
+        }
+        return meta, arrays
+
+    def decision_values(self, features):
+        """
+        一対一分類器ごとの決定値 (N, 分類器数) を返します。
+        """
+        features = np.asarray(features, dtype=self.support_vectors.dtype)
+        squared_distances = (
+            np.einsum("ij,ij->i", features, features)[:, None]
+            + self.sv_squared_norms[None, :]
+            - 2.0 * features @ self.support_vectors.T
+        )
+        np.maximum(squared_distances, 0.0, out=squared_distances)
+        kernel = np.exp(-self.gamma * squared_distances, out=squared_distances)
+        return kernel @ self.pair_coef + self.intercept
+
+    def scores(self, features):
+        """
+        予測ラベル (N,) と、decision_function(decision_function_shape="ovr")
+        と同じ形式のクラス別スコア (N, クラス数) を返します。
+        """
+        decision = self.decision_values(features)
+        n_samples = len(decision)
+        n_classes = len(self.classes)
+
+        votes = np.zeros((n_samples, n_classes))
+        confidences = np.zeros((n_samples, n_classes))
+        for p, (i, j) in enumerate(self.pairs):
+            positive = decision[:, p] > 0
+            votes[positive, i] += 1
+            votes[~positive, j] += 1
+            confidences[:, i] += decision[:, p]
+            confidences[:, j] -= decision[:, p]
+
+        # 投票数が最大のクラスを採用（同数の場合は先頭のクラス。libsvmと同じ）
+        labels = self.classes[np.argmax(votes, axis=1)]
+        scores = votes + confidences / (3 * (np.abs(confidences) + 1))
+        return labels, scores
+
+
+def encode_vectors(vectors, encoding):
+    """
+    サポートベクターを保存用の低精度の配列に変換します。
+    encodingは {"dtype": "float16"} または
+    {"dtype": "uint8", "scale": ..., "offset": ...}（値 = 符号 * scale + offset）です。
+    """
+    if not encoding:
+        return vectors
+    if encoding["dtype"] == "float16":
+        return vectors.astype(np.float16)
+    if encoding["dtype"] == "uint8":
+        codes = np.rint((vectors - encoding["offset"]) / encoding["scale"])
+        return np.clip(codes, 0, 255).astype(np.uint8)
+    raise ValueError(f"未対応のエンコーディングです: {encoding['dtype']}")
+
+
+def decode_vectors(vectors, encoding):
+    """
+    encode_vectors()で変換した配列をfloat32に戻します。
+    """
+    if not encoding:
+        return vectors
+    decoded = vectors.astype(np.float32)
+    if encoding["dtype"] == "uint8":
+        decoded *= np.float32(encoding["scale"])
+        decoded += np.float32(encoding["offset"])
+    return decoded
+
+
+class ApproxKernelEngine:
+    """
+    近似カーネルの特徴写像と線形分類器を組み合わせたモデル（classifiers.pyの
+    rff / nystroem）の推論エンジン。特徴写像の後の正規化と線形分類器の係数を
+    1つの行列 head にまとめ、固定サイズの行列積2回でスコアを求めます。
+
+    - rff: cos(X @ weights + offset) @ head + intercept
+    - nystroem: exp(-gamma * |X - basis|^2) @ head + intercept
+    """
+
+    kind = "approx_linear"
+
+    def __init__(self, feature_map, basis, offset, head, intercept, gamma, classes):
+        self.feature_map = feature_map
+        self.basis = np.ascontiguousarray(basis, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.head = np.ascontiguousarray(head, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.gamma = float(gamma)
+        self.classes = np.asarray(classes)
+        if feature_map == "nystroem":
+            self.basis_squared_norms = np.einsum("ij,ij->i", self.basis, self.basis)
+
+    @property
+    def n_features(self):
+        if self.feature_map == "rff":
+            return self.basis.shape[0]
+        return self.basis.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, pipeline):
+        feature_map = pipeline.steps[0][1]
+        linear = pipeline.steps[-1][1]
+        coef = np.asarray(linear.coef_, dtype=np.float64)
+
+        if hasattr(feature_map, "random_weights_"):
+            scale = (2.0 / feature_map.n_components) ** 0.5
+            return cls(
+                "rff",
+                feature_map.random_weights_,
+                feature_map.random_offset_,
+                scale * coef.T,
+                linear.intercept_,
+                feature_map.gamma,
+                linear.classes_,
+            )
+
+        return cls(
+            "nystroem",
+            feature_map.components_,
+            np.zeros(0),
+            feature_map.normalization_.T @ coef.T,
+            linear.intercept_,
+            feature_map.gamma,
+            linear.classes_,
+        )
+
+    @classmethod
+    def from_artifact(cls, meta, arrays):
+        return cls(
+            meta["feature_map"],
+            arrays["basis"],
+            arrays["offset"],
+            arrays["head"],
+            arrays["intercept"],
+            meta["gamma"],
+            arrays["classes"],
+        )
+
+    def to_artifact(self):
+        meta = {"feature_map": self.feature_map, "gamma": self.gamma}
+        arrays = {
+            "basis": self.basis,
+            "offset": self.offset,
+            "head": self.head,
+            "intercept": self.intercept,
+            "classes": self.classes,
+        }
+        return meta, arrays
+
+    def transform(self, features):
+        """
+        特徴写像 (N, 次元数) を返します。
+        """
+        features = np.asarray(features, dtype=np.float64)
+        if self.feature_map == "rff":
+            projection = features @ self.basis
+            projection += self.offset
+            return np.cos(projection, out=projection)
+
+        squared_distances = (
+            np.einsum("ij,ij->i", features, features)[:, None]
+            + self.basis_squared_norms[None, :]
+            - 2.0 * features @ self.basis.T
+        )
+        np.maximum(squared_distances, 0.0, out=squared_distances)
+        return np.exp(-self.gamma * squared_distances, out=squared_distances)
+
+    def scores(self, features):
+        """
+        予測ラベル (N,) と、線形分類器のdecision_functionと同じクラス別スコアを返します。
+        """
+        scores = self.transform(features) @ self.head + self.intercept
+        if scores.shape[1] == 1:
+            # 2クラスの場合は正例のスコアのみなので、負例のスコアを補う
+            scores = np.hstack([-scores, scores])
+        return self.classes[np.argmax(scores, axis=1)], scores
+
+
+class EstimatorEngine:
+    """
+    エンジンに変換できないモデル向けに、predict()とdecision_function()で
+    同じインターフェースを提供します。アーティファクトには書き出せません。
+    """
+
+    kind = None
+
+    def __init__(self, clf):
+        self.clf = clf
+        self.classes = np.asarray(clf.classes_)
+        self.n_features = getattr(clf, "n_features_in_", None)
+
+    def scores(self, features):
+        return self.clf.predict(features), self.clf.decision_function(features)
+
+
+class ProjectedEngine:
+    """
+    PCAなどの線形射影 (X - mean) @ components.T を適用してから、
+    内側の推論エンジンでスコアを求めます。カーネル計算の次元が
+    784から射影後の次元数に減ります。
+    """
+
+    kind = "projected"
+
+    def __init__(self, mean, components, engine):
+        self.components = np.ascontiguousarray(components, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        # (X - mean) @ C.T = X @ C.T - mean @ C.T として、平均の減算を1回のベクトル加算にする
+        self.offset = -(self.mean @ self.components.T)
+        self.engine = engine
+        self.classes = engine.classes
+
+    @property
+    def n_features(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, pca, engine):
+        components = pca.components_
+        if getattr(pca, "whiten", False):
+            components = components / np.sqrt(pca.explained_variance_)[:, None]
+        return cls(pca.mean_, components, engine)
+
+    @classmethod
+    def from_artifact(cls, meta, arrays):
+        inner_arrays = {
+            name[len("inner.") :]: array
+            for name, array in arrays.items()
+            if name.startswith("inner.")
+        }
+        engine = ENGINES[meta["inner_kind"]].from_artifact(
+            meta["inner_meta"], inner_arrays
+        )
+        return cls(arrays["mean"], arrays["components"], engine)
+
+    def to_artifact(self):
+        inner_meta, inner_arrays = self.engine.to_artifact()
+        meta = {"inner_kind": self.engine.kind, "inner_meta": inner_meta}
+        arrays = {"mean": self.mean, "components": self.components}
+        arrays.update({f"inner.{name}": array for name, array in inner_arrays.items()})
+        return meta, arrays
+
+    def transform(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        return features @ self.components.T + self.offset
+
+    def scores(self, features):
+        return self.engine.scores(self.transform(features))
+
+
+ENGINES = {
+    engine.kind: engine
+    for engine in (RBFSVCEngine, ApproxKernelEngine, ProjectedEngine)
+}
+
+_engines = weakref.WeakKeyDictionary()
+
+
+def engine_from_estimator(clf):
+    """
+    学習済みのscikit-learnモデルから推論エンジンを作成します。
+    """
+    if getattr(clf, "kernel", None) == "rbf" and hasattr(clf, "support_vectors_"):
+        return RBFSVCEngine.from_sklearn(clf)
+
+    steps = [step for _, step in getattr(clf, "steps", [])]
+    if len(steps) == 1:
+        return engine_from_estimator(steps[0])
+
+    # 先頭がPCAの場合は、射影の後ろのモデルを変換して射影と組み合わせる
+    if len(steps) > 1 and hasattr(steps[0], "explained_variance_"):
+        engine = engine_from_estimator(clf[1:])
+        if engine.kind is not None:
+            return ProjectedEngine.from_sklearn(steps[0], engine)
+        return EstimatorEngine(clf)
+
+    if (
+        len(steps) == 2
+        and hasattr(steps[0], "random_weights_") != hasattr(steps[0], "components_")
+        and getattr(steps[0], "kernel", "rbf") == "rbf"
+        and hasattr(steps[1], "coef_")
+    ):
+        return ApproxKernelEngine.from_sklearn(clf)
+    return EstimatorEngine(clf)
+
+
+def as_engine(model):
+    """
+    推論エンジンまたはscikit-learnモデルを受け取り、推論エンジンを返します。
+    scikit-learnモデルからの変換結果はモデルごとにキャッシュします。
+    """
+    if hasattr(model, "scores"):
+        return model
+
+    engine = _engines.get(model)
+    if engine is None:
+        engine = engine_from_estimator(model)
+        _engines[model] = engine
+    return engine
+
+
+def export_model(model, path):
+    """
+    モデルを推論エンジン用のアーティファクトとして書き出します。
+    """
+    engine = as_engine(model)
+    if engine.kind is None:
+        raise ValueError(
+            f"このモデルは書き出しに対応していません: {type(model).__name__}"
+        )
+
+    meta, arrays = engine.to_artifact()
+    save_artifact(path, engine.kind, meta, arrays)
+    return engine
+
+
+def load_engine(path, mmap=True):
+    """
+    アーティファクトをメモリマップで読み込み、推論エンジンを返します。
+    """
+    kind, meta, arrays = load_artifact(path, mmap=mmap)
+    if kind not in ENGINES:
+        raise ValueError(f"未対応のモデル種類です: {kind}")
+    return ENGINES[kind].from_artifact(meta, arrays)
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+予測処理の負荷試験ツール。
+test/images の画像を並列に送り続け、スループット・レイテンシ（p50/p95/p99）・
+エラー率・起動したPythonプロセス数を表示します。対象は次の3つです。
+
+    http    Expressの /api/predict にmultipartでアップロード
+            （プロセス数は /api/health の python.spawned の増分）
+    serve   predict.py --serve のワーカーを --workers 個起動し、JSON行で依頼
+            （PYTHON_WORKER_POOL_SIZE > 0 の構成に相当）
+    spawn   1リクエストごとに predict.py を起動
+            （PYTHON_WORKER_POOL_SIZE=0 の構成に相当）
+
+--dummy-model を指定すると、create_dummy_model.py で乱数シードから決まる
+ダミーモデルを一時ディレクトリに作成し、PREDICT_MODEL_PATH で各Pythonプロセスに
+使わせます。http の場合は --start-server でサーバーも同じ設定で起動できます。
+
+    python load_test.py serve --workers 4 --concurrency 8 --duration 30 --dummy-model
+    python load_test.py http --url http://localhost:5000/api/predict --concurrency 16
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(ML_DIR)
+TEST_IMAGE_DIR = os.path.join(ROOT_DIR, "test", "images")
+PREDICT_SCRIPT = os.path.join(ML_DIR, "predict.py")
+FIXTURE_SETS = ("digits", "edge_cases", "invalid")
+MODES = ("http", "serve", "spawn")
+DEFAULT_URL = "http://localhost:5000/api/predict"
+
+
+def parse_mix(value):
+    """
+    "digits=8,edge_cases=1" 形式の画像セットの比率を辞書にします。
+    """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in FIXTURE_SETS:
+            raise argparse.ArgumentTypeError(f"未対応の画像セットです: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_image_mix(mix=None):
+    """
+    画像のパスと選択の重みのリストを返します。
+    mixを省略した場合はすべての画像を同じ確率で選びます。
+    """
+    paths = []
+    weights = []
+    for name in FIXTURE_SETS:
+        if mix is not None and not mix.get(name):
+            continue
+        files = sorted(glob.glob(os.path.join(TEST_IMAGE_DIR, name, "*.png")))
+        if not files:
+            raise Exception(f"テスト画像が見つかりません: {name}")
+        paths.extend(files)
+        # セット全体の比率をセット内の画像に均等に配分する
+        weight = 1.0 if mix is None else mix[name] / len(files)
+        weights.extend([weight] * len(files))
+    return paths, weights
+
+
+def create_dummy_model(directory, seed):
+    """
+    create_dummy_model.py でダミーモデルを作成し、アーティファクトのパスを返します。
+    """
+    import joblib
+
+    from inference_engine import export_model
+
+    pickle_path = os.path.join(directory, "dummy_model.pkl")
+    completed = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(ROOT_DIR, "create_dummy_model.py"),
+            "--output",
+            pickle_path,
+            "--seed",
+            str(seed),
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise Exception(f"ダミーモデルの作成に失敗しました: {completed.stderr}")
+
+    artifact_path = os.path.join(directory, "dummy_model.bin")
+    export_model(joblib.load(pickle_path), artifact_path)
+    return artifact_path
+
+
+def _check_result(result):
+    if "error" in result:
+        raise Exception(result.get("message") or result["error"])
+
+
+class HTTPClient:
+    """
+    /api/predict に画像をmultipartでアップロードするクライアント。
+    """
+
+    def __init__(self, url, timeout=30.0):
+        self.url = url
+        self.timeout = timeout
+        self.health_url = url.rsplit("/", 1)[0] + "/health"
+        self._start_spawned = self._spawned()
+
+    def _spawned(self):
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=self.timeout) as r:
+                return json.load(r).get("python", {}).get("spawned")
+        except (OSError, ValueError):
+            return None
+
+    def predict(self, image_path):
+        boundary = uuid.uuid4().hex
+        with open(image_path, "rb") as f:
+            content = f.read()
+        body = b"".join(
+            [
+                f"--{boundary}\r\n".encode(),
+                b'Content-Disposition: form-data; name="image"; ',
+                f'filename="{os.path.basename(image_path)}"\r\n'.encode(),
+                b"Content-Type: image/png\r\n\r\n",
+                content,
+                f"\r\n--{boundary}--\r\n".encode(),
+            ]
+        )
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                _check_result(json.load(response))
+        except urllib.error.HTTPError as e:
+            raise Exception(f"HTTP {e.code}: {e.read(200).decode(errors='replace')}")
+
+    def python_processes(self):
+        end = self._spawned()
+        if end is None or self._start_spawned is None:
+            return None
+        return end - self._start_spawned
+
+    def close(self):
+        pass
+
+
+class ServeClient:
+    """
+    predict.py --serve のワーカーを起動し、リクエストを到着順に
+    空いているワーカーへ割り当てるクライアント（PythonWorkerPoolと同じ）。
+    ワーカーを1つも起動できなくなった場合は、待っているリクエストと以降の
+    リクエストをその例外で失敗させます。
+    """
+
+    def __init__(self, workers, env, timeout=30.0):
+        self.env = env
+        self.timeout = timeout
+        self.spawned = 0
+        self._lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._alive = workers
+        self._error = None
+        self._threads = [
+            threading.Thread(target=self._dispatch, daemon=True) for _ in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _spawn(self):
+        with self._lock:
+            self.spawned += 1
+        return subprocess.Popen(
+            [sys.executable, PREDICT_SCRIPT, "--serve"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            env=self.env,
+        )
+
+    def _dispatch(self):
+        """
+        1つのワーカーを担当し、キューのリクエストを順に処理します。
+        """
+        try:
+            worker = self._spawn()
+        except Exception as e:
+            self._worker_failed(e)
+            return
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                worker.stdin.close()
+                worker.wait()
+                return
+
+            image_path, done, outcome = task
+            try:
+                request = {"id": "1", "image_path": image_path}
+                worker.stdin.write(json.dumps(request) + "\n")
+                worker.stdin.flush()
+                line = worker.stdout.readline()
+                if not line:
+                    raise Exception(f"ワーカーがコード{worker.wait()}で終了しました")
+                _check_result(json.loads(line))
+            except Exception as e:
+                outcome.append(e)
+                # 異常終了したワーカーは入れ替える
+                if worker.poll() is not None:
+                    try:
+                        worker = self._spawn()
+                    except Exception as spawn_error:
+                        done.set()
+                        self._worker_failed(spawn_error)
+                        return
+            done.set()
+
+    def _worker_failed(self, error):
+        """
+        ワーカーを起動できずにスレッドが終了するときに呼ばれます。
+        最後のスレッドの場合は、キューに残っているリクエストをすべて失敗させます。
+        """
+        with self._lock:
+            self._alive -= 1
+            if self._alive > 0:
+                return
+            self._error = error
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                return
+            if task is not None:
+                _, done, outcome = task
+                outcome.append(error)
+                done.set()
+
+    def predict(self, image_path):
+        done = threading.Event()
+        outcome = []
+        # _worker_failed がキューを空にした後に積まれたリクエストが残らないよう、
+        # エラーの確認とキューへの追加はロックの中で行う
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            self._tasks.put((image_path, done, outcome))
+        if not done.wait(self.timeout):
+            raise Exception(f"ワーカーが{self.timeout}秒以内に応答しませんでした")
+        if outcome:
+            raise outcome[0]
+
+    def python_processes(self):
+        return self.spawned
+
+    def close(self):
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
+class SpawnClient:
+    """
+    1リクエストごとに predict.py を起動するクライアント。
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.spawned = 0
+        self._lock = threading.Lock()
+
+    def predict(self, image_path):
+        with self._lock:
+            self.spawned += 1
+        completed = subprocess.run(
+            [sys.executable, PREDICT_SCRIPT, image_path],
+            capture_output=True,
+            text=True,
+            env=self.env,
+        )
+        if completed.returncode != 0 and not completed.stdout:
+            raise Exception(f"predict.py がコード{completed.returncode}で終了しました")
+        _check_result(json.loads(completed.stdout))
+
+    def python_processes(self):
+        return self.spawned
+
+    def close(self):
+        pass
+
+
+def run_load(client, paths, weights, concurrency, duration, seed=0):
+    """
+    concurrency 個のスレッドから duration 秒間リクエストを送り続け、
+    (所要時間（秒）, エラーメッセージまたはNone) のリストと経過時間を返します。
+    """
+    records = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        while time.perf_counter() < deadline:
+            path = rng.choices(paths, weights)[0]
+            request_start = time.perf_counter()
+            try:
+                client.predict(path)
+                error = None
+            except Exception as e:
+                error = str(e)
+            local.append((time.perf_counter() - request_start, error))
+        with lock:
+            records.extend(local)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - start
+
+
+def summarize(records, elapsed, python_processes):
+    """
+    負荷試験の結果をJSONに書き出せる辞書にまとめます。
+    """
+    latencies = np.array([latency for latency, _ in records]) * 1e3
+    errors = [error for _, error in records if error is not None]
+    summary = {
+        "requests": len(records),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(records) if records else 0.0,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(records) / elapsed if elapsed else 0.0,
+        "python_processes": python_processes,
+        "first_errors": sorted(set(errors))[:5],
+    }
+    if records:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary.update(
+            p50_ms=float(p50),
+            p95_ms=float(p95),
+            p99_ms=float(p99),
+            max_ms=float(latencies.max()),
+        )
+    return summary
+
+
+def start_server(url, env, workers, timeout=30.0):
+    """
+    Expressサーバーを起動し、/api/health が応答するまで待ってプロセスを返します。
+    """
+    from urllib.parse import urlparse
+
+    env = {
+        **env,
+        "PORT": str(urlparse(url).port or 80),
+        "PYTHON_PATH": sys.executable,
+        "PYTHON_WORKER_POOL_SIZE": str(workers),
+    }
+    server = subprocess.Popen(
+        ["node", os.path.join(ROOT_DIR, "server", "index.js")],
+        stdout=subprocess.DEVNULL,
+        env=env,
+    )
+    health_url = url.rsplit("/", 1)[0] + "/health"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise Exception(f"サーバーがコード{server.returncode}で終了しました")
+        try:
+            urllib.request.urlopen(health_url, timeout=1.0).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise Exception(f"サーバーが{timeout}秒以内に起動しませんでした")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="予測処理の負荷試験")
+    parser.add_argument("mode", choices=MODES, help="負荷をかける対象")
+    parser.add_argument("--url", default=DEFAULT_URL, help="http の送信先")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時リクエスト数")
+    parser.add_argument("--duration", type=float, default=10.0, help="計測時間（秒）")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="serve のワーカー数（--start-server ではPYTHON_WORKER_POOL_SIZE）",
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        help="画像セットの比率（例: digits=8,edge_cases=1,invalid=1）",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="画像選択の乱数シード")
+    parser.add_argument(
+        "--dummy-model",
+        action="store_true",
+        help="create_dummy_model.py のダミーモデルを使う",
+    )
+    parser.add_argument(
+        "--model-seed", type=int, default=0, help="ダミーモデルの乱数シード"
+    )
+    parser.add_argument(
+        "--start-server", action="store_true", help="http の場合にサーバーを起動する"
+    )
+    parser.add_argument("-o", "--output", help="結果を書き出すJSONファイル")
+    args = parser.parse_args()
+
+    paths, weights = load_image_mix(args.mix)
+    env = dict(os.environ)
+    server = None
+    client = None
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            if args.dummy_model:
+                env["PREDICT_MODEL_PATH"] = create_dummy_model(
+                    directory, args.model_seed
+                )
+                print(f"ダミーモデル: シード {args.model_seed}")
+
+            if args.mode == "http":
+                if args.start_server:
+                    server = start_server(args.url, env, args.workers)
+                client = HTTPClient(args.url)
+            elif args.mode == "serve":
+                client = ServeClient(args.workers, env)
+            else:
+                client = SpawnClient(env)
+
+            records, elapsed = run_load(
+                client, paths, weights, args.concurrency, args.duration, args.seed
+            )
+            summary = summarize(records, elapsed, client.python_processes())
+        except Exception as e:
+            print(f"負荷試験中にエラーが発生しました: {e}")
+            sys.exit(1)
+        finally:
+            if client is not None:
+                client.close()
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    summary.update(
+        mode=args.mode, concurrency=args.concurrency, images=len(paths), seed=args.seed
+    )
+    print(
+        f"{args.mode}: 同時 {args.concurrency} / {summary['elapsed_seconds']:.1f}秒 / "
+        f"画像 {len(paths)} 枚"
+    )
+    print(
+        f"リクエスト: {summary['requests']} / スループット: "
+        f"{summary['throughput_rps']:.1f} req/s / エラー率: {summary['error_rate']:.2%}"
+    )
+    if summary["requests"]:
+        print(
+            f"レイテンシ p50 {summary['p50_ms']:.1f}ms / p95 {summary['p95_ms']:.1f}ms"
+            f" / p99 {summary['p99_ms']:.1f}ms / 最大 {summary['max_ms']:.1f}ms"
+        )
+    processes = summary["python_processes"]
+    print(f"起動したPythonプロセス: {'不明' if processes is None else processes}")
+    for error in summary["first_errors"]:
+        print(f"エラー: {error}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"結果を書き出しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+ローカルのMNISTファイルの読み込み（ネットワーク・pandasは使いません）。
+
+次のどちらかの形式のファイルを置いたディレクトリから読み込みます
+（既定: 環境変数 MNIST_DIR または ml/data/mnist）。
+
+- 標準のIDX形式: train-images-idx3-ubyte / train-labels-idx1-ubyte と
+  t10k-images-idx3-ubyte / t10k-labels-idx1-ubyte（それぞれ .gz も可）
+- 変換済みの .npy: train-images.npy / train-labels.npy など（--convert で作成）
+
+画像はヘッダーを読み飛ばして np.memmap で開くため、読み込むのは実際に
+参照した行だけです。.gz は展開したIDXファイルを datasets/ に一度だけ
+書き出し、それをメモリマップします。stratified_subset() はラベルだけを見て
+各数字の割合を保った添字を選ぶため、70000枚をメモリに展開せずに
+任意の大きさの部分集合を取り出せます。
+
+    python mnist_data.py                 # 各分割の件数と数字ごとの件数
+    python mnist_data.py --convert       # IDXを .npy に変換
+"""
+
+import gzip
+import os
+import shutil
+
+import numpy as np
+
+from dataset_cache import cache_dir
+from model_store import atomic_write
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MNIST_DIR = os.path.join(ML_DIR, "data", "mnist")
+# 分割名とIDXファイル名の接頭辞
+SPLITS = {"train": "train", "test": "t10k"}
+# IDXのヘッダーの型コードとdtype（値はビッグエンディアン）
+IDX_DTYPES = {
+    0x08: np.dtype(np.uint8),
+    0x09: np.dtype(np.int8),
+    0x0B: np.dtype(">i2"),
+    0x0C: np.dtype(">i4"),
+    0x0D: np.dtype(">f4"),
+    0x0E: np.dtype(">f8"),
+}
+
+
+def mnist_dir():
+    return os.environ.get("MNIST_DIR") or DEFAULT_MNIST_DIR
+
+
+def read_idx_header(path):
+    """
+    IDXファイルのヘッダーを読み、(dtype, shape, データの開始位置) を返します。
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        if len(magic) != 4 or magic[:2] != b"\x00\x00" or magic[2] not in IDX_DTYPES:
+            raise ValueError(f"IDX形式のファイルではありません: {path}")
+        ndim = magic[3]
+        shape = tuple(int(n) for n in np.frombuffer(f.read(4 * ndim), dtype=">u4"))
+    if len(shape) != ndim:
+        raise ValueError(f"IDXのヘッダーが壊れています: {path}")
+    return IDX_DTYPES[magic[2]], shape, 4 + 4 * ndim
+
+
+def read_idx(path):
+    """
+    IDXファイルを読み取り専用の np.memmap として開きます。
+    .gz の場合は展開したファイルをキャッシュしてから開きます。
+    """
+    if path.endswith(".gz"):
+        path = _decompressed(path)
+    dtype, shape, offset = read_idx_header(path)
+    expected = offset + dtype.itemsize * int(np.prod(shape))
+    if os.path.getsize(path) != expected:
+        raise ValueError(f"IDXファイルの大きさがヘッダーと一致しません: {path}")
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def _decompressed(path):
+    """
+    .gzを展開したファイルのパスを返します。ファイル名・大きさ・更新時刻が
+    同じであれば、以前に展開したファイルを再利用します。
+    """
+    stat = os.stat(path)
+    name = os.path.basename(path)[: -len(".gz")]
+    target = os.path.join(
+        cache_dir(), f"mnist-{name}-{stat.st_size}-{int(stat.st_mtime)}"
+    )
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        def write(tmp_path):
+            with gzip.open(path, "rb") as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+
+        atomic_write(target, write)
+    return target
+
+
+def _find(directory, split, kind):
+    """
+    分割とkind（images / labels）のファイルを .npy、IDX、IDX.gz の順に探します。
+    """
+    prefix = SPLITS[split]
+    ndim = 3 if kind == "images" else 1
+    candidates = [
+        os.path.join(directory, f"{split}-{kind}.npy"),
+        os.path.join(directory, f"{prefix}-{kind}-idx{ndim}-ubyte"),
+        os.path.join(directory, f"{prefix}-{kind}.idx{ndim}-ubyte"),
+    ]
+    candidates += [path + ".gz" for path in candidates[1:]]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(
+        f"MNISTの{split}の{kind}が見つかりません: {directory} "
+        f"（{os.path.basename(candidates[1])} または "
+        f"{os.path.basename(candidates[0])} を配置してください）"
+    )
+
+
+def _open(path):
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    return read_idx(path)
+
+
+def load_mnist(split="train", directory=None):
+    """
+    MNISTの分割（train / test）を (images, labels) で返します。
+    imagesはメモリマップしたuint8の (N, 784) 配列、labelsは (N,) の配列です。
+    """
+    if split not in SPLITS:
+        raise ValueError(f"未対応の分割です: {split}（{' / '.join(SPLITS)}）")
+    directory = directory or mnist_dir()
+
+    images = _open(_find(directory, split, "images"))
+    labels = _open(_find(directory, split, "labels"))
+    if images.dtype != np.uint8 or len(images) != len(labels):
+        raise ValueError(f"MNISTの画像とラベルが対応していません: {directory}")
+    return images.reshape(len(images), -1), labels
+
+
+def stratified_subset(labels, n_samples, seed=0):
+    """
+    各ラベルの割合を保ったn_samples件の添字を昇順で返します。
+    各ラベルの件数は割合に最も近い整数になるよう、端数の大きい順に割り振ります。
+    """
+    labels = np.asarray(labels)
+    if not 0 < n_samples <= len(labels):
+        raise ValueError(f"件数は1〜{len(labels)}で指定してください: {n_samples}")
+
+    rng = np.random.default_rng(seed)
+    classes, counts = np.unique(labels, return_counts=True)
+    quotas = counts * n_samples / len(labels)
+    taken = np.floor(quotas).astype(int)
+    remainder = n_samples - taken.sum()
+    taken[np.argsort(taken - quotas, kind="stable")[:remainder]] += 1
+
+    indices = [
+        rng.choice(np.flatnonzero(labels == label), size=k, replace=False)
+        for label, k in zip(classes, taken)
+    ]
+    return np.sort(np.concatenate(indices))
+
+
+def load_subset(n_samples, split="train", seed=0, directory=None):
+    """
+    分割から数字の割合を保ったn_samples件を選び、uint8の (X, y) を返します。
+    画像はメモリマップから選んだ行だけを読み込みます。
+    """
+    images, labels = load_mnist(split, directory)
+    index = stratified_subset(labels, n_samples, seed)
+    return np.asarray(images[index]), np.asarray(labels[index], dtype=int)
+
+
+def convert(directory=None):
+    """
+    ディレクトリのIDXファイルを、同じディレクトリの .npy に変換します。
+    """
+    directory = directory or mnist_dir()
+    for split in SPLITS:
+        for kind in ("images", "labels"):
+            target = os.path.join(directory, f"{split}-{kind}.npy")
+            source = _find(directory, split, kind)
+            if source == target:
+                continue
+            array = read_idx(source)
+            if kind == "images":
+                array = array.reshape(len(array), -1)
+            atomic_write(target, lambda tmp_path: _save_npy(tmp_path, array))
+            print(f"{os.path.basename(source)} -> {os.path.basename(target)}")
+
+
+def _save_npy(path, array):
+    with open(path, "wb") as f:
+        np.save(f, np.asarray(array))
+
+
+def write_idx(path, array):
+    """
+    uint8の配列をIDX形式で書き出します（.gz の場合は圧縮します）。
+    テスト用の小さなIDXファイルの作成に使います。
+    """
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    header = (
+        bytes([0, 0, 0x08, array.ndim]) + np.array(array.shape, dtype=">u4").tobytes()
+    )
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as f:
+        f.write(header)
+        f.write(array.tobytes())
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ローカルのMNISTファイルの読み込み")
+    parser.add_argument("--dir", help="MNISTのディレクトリ（既定: MNIST_DIR）")
+    parser.add_argument("--convert", action="store_true", help="IDXを .npy に変換する")
+    args = parser.parse_args()
+
+    if args.convert:
+        convert(args.dir)
+        return
+
+    for split in SPLITS:
+        images, labels = load_mnist(split, args.dir)
+        counts = " ".join(str(n) for n in np.bincount(labels, minlength=10))
+        print(f"{split}: {len(images)} 枚 {images.shape[1]} 画素  数字ごと: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+推論用モデルアーティファクトの読み書き。
+
+アーティファクトは単一のバイナリファイルで、次の構成です。
+
+    MAGIC (8バイト) | フォーマットバージョン (uint32) | ヘッダー長 (uint32)
+    | ヘッダー (UTF-8のJSON) | 64バイト境界に揃えた配列データ ...
+
+ヘッダーにはモデルの種類(kind)、スカラーのメタデータ(meta)、各配列の
+dtype・形状・オフセットを記録します。読み込み時はファイル全体を読み取り専用で
+メモリマップし、配列はそのビューとして返すため、複数のワーカープロセスが
+同じページを共有できます。
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"DRMODEL\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_artifact(path, kind, meta, arrays):
+    """
+    モデルの種類・メタデータ・配列をアーティファクトファイルに書き出します。
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # ヘッダー長が決まらないと配列のオフセットが決まらないため、
+    # 配列の位置はヘッダー直後からの相対オフセットで記録する
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+        }
+        offset += array.nbytes
+
+    header = json.dumps(
+        {"kind": kind, "meta": meta, "arrays": layout}, ensure_ascii=False
+    ).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+
+def load_artifact(path, mmap=True):
+    """
+    アーティファクトを読み込み、(kind, meta, arrays) を返します。
+    mmapが真の場合、配列は読み取り専用のメモリマップのビューになります。
+    """
+    with open(path, "rb") as f:
+        magic, version, header_size = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"モデルアーティファクトではありません: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(
+                f"未対応のアーティファクトバージョンです: {version} "
+                f"(対応バージョン: {FORMAT_VERSION}以下)"
+            )
+        header = json.loads(f.read(header_size).decode("utf-8"))
+
+    data_start = _align(_PREAMBLE.size + header_size)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    else:
+        with open(path, "rb") as f:
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        start = data_start + spec["offset"]
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = (
+            buffer[start : start + count * dtype.itemsize].view(dtype).reshape(shape)
+        )
+
+    return header["kind"], header["meta"], arrays
+
+
+def is_artifact(path):
+    """
+    ファイルがモデルアーティファクトかどうかを先頭のマジックバイトで判定します。
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def artifact_path_for(model_path):
+    """
+    pickleモデルのパスに対応するアーティファクトのパスを返します。
+    """
+    return os.path.splitext(model_path)[0] + ".bin"
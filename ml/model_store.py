@@ -0,0 +1,236 @@
+"""
+モデルの公開（アトミックな差し替え）とホットリロード。
+
+訓練スクリプトは publish_model() でモデルを公開します。モデルはバージョン付きの
+ファイル名で models/ に書き込まれ、一時ファイルからのrenameで配置されるため、
+読み込み側が書き込み途中のファイルを見ることはありません。最後にマニフェスト
+(models/manifest.json) を同じくrenameで差し替えた時点で新しいバージョンが公開されます。
+互換性のため、ml/svm_model.pkl と ml/svm_model.bin も同じ内容に差し替えます。
+
+常駐プロセスは ReloadingModel でマニフェストとモデルファイルの変更を監視し、
+新しいモデルをバックグラウンドで読み込んでから参照を差し替えます。
+処理中のリクエストは取得済みの古いモデルでそのまま完了します。
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(ML_DIR, "models")
+MANIFEST_NAME = "manifest.json"
+KEEP_VERSIONS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def manifest_path(models_dir=MODELS_DIR):
+    return os.path.join(models_dir, MANIFEST_NAME)
+
+
+def atomic_write(path, write):
+    """
+    同じディレクトリの一時ファイルに write(一時ファイルのパス) で書き込み、
+    fsyncしてからrenameで path に配置します。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _copy_atomic(source, destination):
+    """
+    destination を source のコピーにアトミックに差し替えます。
+    ハードリンクにすると、destination を直接上書きする既存のスクリプト
+    （create_dummy_model.py など）が公開済みのバージョンまで書き換えるため、常にコピーします。
+    """
+    atomic_write(destination, lambda tmp_path: shutil.copyfile(source, tmp_path))
+
+
+def read_manifest(models_dir=MODELS_DIR):
+    """
+    マニフェストを読み込みます。存在しない場合はNoneを返します。
+    """
+    try:
+        with open(manifest_path(models_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def published_model_path(manifest, models_dir=MODELS_DIR):
+    """
+    マニフェストが指すモデルのパスを返します（アーティファクトを優先）。
+    """
+    for key in ("artifact", "pickle"):
+        name = manifest.get(key)
+        if name and os.path.exists(os.path.join(models_dir, name)):
+            return os.path.join(models_dir, name)
+    return None
+
+
+def _new_version():
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime()) + f"-{os.getpid()}"
+
+
+def publish_model(clf, metadata=None, models_dir=MODELS_DIR, legacy_dir=ML_DIR):
+    """
+    モデルをバージョン付きのpickleとアーティファクトとして書き出し、
+    マニフェストを差し替えて公開します。公開したマニフェストを返します。
+    """
+    import joblib
+
+    from inference_engine import export_model
+
+    os.makedirs(models_dir, exist_ok=True)
+    version = _new_version()
+    pickle_name = f"svm_model-{version}.pkl"
+    artifact_name = f"svm_model-{version}.bin"
+    pickle_path = os.path.join(models_dir, pickle_name)
+    artifact_path = os.path.join(models_dir, artifact_name)
+
+    atomic_write(pickle_path, lambda tmp: joblib.dump(clf, tmp))
+    try:
+        atomic_write(artifact_path, lambda tmp: export_model(clf, tmp))
+    except ValueError as e:
+        # アーティファクトに書き出せないモデルはpickleのみ公開する
+        print(f"アーティファクトの書き出しを省略しました: {e}")
+        artifact_name = None
+
+    # 既存の読み込み先（ml/svm_model.pkl, ml/svm_model.bin）も同じ内容に差し替える
+    if legacy_dir:
+        _copy_atomic(pickle_path, os.path.join(legacy_dir, "svm_model.pkl"))
+        if artifact_name:
+            _copy_atomic(artifact_path, os.path.join(legacy_dir, "svm_model.bin"))
+
+    manifest = {
+        "version": version,
+        "pickle": pickle_name,
+        "artifact": artifact_name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "metadata": metadata or {},
+    }
+    atomic_write(
+        manifest_path(models_dir),
+        lambda tmp: _write_json(tmp, manifest),
+    )
+    _prune_versions(models_dir, manifest)
+    return manifest
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _prune_versions(models_dir, manifest, keep=KEEP_VERSIONS):
+    """
+    古いバージョンのファイルを削除します（新しい順にkeep件を残す）。
+    メモリマップ中のファイルは削除後も読み込み中のプロセスから参照できます。
+    """
+    versions = sorted(
+        {
+            name[len("svm_model-") :].rsplit(".", 1)[0]
+            for name in os.listdir(models_dir)
+            if name.startswith("svm_model-")
+        },
+        reverse=True,
+    )
+    for version in versions[keep:]:
+        if version == manifest["version"]:
+            continue
+        for ext in (".pkl", ".bin"):
+            path = os.path.join(models_dir, f"svm_model-{version}{ext}")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ReloadingModel:
+    """
+    モデルの変更を監視し、必要に応じてバックグラウンドで再読み込みするラッパー。
+
+    load() はモデルを読み込んで返す関数、fingerprint() は変更検出用の値を返す関数です。
+    get() は (モデル, 識別子) を返し、poll_interval 秒ごとに fingerprint() を確認します。
+    変化があれば別スレッドで新しいモデルを読み込んで試験的に推論し、
+    完了後の get() から新しいモデルに切り替えます。読み込みに失敗した場合は
+    古いモデルを使い続け、fingerprint() がさらに変わるまで同じモデルは読み込みません。
+    """
+
+    def __init__(self, load, fingerprint, poll_interval=1.0, clock=time.monotonic):
+        self._load = load
+        self._fingerprint = fingerprint
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._loading = False
+        # 読み込みに失敗したモデルの識別子（再公開されるまで再試行しない）
+        self._failed = None
+        self.reloads = 0
+
+        self.version = fingerprint()
+        self.model = load()
+        self._last_check = clock()
+
+    def get(self):
+        now = self._clock()
+        if now - self._last_check >= self.poll_interval:
+            self._last_check = now
+            self._check()
+
+        with self._lock:
+            return self.model, self.version
+
+    def _check(self):
+        version = self._fingerprint()
+        with self._lock:
+            if version in (self.version, self._failed) or self._loading:
+                return
+            self._loading = True
+
+        thread = threading.Thread(target=self._reload, args=(version,), daemon=True)
+        thread.start()
+
+    def _reload(self, version):
+        try:
+            model = self._load()
+            _warm_up(model)
+        except Exception as e:
+            logger.warning("モデルの再読み込みに失敗しました: %s", e)
+            with self._lock:
+                self._failed = version
+                self._loading = False
+            return
+
+        with self._lock:
+            self.model = model
+            self.version = version
+            self.reloads += 1
+            self._failed = None
+            self._loading = False
+        logger.info("モデルを切り替えました: %s", version)
+
+
+def _warm_up(model):
+    """
+    切り替え直後のリクエストが遅くならないよう、1回推論してページを読み込んでおきます。
+    """
+    import numpy as np
+
+    n_features = getattr(model, "n_features", None)
+    if n_features:
+        model.scores(np.zeros((1, n_features)))
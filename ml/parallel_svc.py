@@ -0,0 +1,183 @@
+"""
+RBFカーネルSVCの一対一分類器をプロセスプールで並列に訓練するモデル。
+
+svm.SVC.fit は45個の二値分類器（数字の組ごと）を1コアで順に訓練します。
+ParallelSVC は訓練データをfloat64の .npy に書き出し、各ワーカーがそれを
+メモリマップで開いて、組ごとの二値のSVCを訓練します。結果はlibsvmと同じ
+配置（クラス順のサポートベクターと一対一の双対係数・切片）にまとめるため、
+svm.SVC と同じ決定値になり、推論エンジン（RBFSVCEngine）でそのまま推論できます。
+
+二値の部分問題は、libsvmが多クラスの訓練で解くものと同じです
+（同じデータの並び・gamma・クラスごとの重み付きC・サンプルの重み）。
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+from classifiers import scale_gamma
+
+# ワーカーごとに開いた訓練データ（_open_shared() で設定）
+_shared = {}
+
+
+def _open_shared(X_path, y, sample_weight, params):
+    _shared["X"] = np.load(X_path, mmap_mode="r")
+    _shared["y"] = y
+    _shared["sample_weight"] = sample_weight
+    _shared["params"] = params
+
+
+def _fit_pair(pair):
+    """
+    数字の組 (i, j) の二値SVCを訓練し、サポートベクターの添字（訓練データ全体での
+    位置）・libsvm内部の符号の双対係数・切片を返します。
+    """
+    from sklearn import svm
+
+    i, j = pair
+    y = _shared["y"]
+    params = _shared["params"]
+    index = np.flatnonzero((y == i) | (y == j))
+    class_weight = params["class_weight"]
+    if class_weight is not None:
+        class_weight = {i: class_weight[i], j: class_weight[j]}
+
+    clf = svm.SVC(
+        kernel="rbf",
+        C=params["C"],
+        gamma=params["gamma"],
+        tol=params["tol"],
+        cache_size=params["cache_size"],
+        class_weight=class_weight,
+    )
+    sample_weight = _shared["sample_weight"]
+    clf.fit(
+        np.asarray(_shared["X"][index]),
+        y[index],
+        sample_weight=None if sample_weight is None else sample_weight[index],
+    )
+    # 二値のSVCは公開する係数と切片の符号を反転しているため、内部の値を使う
+    return i, j, index[clf.support_], clf._dual_coef_[0], clf._intercept_[0]
+
+
+class ParallelSVC(ClassifierMixin, BaseEstimator):
+    """
+    svm.SVC(kernel="rbf") と同じモデルを、一対一の二値分類器をn_jobsプロセスで
+    並列に訓練して求めます。n_jobsがNoneの場合はCPUコア数を使います。
+    訓練後は svm.SVC と同じ名前の属性を持ち、推論エンジンに変換できます。
+    """
+
+    kernel = "rbf"
+
+    def __init__(
+        self,
+        C=1.0,
+        gamma="scale",
+        class_weight=None,
+        tol=1e-3,
+        cache_size=200,
+        n_jobs=None,
+    ):
+        self.C = C
+        self.gamma = gamma
+        self.class_weight = class_weight
+        self.tol = tol
+        self.cache_size = cache_size
+        self.n_jobs = n_jobs
+
+    def fit(self, X, y, sample_weight=None):
+        from sklearn.utils.class_weight import compute_class_weight
+
+        X = np.asarray(X, dtype=np.float64)
+        self.n_features_in_ = X.shape[1]
+        self.classes_, y = np.unique(np.asarray(y), return_inverse=True)
+        if sample_weight is not None:
+            sample_weight = np.asarray(sample_weight, dtype=np.float64)
+
+        if self.gamma == "scale":
+            self._gamma = scale_gamma(X)
+        elif self.gamma == "auto":
+            self._gamma = 1.0 / X.shape[1]
+        else:
+            self._gamma = float(self.gamma)
+
+        class_weight = None
+        if self.class_weight is not None:
+            # 多クラスのSVCと同じく、クラスの重みは訓練データ全体から求める
+            class_weight = compute_class_weight(
+                self.class_weight, classes=self.classes_, y=self.classes_[y]
+            )
+        params = {
+            "C": self.C,
+            "gamma": self._gamma,
+            "tol": self.tol,
+            "cache_size": self.cache_size,
+            "class_weight": class_weight,
+        }
+
+        n_classes = len(self.classes_)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        n_jobs = min(self.n_jobs or os.cpu_count() or 1, len(pairs))
+
+        with tempfile.TemporaryDirectory() as directory:
+            X_path = os.path.join(directory, "X.npy")
+            np.save(X_path, X)
+            del X
+            initargs = (X_path, y, sample_weight, params)
+            if n_jobs <= 1:
+                _open_shared(*initargs)
+                try:
+                    results = [_fit_pair(pair) for pair in pairs]
+                finally:
+                    _shared.clear()
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=n_jobs, initializer=_open_shared, initargs=initargs
+                ) as executor:
+                    results = list(executor.map(_fit_pair, pairs))
+
+            self._assemble(results, y, np.load(X_path, mmap_mode="r"))
+        return self
+
+    def _assemble(self, results, y, X):
+        """
+        組ごとの結果を、libsvmの多クラスモデルと同じ配置にまとめます。
+        サポートベクターはクラス順・クラス内は訓練データの順に並べます。
+        """
+        n_classes = len(self.classes_)
+        support = np.unique(np.concatenate([sv for _, _, sv, _, _ in results]))
+        support = support[np.argsort(y[support], kind="stable")]
+        position = np.empty(len(y), dtype=np.intp)
+        position[support] = np.arange(len(support))
+
+        dual_coef = np.zeros((n_classes - 1, len(support)))
+        intercept = np.empty(len(results))
+        for p, (i, j, sv, coef, rho) in enumerate(results):
+            in_i = y[sv] == i
+            dual_coef[j - 1, position[sv[in_i]]] = coef[in_i]
+            dual_coef[i, position[sv[~in_i]]] = coef[~in_i]
+            intercept[p] = rho
+
+        self.support_ = support
+        self.support_vectors_ = np.asarray(X[support])
+        self._n_support = np.bincount(y[support], minlength=n_classes).astype(np.int32)
+        self.n_support_ = self._n_support
+        self._dual_coef_ = self.dual_coef_ = dual_coef
+        self._intercept_ = self.intercept_ = intercept
+
+    def decision_function(self, X):
+        """
+        decision_function_shape="ovr" のSVCと同じ形式のクラス別スコアを返します。
+        """
+        from inference_engine import RBFSVCEngine
+
+        return RBFSVCEngine.from_sklearn(self).scores(X)[1]
+
+    def predict(self, X):
+        from inference_engine import RBFSVCEngine
+
+        return RBFSVCEngine.from_sklearn(self).scores(X)[0]
@@ -4,166 +4,925 @@
 アップロードされた画像を処理し、訓練済みSVMモデルを使用して数字を予測します。
 """
 
+import argparse
+import contextlib
+import io
 import sys
 import json
-import numpy as np
-from PIL import Image, ImageOps
-import joblib
+import logging
 import os
 import time
 
+# numpy・PIL・推論エンジンは起動時間を抑えるため、必要になる関数の中でインポートする
+# （引数エラーやファイルが存在しない場合は読み込まずに終了できる）
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+BATCH_SIZE = 256
+TOP_K = 3
+FEATURE_SIZE = 28 * 28
+# 長辺がこの大きさ以上の画像は、最終リサイズの前に整数倍の縮小をかける
+FAST_DOWNSCALE_MIN_SIZE = 28 * 8
+# 縮小後も長辺がこの大きさ以上になるようにし、LANCZOSの品質を保つ
+DOWNSCALE_TARGET_SIZE = 28 * 4
+# 結果キャッシュの既定の件数と有効期限（秒）。環境変数 PREDICT_CACHE_SIZE /
+# PREDICT_CACHE_TTL はインポート時ではなく main() で読む（不正な値は警告して既定値）
+CACHE_SIZE = 0
+CACHE_TTL = 300.0
+# 常駐モードでモデルの更新を確認する既定の間隔（秒）。
+# 環境変数 PREDICT_RELOAD_INTERVAL は serve() の開始時に読む
+RELOAD_INTERVAL = 1.0
+# 標準エラーに出力するログのレベル（DEBUGで処理の詳細を出力）
+LOG_LEVEL = os.environ.get("PREDICT_LOG_LEVEL", "WARNING").upper()
+# 真の場合、結果のJSONに処理段階ごとの所要時間(timings)を含める
+TIMINGS = os.environ.get("PREDICT_TIMINGS", "") not in ("", "0", "false")
+# 指定した場合、既定のモデルの代わりにこのファイルを使う（負荷試験用のモデルなど）
+MODEL_PATH = os.environ.get("PREDICT_MODEL_PATH")
+USAGE = (
+    "使用方法: python predict.py <画像ファイルパス|ディレクトリ> [...] [--top-k N]"
+    " [--startup-report] [--cache-size N] [--cache-ttl 秒]"
+    " [--timings] [--request-id ID] | --serve"
+)
+
+logger = logging.getLogger("predict")
+
+
+class Timings:
+    """
+    処理段階ごとの所要時間（ミリ秒）を記録します。
+    同じ名前の区間を複数回計測した場合は合計します。
+    """
 
-def detect_background_color(image):
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = {}
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1e3
+            self.spans[name] = self.spans.get(name, 0.0) + elapsed
+
+    def as_dict(self):
+        spans = {name: round(value, 3) for name, value in self.spans.items()}
+        spans["total"] = round((time.perf_counter() - self.start) * 1e3, 3)
+        return spans
+
+
+class _NullTimings:
     """
-    画像の四隅と縁から主な背景色（黒または白）を検出します。
+    計測しない場合に使う、何も記録しないTimings。
+    """
+
+    def span(self, name):
+        return contextlib.nullcontext()
+
+
+_NO_TIMINGS = _NullTimings()
+
+
+def to_grayscale_array(image):
     """
+    PIL画像または画像のnumpy配列を、(高さ, 幅)のuint8グレースケール配列に変換します。
+    """
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2 and image.dtype == np.uint8:
+            return image
+        image = Image.fromarray(image)
+
     if image.mode != "L":
         image = image.convert("L")
+    return np.asarray(image)
 
-    width, height = image.size
 
-    # 四隅の画素を取得
-    corner_pixels = [
-        image.getpixel((0, 0)),
-        image.getpixel((width - 1, 0)),
-        image.getpixel((0, height - 1)),
-        image.getpixel((width - 1, height - 1)),
-    ]
+def _image_size(image):
+    import numpy as np
 
-    # 上下左右の縁の画素もサンプリング
-    edge_pixels = []
-    for i in range(0, width, max(1, width // 10)):
-        edge_pixels.append(image.getpixel((i, 0)))  # 上縁
-        edge_pixels.append(image.getpixel((i, height - 1)))  # 下縁
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
 
-    for i in range(0, height, max(1, height // 10)):
-        edge_pixels.append(image.getpixel((0, i)))  # 左縁
-        edge_pixels.append(image.getpixel((width - 1, i)))  # 右縁
 
-    all_pixels = corner_pixels + edge_pixels
-    avg_value = np.mean(all_pixels)
+def downscale_for_resize(image):
+    """
+    大きな画像を、長辺がDOWNSCALE_TARGET_SIZE以上に収まる範囲で整数倍に縮小します。
+    JPEGファイルから開いた未読み込みの画像はdraftで縮小デコードし、
+    その後Image.reduceで縮小します。小さな画像はそのまま返します。
+    """
+    import numpy as np
+    from PIL import Image
+
+    width, height = _image_size(image)
+    max_dim = max(width, height)
+    if max_dim < FAST_DOWNSCALE_MIN_SIZE:
+        return image
+
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    elif image.format == "JPEG":
+        # 縮小後の長辺がDOWNSCALE_TARGET_SIZEを下回らない範囲でデコード時に縮小
+        scale = DOWNSCALE_TARGET_SIZE / max_dim
+        image.draft("L", (int(np.ceil(width * scale)), int(np.ceil(height * scale))))
+        max_dim = max(image.size)
 
-    return "white" if avg_value > 127 else "black"
+    if image.mode != "L":
+        image = image.convert("L")
 
+    factor = max_dim // DOWNSCALE_TARGET_SIZE
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
 
-def preprocess_image(image_path):
+
+def detect_background_color(image):
     """
-    MNISTデータセットと同じ形式に画像を前処理します。
+    画像の四隅と縁から主な背景色（黒または白）を検出します。
+    PIL画像またはuint8配列を受け付けます。
     """
-    try:
-        # Debug: Log processing start
-        print(f"DEBUG: 画像前処理開始: {os.path.basename(image_path)}", file=sys.stderr)
+    import numpy as np
+
+    pixels = to_grayscale_array(image)
+    height, width = pixels.shape
+    step_x = max(1, width // 10)
+    step_y = max(1, height // 10)
+
+    # 四隅と、上下左右の縁を一定間隔でサンプリングした画素
+    samples = (
+        pixels[[0, 0, -1, -1], [0, -1, 0, -1]],
+        pixels[0, ::step_x],  # 上縁
+        pixels[-1, ::step_x],  # 下縁
+        pixels[::step_y, 0],  # 左縁
+        pixels[::step_y, -1],  # 右縁
+    )
+    total = sum(int(sample.sum(dtype=np.int64)) for sample in samples)
+    count = sum(sample.size for sample in samples)
+    avg_value = total / count
 
-        image = Image.open(image_path)
-        original_size = image.size
-        image = image.convert("L")
+    return "white" if avg_value > 127 else "black"
 
-        bg_color = detect_background_color(image)
-        print(f"DEBUG: 背景色検出: {bg_color}", file=sys.stderr)
 
-        if bg_color == "white":
-            image = ImageOps.invert(image)
-            print("DEBUG: 白背景のため画像を反転", file=sys.stderr)
+def preprocess_array(image, bg_color=None, fast=True):
+    """
+    PIL画像またはuint8配列をMNISTデータセットと同じ形式に前処理し、
+    784要素のC連続なfloat32ベクトルを返します。
+    bg_colorを省略した場合は背景色を検出します。
+    fastが真の場合、大きな画像は先に整数倍で縮小してから処理します。
+    """
+    import numpy as np
+    from PIL import Image
+
+    if fast:
+        image = downscale_for_resize(image)
+    pixels = to_grayscale_array(image)
+
+    if bg_color is None:
+        bg_color = detect_background_color(pixels)
+    if bg_color == "white":
+        pixels = 255 - pixels
+
+    # 黒背景で中央に配置して正方形にする（既に正方形ならコピーしない）
+    height, width = pixels.shape
+    max_dim = max(width, height)
+    if height != width:
+        pad_y = (max_dim - height) // 2
+        pad_x = (max_dim - width) // 2
+        pixels = np.pad(
+            pixels,
+            ((pad_y, max_dim - height - pad_y), (pad_x, max_dim - width - pad_x)),
+        )
 
-        width, height = image.size
-        max_dim = max(width, height)
+    # 28x28にリサイズして正規化
+    resized = Image.fromarray(pixels).resize((28, 28), Image.Resampling.LANCZOS)
+    features = np.asarray(resized, dtype=np.float32).reshape(FEATURE_SIZE)
+    return features / np.float32(255.0)
 
-        # 正方形の画像を作成（黒背景）
-        square_image = Image.new("L", (max_dim, max_dim), color=0)
-        paste_x = (max_dim - width) // 2
-        paste_y = (max_dim - height) // 2
-        square_image.paste(image, (paste_x, paste_y))
 
-        # 28x28にリサイズ
-        resized_image = square_image.resize((28, 28), Image.Resampling.LANCZOS)
-        image_array = np.array(resized_image)
+def _describe_image(image):
+    """
+    ログ出力用に画像の入力元を表す文字列を返します。
+    """
+    if isinstance(image, (str, os.PathLike)):
+        return os.path.basename(image)
+    if isinstance(image, bytes):
+        return f"<{len(image)} bytes>"
+    return type(image).__name__
 
-        # 正規化
-        image_array = image_array.astype(np.float32) / 255.0
 
-        print(
-            f"DEBUG: 前処理完了 - 元サイズ: {original_size}, 最終サイズ: {image_array.shape}",
-            file=sys.stderr,
-        )
+def preprocess_image(image_path, timings=None):
+    """
+    MNISTデータセットと同じ形式に画像を前処理します。
+    画像ファイルパスのほか、画像ファイルのバイト列、PIL画像、画像のnumpy配列も受け付けます。
+    timingsにTimingsを指定すると、decode・background・resizeの所要時間を記録します。
+    """
+    import numpy as np
+    from PIL import Image
 
-        return image_array.flatten()
+    timings = timings or _NO_TIMINGS
+    try:
+        logger.debug("画像前処理開始: %s", _describe_image(image_path))
+
+        # 大きな画像は正方形キャンバスを作る前に縮小しておく
+        with timings.span("decode"):
+            if isinstance(image_path, (Image.Image, np.ndarray)):
+                original_size = _image_size(image_path)
+                pixels = to_grayscale_array(downscale_for_resize(image_path))
+            else:
+                if isinstance(image_path, bytes):
+                    image_path = io.BytesIO(image_path)
+                with Image.open(image_path) as image:
+                    original_size = image.size
+                    pixels = to_grayscale_array(downscale_for_resize(image))
+
+        with timings.span("background"):
+            bg_color = detect_background_color(pixels)
+        logger.debug("背景色検出: %s", bg_color)
+
+        with timings.span("resize"):
+            features = preprocess_array(pixels, bg_color=bg_color, fast=False)
+
+        logger.debug("前処理完了 - 元サイズ: %s, 最終サイズ: (28, 28)", original_size)
+        return features
 
     except Exception as e:
-        print(f"DEBUG: 前処理エラー: {str(e)}", file=sys.stderr)
+        logger.debug("前処理エラー: %s", e)
         raise Exception(f"画像の前処理中にエラーが発生しました: {str(e)}")
 
 
-def predict_digit(image_path):
+def default_model_path():
     """
-    訓練済みSVMモデルを使用して数字を予測します。
+    既定のモデルファイルのパスを返します。
+    公開済みのマニフェスト(models/manifest.json)があればそれが指すモデルを使います。
+    ただし svm_model.pkl がマニフェストより新しい場合（直接上書きされた場合）は
+    そちらを優先します。書き出し済みのアーティファクト(svm_model.bin)が
+    pickleより新しければそちらを使います。
+    環境変数 PREDICT_MODEL_PATH が指定されている場合は常にそのファイルを使います。
     """
-    try:
-        start_time = time.time()
-        print(f"DEBUG: 予測開始: {os.path.basename(image_path)}", file=sys.stderr)
+    if MODEL_PATH:
+        return MODEL_PATH
+
+    from model_artifact import artifact_path_for
+    from model_store import manifest_path, published_model_path, read_manifest
+
+    pickle_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+    artifact_path = artifact_path_for(pickle_path)
 
-        model_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+    manifest = read_manifest()
+    if manifest is not None and (
+        not os.path.exists(pickle_path)
+        or os.path.getmtime(manifest_path()) >= os.path.getmtime(pickle_path)
+    ):
+        published_path = published_model_path(manifest)
+        if published_path is not None:
+            return published_path
+
+    if os.path.exists(artifact_path) and (
+        not os.path.exists(pickle_path)
+        or os.path.getmtime(artifact_path) >= os.path.getmtime(pickle_path)
+    ):
+        return artifact_path
+    return pickle_path
+
+
+def load_model(model_path=None, timings=None):
+    """
+    訓練済みモデルを読み込み、推論エンジンを返します。
+    アーティファクトはメモリマップで読み込むため、scikit-learnをインポートしません。
+    pickleの場合のみjoblibで読み込み、推論エンジンに変換します。
+    """
+    timings = timings or _NO_TIMINGS
+    with timings.span("model_load"):
+        from inference_engine import as_engine, load_engine
+        from model_artifact import is_artifact
+
+        if model_path is None:
+            model_path = default_model_path()
 
         if not os.path.exists(model_path):
-            print(
-                f"DEBUG: モデルファイルが見つかりません: {model_path}", file=sys.stderr
-            )
+            logger.debug("モデルファイルが見つかりません: %s", model_path)
             raise Exception(f"モデルファイルが見つかりません: {model_path}")
 
-        print("DEBUG: モデル読み込み中...", file=sys.stderr)
-        clf = joblib.load(model_path)
+        logger.debug("モデル読み込み中: %s", model_path)
+        if is_artifact(model_path):
+            return load_engine(model_path)
 
-        print("DEBUG: 画像前処理中...", file=sys.stderr)
-        image_features = preprocess_image(image_path)
-        image_features = image_features.reshape(1, -1)
+        import joblib
 
-        print("DEBUG: 予測実行中...", file=sys.stderr)
-        prediction = clf.predict(image_features)[0]
-        confidence_scores = clf.decision_function(image_features)[0]
-        max_confidence = np.max(confidence_scores)
-        normalized_confidence = 1.0 / (1.0 + np.exp(-max_confidence))
+        return as_engine(joblib.load(model_path))
 
-        end_time = time.time()
-        processing_time = end_time - start_time
 
-        print(
-            f"DEBUG: 予測完了 - 結果: {prediction}, 信頼度: {normalized_confidence:.3f}, 処理時間: {processing_time:.3f}秒",
-            file=sys.stderr,
+def score_features(clf, features, top_k=TOP_K, timings=None):
+    """
+    (N, 784)の特徴量行列をまとめて推論し、画像ごとの結果の辞書のリストを返します。
+    カーネル計算は1回だけ行い、予測ラベル・信頼度・上位top_k件の候補を導出します。
+    候補の信頼度はスコアのソフトマックスで、上位ほど大きく合計は1以下です。
+    """
+    import numpy as np
+    from inference_engine import as_engine
+
+    engine = as_engine(clf)
+    with (timings or _NO_TIMINGS).span("kernel"):
+        labels, scores = engine.scores(features)
+    # 予測の信頼度は従来どおり最大スコアのシグモイド。近似カーネルモデルでは
+    # スコアの絶対値が大きくなるため、exp が溢れない形 exp(-log(1 + exp(-x))) で求める
+    confidences = np.exp(-np.logaddexp(0.0, -scores.max(axis=1)))
+    # 候補どうしを比べられるよう、候補の信頼度は行ごとのソフトマックス（合計1）
+    exp_scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+    probabilities = exp_scores / exp_scores.sum(axis=1, keepdims=True)
+    ranking = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+
+    results = []
+    for label, confidence, row, order in zip(
+        labels, confidences, probabilities, ranking
+    ):
+        results.append(
+            {
+                "digit": int(label),
+                "confidence": float(confidence),
+                "top_k": [
+                    {"digit": int(engine.classes[c]), "confidence": float(row[c])}
+                    for c in order
+                ],
+            }
+        )
+    return results
+
+
+def _to_features(item, timings=None):
+    """
+    predict_batchの入力要素を784次元の特徴ベクトルに変換します。
+    """
+    import numpy as np
+
+    if (
+        isinstance(item, np.ndarray)
+        and item.ndim == 1
+        and item.size == FEATURE_SIZE
+        and item.dtype.kind == "f"
+    ):
+        # 前処理済みの特徴ベクトル
+        return item.astype(np.float32, copy=False)
+
+    if isinstance(item, (str, os.PathLike)) and not os.path.exists(item):
+        raise Exception(f"画像ファイルが見つかりません: {item}")
+
+    return preprocess_image(item, timings)
+
+
+def model_fingerprint(model_path=None):
+    """
+    モデルファイルの更新を検出するための識別子（パス・更新時刻・サイズ）を返します。
+    既定のモデルの場合はマニフェストも対象にします。
+    """
+    from model_store import manifest_path
+
+    model_path = model_path or MODEL_PATH
+    pickle_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
+    paths = (
+        [model_path]
+        if model_path
+        else [manifest_path(), pickle_path, pickle_path[:-4] + ".bin"]
+    )
+
+    fingerprint = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def _prepare_features(item, top_k, cache=None, timings=None):
+    """
+    入力を特徴ベクトルに変換します。キャッシュが指定されている場合は先に
+    ファイルのバイト列、次に量子化した特徴量をキーにキャッシュを検索し、
+    (特徴量, キャッシュ済みの結果, キャッシュキー) を返します。
+    """
+    if cache is None:
+        return _to_features(item, timings), None, None
+
+    timings = timings or _NO_TIMINGS
+    bytes_key = None
+    if isinstance(item, (str, os.PathLike)):
+        if not os.path.exists(item):
+            raise Exception(f"画像ファイルが見つかりません: {item}")
+        with timings.span("decode"), open(item, "rb") as f:
+            item = f.read()
+
+    if isinstance(item, bytes):
+        with timings.span("cache"):
+            bytes_key = cache.bytes_key(item, top_k)
+            result, level = cache.lookup(bytes_key=bytes_key, record_miss=False)
+        if result is not None:
+            return None, {**result, "cache": cache.metadata(level)}, None
+
+    features = _to_features(item, timings)
+    with timings.span("cache"):
+        features_key = cache.features_key(features, top_k)
+        result, level = cache.lookup(bytes_key=bytes_key, features_key=features_key)
+    if result is not None:
+        return None, {**result, "cache": cache.metadata(level)}, None
+
+    return features, None, (bytes_key, features_key)
+
+
+def _store_result(result, cache, keys):
+    """
+    推論結果をキャッシュに登録し、キャッシュ情報を付加した結果を返します。
+    """
+    if cache is None:
+        return result
+
+    bytes_key, features_key = keys
+    cache.store(result, bytes_key=bytes_key, features_key=features_key)
+    return {**result, "cache": cache.metadata(None)}
+
+
+def iter_predictions(
+    paths_or_arrays,
+    clf=None,
+    batch_size=BATCH_SIZE,
+    top_k=TOP_K,
+    cache=None,
+    timings=None,
+):
+    """
+    画像をbatch_size件ずつ前処理し、チャンク単位でまとめて推論した結果を
+    入力順に1件ずつ返すジェネレータです。
+    cacheにResultCacheを指定すると、同じ画像の結果を再利用します。
+    timingsにTimingsを指定すると、全画像の段階ごとの所要時間を合計して記録します。
+    """
+    if clf is None:
+        clf = load_model(timings=timings)
+
+    chunk = []
+    for item in paths_or_arrays:
+        chunk.append(item)
+        if len(chunk) >= batch_size:
+            yield from _predict_chunk(chunk, clf, top_k, cache, timings)
+            chunk = []
+
+    if chunk:
+        yield from _predict_chunk(chunk, clf, top_k, cache, timings)
+
+
+def _predict_chunk(items, clf, top_k, cache=None, timings=None):
+    import numpy as np
+
+    results = [None] * len(items)
+    features = []
+    indices = []
+    keys = []
+
+    for i, item in enumerate(items):
+        try:
+            item_features, cached, item_keys = _prepare_features(
+                item, top_k, cache, timings
+            )
+        except Exception as e:
+            results[i] = {"error": str(e)}
+            continue
+
+        if cached is not None:
+            results[i] = cached
+        else:
+            features.append(item_features)
+            indices.append(i)
+            keys.append(item_keys)
+
+    if features:
+        scored = score_features(clf, np.vstack(features), top_k=top_k, timings=timings)
+        for i, result, item_keys in zip(indices, scored, keys):
+            results[i] = _store_result(result, cache, item_keys)
+
+    return results
+
+
+def predict_batch(
+    paths_or_arrays,
+    clf=None,
+    batch_size=BATCH_SIZE,
+    top_k=TOP_K,
+    cache=None,
+    timings=None,
+):
+    """
+    複数の画像をまとめて予測します。
+    要素には画像ファイルパス、PIL画像、画像のnumpy配列、または前処理済みの
+    784次元特徴ベクトルを指定できます。画像はbatch_size件ごとに(N, 784)の
+    行列へまとめ、SVMの推論を1回で行います。
+    前処理に失敗した要素には {"error": ...} を返し、残りの予測は継続します。
+    """
+    return list(
+        iter_predictions(
+            paths_or_arrays,
+            clf=clf,
+            batch_size=batch_size,
+            top_k=top_k,
+            cache=cache,
+            timings=timings,
         )
+    )
 
-        return {"digit": int(prediction), "confidence": float(normalized_confidence)}
+
+def predict_digit(image_path, clf=None, top_k=TOP_K, cache=None, timings=None):
+    """
+    訓練済みSVMモデルを使用して数字を予測します。
+    clfが渡された場合は読み込み済みのモデルを再利用します。
+    cacheにResultCacheを指定すると、同じ画像の結果を再利用します。
+    timingsにTimingsを指定すると、処理段階ごとの所要時間を記録します。
+    """
+    try:
+        start_time = time.perf_counter()
+        logger.debug("予測開始: %s", _describe_image(image_path))
+
+        if clf is None:
+            clf = load_model(timings=timings)
+
+        image_features, cached, keys = _prepare_features(
+            image_path, top_k, cache, timings
+        )
+        if cached is not None:
+            logger.debug("キャッシュ済みの結果を返します")
+            return cached
+        image_features = image_features.reshape(1, -1)
+
+        result = score_features(clf, image_features, top_k=top_k, timings=timings)[0]
+        result = _store_result(result, cache, keys)
+
+        logger.debug(
+            "予測完了 - 結果: %s, 信頼度: %.3f, 処理時間: %.3f秒",
+            result["digit"],
+            result["confidence"],
+            time.perf_counter() - start_time,
+        )
+        return result
 
     except Exception as e:
-        print(f"DEBUG: 予測エラー: {str(e)}", file=sys.stderr)
+        logger.debug("予測エラー: %s", e)
         raise Exception(f"予測中にエラーが発生しました: {str(e)}")
 
 
+def dumps_response(response, timings=None, request_id=None):
+    """
+    結果の辞書をJSON文字列にします。request_idを指定すると結果に含めます。
+    timingsを指定すると、このJSON化の時間をserializationとして記録し、
+    各段階の所要時間を "timings" として末尾に追加します。
+    """
+    if request_id is not None:
+        response = {**response, "request_id": request_id}
+    if timings is None:
+        return json.dumps(response)
+
+    with timings.span("serialization"):
+        body = json.dumps(response)
+    separator = ", " if len(body) > 2 else ""
+    return f'{body[:-1]}{separator}"timings": {json.dumps(timings.as_dict())}}}'
+
+
+def validate_top_k(top_k, clf):
+    """
+    候補数top_kが正の整数であることを確認し、クラス数を上限にして返します。
+    """
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        raise Exception(f"top_kは正の整数である必要があります: {top_k!r}")
+
+    from inference_engine import as_engine
+
+    return min(top_k, len(as_engine(clf).classes))
+
+
+def handle_request(line, clf, cache=None):
+    """
+    常駐モードの1リクエスト（JSON 1行）を処理し、応答の辞書を返します。
+    リクエストの request_id は応答にそのまま含めます。
+    "timings": true のリクエスト（または PREDICT_TIMINGS 指定時）は、
+    応答の "timings" に計測中のTimingsを入れて返します（dumps_responseで出力）。
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return {"id": None, "error": f"リクエストのJSONが不正です: {str(e)}"}
+
+    if not isinstance(request, dict):
+        return {"id": None, "error": "リクエストはJSONオブジェクトである必要があります"}
+
+    response = {"id": request.get("id")}
+    if request.get("request_id") is not None:
+        response["request_id"] = request["request_id"]
+    timings = Timings() if request.get("timings", TIMINGS) else None
+    if timings is not None:
+        response["timings"] = timings
+    image_path = request.get("image_path")
+    image_paths = request.get("image_paths")
+    top_k = request.get("top_k", TOP_K)
+
+    try:
+        top_k = validate_top_k(top_k, clf)
+        if image_paths is not None:
+            if not isinstance(image_paths, list):
+                raise Exception("image_pathsはリストである必要があります")
+            response["results"] = predict_batch(
+                image_paths, clf=clf, top_k=top_k, cache=cache, timings=timings
+            )
+            return response
+
+        if not image_path:
+            raise Exception("image_pathが指定されていません")
+        if not os.path.exists(image_path):
+            raise Exception(f"画像ファイルが見つかりません: {image_path}")
+
+        response.update(
+            predict_digit(
+                image_path, clf=clf, top_k=top_k, cache=cache, timings=timings
+            )
+        )
+
+    except Exception as e:
+        response["error"] = str(e)
+
+    return response
+
+
+def serve(input_stream=None, output_stream=None, cache=None):
+    """
+    常駐ワーカーモード。モデルを一度だけ読み込み、標準入力から改行区切りの
+    JSONリクエスト {"id": ..., "image_path": ...} を受け取り、
+    1リクエストにつき1行のJSON応答を標準出力へ書き出します。
+    {"id": ..., "image_paths": [...]} の場合はまとめて推論し、
+    {"id": ..., "results": [...]} を返します。
+    cacheにResultCacheを指定すると、モデルファイルが更新されるまで結果を再利用します。
+    モデルが再公開されるとバックグラウンドで読み込み、次のリクエストから切り替えます。
+    入力がEOFに達すると終了します。
+    """
+    from model_store import ReloadingModel
+    from profiling import maybe_profile
+
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout
+
+    reload_interval = env_number("PREDICT_RELOAD_INTERVAL", RELOAD_INTERVAL, float)
+    model = ReloadingModel(load_model, model_fingerprint, poll_interval=reload_interval)
+    logger.debug("常駐モードでリクエスト待機中")
+
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+
+        # リクエストの処理中はここで取得したモデルを使い続ける
+        clf, version = model.get()
+        if cache is not None:
+            cache.bind_model(version)
+        # プロファイリングはリクエスト単位（ML_PROFILE_SAMPLE_RATEなどで間引く）
+        with maybe_profile("serve"):
+            response = handle_request(line, clf, cache)
+        timings = response.pop("timings", None)
+        output_stream.write(dumps_response(response, timings) + "\n")
+        output_stream.flush()
+
+
+class _JSONArgumentParser(argparse.ArgumentParser):
+    """
+    引数エラーを他のエラーと同じくJSONで出力する引数パーサー。
+    """
+
+    def error(self, message):
+        print(json.dumps({"error": f"{USAGE} ({message})"}))
+        sys.exit(1)
+
+
+def collect_image_paths(paths):
+    """
+    引数のパスを展開し、ディレクトリの場合は中の画像ファイルを名前順に列挙します。
+    """
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            image_paths.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+def predict_many(image_paths, output_stream=None, top_k=TOP_K, cache=None):
+    """
+    複数画像をまとめて推論し、1画像につき1行のJSONを出力します。
+    """
+    output_stream = output_stream or sys.stdout
+    clf = load_model()
+    if cache is not None:
+        cache.bind_model(model_fingerprint())
+
+    for path, result in zip(
+        image_paths, iter_predictions(image_paths, clf=clf, top_k=top_k, cache=cache)
+    ):
+        output_stream.write(json.dumps({"path": path, **result}) + "\n")
+    output_stream.flush()
+
+
+class _ImportTimer:
+    """
+    --startup-report用に、新たにモジュールを読み込んだimport文の所要時間を記録し、
+    python -X importtime と同様に自身の時間と累積時間を出力します。
+    """
+
+    def __init__(self):
+        self.records = []
+        self._depth = 0
+        self._original_import = None
+        self._start = time.perf_counter()
+
+    def install(self):
+        import builtins
+
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        import builtins
+
+        builtins.__import__ = self._original_import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = name
+        if level:
+            package = (globals or {}).get("__package__") or ""
+            base = package.rsplit(".", level - 1)[0] if level > 1 else package
+            module_name = f"{base}.{name}" if name else base
+        # "from パッケージ import サブモジュール" はサブモジュール名で記録する
+        if fromlist and len(fromlist) == 1 and module_name in sys.modules:
+            module_name = f"{module_name}.{fromlist[0]}"
+
+        loaded = len(sys.modules)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._depth -= 1
+            if len(sys.modules) > loaded:
+                self.records.append((self._depth, module_name, elapsed))
+
+    def report(self, stream):
+        # 記録は子→親の順（後順）に並ぶため、直前の子の累積時間を差し引いて自身の時間を求める
+        stack = []
+        print("import time: self [us] | cumulative | imported package", file=stream)
+        for depth, name, cumulative in self.records:
+            children = 0.0
+            while stack and stack[-1][0] > depth:
+                children += stack.pop()[1]
+            stack.append((depth, cumulative))
+            print(
+                f"import time: {(cumulative - children) * 1e6:>9.0f} |"
+                f" {cumulative * 1e6:>10.0f} | {'  ' * depth}{name}",
+                file=stream,
+            )
+
+        imports = sum(cumulative for depth, _, cumulative in self.records if depth == 0)
+        total = time.perf_counter() - self._start
+        print(
+            f"startup: インポート合計 {imports * 1e3:.1f}ms"
+            f" / 全体 {total * 1e3:.1f}ms",
+            file=stream,
+        )
+
+
 def main():
     """
     コマンドライン引数から画像パスを受け取り、予測結果をJSON出力します。
+    複数のパスまたはディレクトリを指定した場合は1画像につき1行のJSONを出力します。
+    --serve を指定した場合は常駐ワーカーモードで起動します。
+    --startup-report を指定すると、インポートごとの所要時間を標準エラーに出力します。
+    --timings を指定すると、1枚の画像の結果に処理段階ごとの所要時間を含めます。
+    --request-id で指定した値は結果のJSONにそのまま含めます。
+    ログのレベルは環境変数 PREDICT_LOG_LEVEL で指定します（既定: WARNING）。
+    環境変数 ML_PROFILE を設定するとcProfile / tracemallocで計測します（profiling.py）。
     """
-    if len(sys.argv) != 2:
-        print(json.dumps({"error": "使用方法: python predict.py <画像ファイルパス>"}))
-        sys.exit(1)
+    parser = _JSONArgumentParser(usage=USAGE, add_help=False)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--startup-report", action="store_true")
+    parser.add_argument("--cache-size", type=int)
+    parser.add_argument("--cache-ttl", type=float)
+    parser.add_argument("--timings", action="store_true", default=TIMINGS)
+    parser.add_argument("--request-id")
+    args = parser.parse_args()
+
+    # ライブラリ（PILなど）のログはWARNING以上のみ、このスクリプトのログはLOG_LEVELで出力
+    logging.basicConfig(format="%(levelname)s: %(message)s", stream=sys.stderr)
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.WARNING))
+
+    if args.cache_size is None:
+        args.cache_size = env_number("PREDICT_CACHE_SIZE", CACHE_SIZE, int)
+    if args.cache_ttl is None:
+        args.cache_ttl = env_number("PREDICT_CACHE_TTL", CACHE_TTL, float)
+
+    from profiling import maybe_profile
+
+    # 常駐モードはリクエストごとに計測する（serveを参照）
+    profile = contextlib.nullcontext() if args.serve else maybe_profile("predict")
+
+    if not args.startup_report:
+        with profile:
+            _run(args, parser)
+        return
+
+    timer = _ImportTimer()
+    timer.install()
+    try:
+        with profile:
+            _run(args, parser)
+    finally:
+        timer.uninstall()
+        timer.report(sys.stderr)
+
+
+def env_number(name, default, parse):
+    """
+    環境変数nameをparse（int / float）で読みます。未設定の場合や値が不正な場合は
+    defaultを返します（不正な値は警告を出します）。
+    """
+    value = os.environ.get(name, "")
+    if not value.strip():
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        logger.warning(
+            "環境変数 %s の値が不正なため既定値 %s を使います: %r", name, default, value
+        )
+        return default
+
+
+def _create_cache(args):
+    """
+    --cache-size が正の場合に結果キャッシュを作成します。
+    """
+    if args.cache_size <= 0:
+        return None
+
+    from result_cache import ResultCache
+
+    return ResultCache(max_entries=args.cache_size, ttl=args.cache_ttl)
+
+
+def _run(args, parser):
+
+    if args.serve:
+        try:
+            serve(cache=_create_cache(args))
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+        return
+
+    if not args.paths:
+        parser.error("画像ファイルパスが指定されていません")
+    if args.top_k < 1:
+        parser.error("--top-k は1以上で指定してください")
+
+    if len(args.paths) > 1 or os.path.isdir(args.paths[0]):
+        try:
+            predict_many(
+                collect_image_paths(args.paths),
+                top_k=args.top_k,
+                cache=_create_cache(args),
+            )
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
+        return
 
-    image_path = sys.argv[1]
+    image_path = args.paths[0]
+    timings = Timings() if args.timings else None
 
     try:
-        print(f"DEBUG: メイン関数開始 - 引数: {image_path}", file=sys.stderr)
+        logger.debug("メイン関数開始 - 引数: %s", image_path)
 
         if not os.path.exists(image_path):
-            print(f"DEBUG: ファイルが見つかりません: {image_path}", file=sys.stderr)
+            logger.debug("ファイルが見つかりません: %s", image_path)
             raise Exception(f"画像ファイルが見つかりません: {image_path}")
 
-        file_size = os.path.getsize(image_path)
-        print(f"DEBUG: ファイル確認 - サイズ: {file_size} bytes", file=sys.stderr)
+        logger.debug("ファイル確認 - サイズ: %d bytes", os.path.getsize(image_path))
 
-        result = predict_digit(image_path)
-        print(f"DEBUG: 最終結果: {result}", file=sys.stderr)
-        print(json.dumps(result))
+        result = predict_digit(image_path, top_k=args.top_k, timings=timings)
+        logger.debug("最終結果: %s", result)
+        print(dumps_response(result, timings, args.request_id))
 
     except Exception as e:
-        print(f"DEBUG: メイン関数エラー: {str(e)}", file=sys.stderr)
-        print(json.dumps({"error": str(e)}))
+        logger.debug("メイン関数エラー: %s", e)
+        print(dumps_response({"error": str(e)}, request_id=args.request_id))
         sys.exit(1)
 
 
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+環境変数で有効にするcProfile / tracemallocのプロファイリング。
+
+predict.py と各 train_*.py は処理を maybe_profile() で囲んでおり、
+次の環境変数を設定したときだけ計測して結果をファイルに書き出します。
+
+    ML_PROFILE               cprofile, tracemalloc（カンマ区切りで両方も可）
+    ML_PROFILE_DIR           出力先ディレクトリ（既定: ml/profiles）
+    ML_PROFILE_SAMPLE_RATE   計測する割合 0-1（既定: 1）
+    ML_PROFILE_MIN_INTERVAL  前回の計測から最低限空ける秒数（既定: 0）
+    ML_PROFILE_TOP           メモリ確保の上位何件を書き出すか（既定: 25）
+
+cProfileの結果は <名前>-<時刻>-<pid>.prof に、tracemallocの結果は
+同名の -alloc.txt に書き出します。ML_PROFILE_MIN_INTERVAL は出力先の
+.last_profile の更新時刻で判定するため、リクエストごとに起動される
+プロセス間でも間隔が守られます。.profは次のコマンドで確認できます。
+
+    python profiling.py profiles/predict-....prof
+"""
+
+import contextlib
+import os
+import random
+import sys
+import time
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PROFILE_DIR = os.path.join(ML_DIR, "profiles")
+MODES = ("cprofile", "tracemalloc")
+
+# 出力済みの警告（常駐プロセスでリクエストごとに同じ警告を出さないため）
+_warned = set()
+
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(f"警告: {message}", file=sys.stderr)
+
+
+def profile_modes():
+    """
+    環境変数 ML_PROFILE から有効なモードの集合を返します。
+    """
+    value = os.environ.get("ML_PROFILE", "")
+    modes = {mode.strip().lower() for mode in value.split(",") if mode.strip()}
+    unknown = modes - set(MODES)
+    if unknown:
+        # 予測を止めないよう、未対応のモードは警告して無視する
+        _warn_once(
+            f"未対応のプロファイルモードを無視します: {', '.join(sorted(unknown))}"
+        )
+    return modes & set(MODES)
+
+
+def _should_profile(directory):
+    """
+    サンプリング割合と最低間隔から、今回計測するかどうかを決めます。
+    """
+    sample_rate = float(os.environ.get("ML_PROFILE_SAMPLE_RATE", "1"))
+    if random.random() >= sample_rate:
+        return False
+
+    min_interval = float(os.environ.get("ML_PROFILE_MIN_INTERVAL", "0"))
+    if min_interval > 0:
+        marker = os.path.join(directory, ".last_profile")
+        try:
+            if time.time() - os.path.getmtime(marker) < min_interval:
+                return False
+        except FileNotFoundError:
+            pass
+        with open(marker, "a"):
+            pass
+        os.utime(marker)
+    return True
+
+
+def maybe_profile(name):
+    """
+    ML_PROFILE が設定されていて、サンプリングと間隔の条件を満たす場合に
+    処理を計測するコンテキストマネージャを返します。それ以外は何もしません。
+    設定の値が不正な場合や出力先に書き込めない場合も、警告を1回だけ出して何もしません。
+    """
+    modes = profile_modes()
+    if not modes:
+        return contextlib.nullcontext()
+
+    directory = os.environ.get("ML_PROFILE_DIR") or DEFAULT_PROFILE_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if not _should_profile(directory):
+            return contextlib.nullcontext()
+        top = int(os.environ.get("ML_PROFILE_TOP", "25"))
+    except (ValueError, OSError) as e:
+        # 設定の誤りや書き込めない出力先で予測を止めないよう、警告して計測しない
+        _warn_once(f"プロファイリングの設定が不正なため計測しません: {e}")
+        return contextlib.nullcontext()
+
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 10**9:09d}"
+    prefix = os.path.join(directory, f"{name}-{stamp}-{os.getpid()}")
+    return _profile(prefix, modes, top)
+
+
+@contextlib.contextmanager
+def _profile(prefix, modes, top):
+    profiler = None
+    if "tracemalloc" in modes:
+        import tracemalloc
+
+        tracemalloc.start()
+    if "cprofile" in modes:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        # 結果を書き出せなくても計測した処理の結果や例外を失わないよう、警告だけ出す
+        try:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(f"{prefix}.prof")
+            if "tracemalloc" in modes:
+                _write_allocations(f"{prefix}-alloc.txt", top)
+        except OSError as e:
+            _warn_once(
+                "プロファイルの結果を書き出せません: "
+                f"{os.path.dirname(prefix)} ({e.strerror})"
+            )
+        finally:
+            if "tracemalloc" in modes:
+                tracemalloc.stop()
+
+
+def _write_allocations(path, top):
+    """
+    tracemallocのスナップショットから、確保量の多い行の上位top件を書き出します。
+    """
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "*/cProfile.py"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+    )
+    current, peak = tracemalloc.get_traced_memory()
+
+    with open(path, "w") as f:
+        f.write(f"current: {current / 2**20:.2f} MiB / peak: {peak / 2**20:.2f} MiB\n")
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            f.write(
+                f"{stat.size / 2**10:10.1f} KiB {stat.count:8d} blocks  "
+                f"{frame.filename}:{frame.lineno}\n"
+            )
+
+
+def main():
+    """
+    .profファイルの累積時間の上位を表示します。
+    """
+    import argparse
+    import pstats
+
+    parser = argparse.ArgumentParser(description=".profファイルの概要を表示します")
+    parser.add_argument("path", help=".profファイル")
+    parser.add_argument("--top", type=int, default=25, help="表示件数")
+    parser.add_argument("--sort", default="cumulative", help="並び順（pstatsのキー）")
+    args = parser.parse_args()
+
+    pstats.Stats(args.path, stream=sys.stdout).sort_stats(args.sort).print_stats(
+        args.top
+    )
+
+
+if __name__ == "__main__":
+    main()
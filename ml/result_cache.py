@@ -0,0 +1,132 @@
+"""
+予測結果のキャッシュ。
+
+同じ画像の再送信（クライアントの再試行など）で、デコード・前処理・推論を
+繰り返さないようにします。キーは2段階です。
+
+1. 画像ファイルのバイト列のハッシュ（完全に同じファイル）
+2. 28x28に前処理して0-255に量子化した特徴量のハッシュ
+   （再エンコードなどでバイト列は違っても、前処理結果が同じ画像）
+
+各段はTTL付きのLRUで、上限を超えると最も古く使われたエントリを破棄します。
+モデルの識別子（ファイルの更新時刻など）が変わると全件破棄します。
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class _LRU:
+    def __init__(self, max_entries, ttl, clock):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if self.ttl and self.clock() >= expires_at:
+            del self.entries[key]
+            self.expirations += 1
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (self.clock() + (self.ttl or 0), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+class ResultCache:
+    """
+    画像のバイト列と量子化した特徴量をキーにした、予測結果のLRUキャッシュ。
+    ttlは秒単位で、0の場合は期限切れにしません。
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0, clock=time.monotonic):
+        self.by_bytes = _LRU(max_entries, ttl, clock)
+        self.by_features = _LRU(max_entries, ttl, clock)
+        self.model_id = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def bytes_key(data, top_k):
+        return hashlib.sha256(data).hexdigest(), top_k
+
+    @staticmethod
+    def features_key(features, top_k):
+        import numpy as np
+
+        quantized = np.rint(np.asarray(features) * 255.0).astype(np.uint8)
+        return hashlib.sha256(quantized.tobytes()).hexdigest(), top_k
+
+    def bind_model(self, model_id):
+        """
+        現在のモデルの識別子を設定します。前回と異なる場合はキャッシュを全件破棄します。
+        """
+        if model_id != self.model_id:
+            if self.model_id is not None:
+                self.invalidations += 1
+            self.by_bytes.clear()
+            self.by_features.clear()
+            self.model_id = model_id
+
+    def lookup(self, bytes_key=None, features_key=None, record_miss=True):
+        """
+        キャッシュを検索し、(結果, ヒットした段) を返します。見つからない場合は (None, None)。
+        特徴量の段でヒットした場合は、バイト列の段にも登録します。
+        見つからなかった場合はミスとして数えます（後の段でも検索する途中の検索は
+        record_miss=False で数えません）。
+        """
+        if bytes_key is not None:
+            result = self.by_bytes.get(bytes_key)
+            if result is not None:
+                self.hits += 1
+                return result, "bytes"
+
+        if features_key is not None:
+            result = self.by_features.get(features_key)
+            if result is not None:
+                self.hits += 1
+                if bytes_key is not None:
+                    self.by_bytes.put(bytes_key, result)
+                return result, "features"
+
+        if record_miss:
+            self.misses += 1
+        return None, None
+
+    def store(self, result, bytes_key=None, features_key=None):
+        if bytes_key is not None:
+            self.by_bytes.put(bytes_key, result)
+        if features_key is not None:
+            self.by_features.put(features_key, result)
+
+    def metadata(self, level):
+        """
+        予測結果に付加するキャッシュ情報を返します。
+        """
+        return {
+            "hit": level is not None,
+            "level": level,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.by_bytes.entries),
+            "evictions": self.by_bytes.evictions + self.by_features.evictions,
+        }
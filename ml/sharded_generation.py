@@ -0,0 +1,79 @@
+"""
+合成データ生成の並列化。
+
+生成する画像の一覧を固定の大きさのシャードに分け、シャードごとに
+マスターシードから SeedSequence.spawn で導いた np.random.Generator を渡して
+プロセスプールで描画します。シャードの分け方と各シャードの乱数はワーカー数に
+依存しないため、n_jobs を変えても生成結果はビット単位で一致します。
+各シャードの結果は、最初のシャードのdtypeで事前に確保した配列へ順に書き込みます。
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+SHARD_SIZE = 100
+
+
+def add_generation_arguments(parser):
+    """
+    訓練スクリプトの引数パーサーにデータ生成の引数を追加します。
+    """
+    parser.add_argument("--seed", type=int, default=0, help="データ生成の乱数シード")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="データ生成と --model ovo の訓練に使うプロセス数（既定: CPUコア数）",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="生成済みデータセットのキャッシュ（dataset_cache.py）を使わない",
+    )
+
+
+def _render_shard(render, tasks, seed_sequence):
+    return render(tasks, np.random.default_rng(seed_sequence))
+
+
+def generate_sharded(render, tasks, seed=0, n_jobs=1, shard_size=SHARD_SIZE):
+    """
+    tasksをshard_size件ずつのシャードに分けて render(tasks, rng) を呼び出し、
+    返された (data, labels) をtasksの順に連結して返します。
+    renderはタスク1件につき1行のdata（通常はuint8の画素値）を返してください。
+    seedには整数またはSeedSequenceを指定します。n_jobsがNoneの場合は
+    CPUコア数のプロセスを使い、1の場合は同じプロセスで実行します。
+    renderはプロセス間で受け渡せるよう、モジュールの関数にしてください。
+    """
+    tasks = list(tasks)
+    shards = [tasks[i : i + shard_size] for i in range(0, len(tasks), shard_size)]
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(shards))
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(shards))
+    if n_jobs <= 1:
+        return _assemble(map(_render_shard, repeat(render), shards, seeds), len(tasks))
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        results = executor.map(_render_shard, repeat(render), shards, seeds)
+        return _assemble(results, len(tasks))
+
+
+def _assemble(results, n):
+    """
+    シャードの (data, labels) を順に、事前に確保した配列へ書き込みます。
+    """
+    data = labels = None
+    offset = 0
+    for shard_data, shard_labels in results:
+        if data is None:
+            data = np.empty((n,) + shard_data.shape[1:], dtype=shard_data.dtype)
+            labels = np.empty(n, dtype=np.asarray(shard_labels).dtype)
+        data[offset : offset + len(shard_data)] = shard_data
+        labels[offset : offset + len(shard_data)] = shard_labels
+        offset += len(shard_data)
+    return data, labels
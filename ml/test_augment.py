@@ -0,0 +1,90 @@
+"""
+augment.py のバッチ拡張のテスト。
+"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from augment import add_noise, augment, augmented_batches, rotate, shift, thicken
+
+
+def _random_images(n, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (n, 28, 28), dtype=np.uint8)
+
+
+def test_empty_batch():
+    images = np.zeros((0, 28, 28), dtype=np.uint8)
+    assert rotate(images, 5).shape == (0, 28, 28)
+
+    augmented = augment(
+        images,
+        np.random.default_rng(0),
+        max_shift=2,
+        max_angle=10,
+        elastic_alpha=8.0,
+        max_thickness=1,
+        noise_std=5.0,
+    )
+    assert augmented.shape == (0, 28, 28)
+    assert augmented.dtype == np.uint8
+
+
+@pytest.mark.parametrize("angle", [-15, -7, 0, 3, 10, 45])
+def test_rotate_matches_pil(angle):
+    images = _random_images(3)
+    expected = [
+        np.asarray(Image.fromarray(image).rotate(angle, fillcolor=0))
+        for image in images
+    ]
+    np.testing.assert_array_equal(rotate(images, angle), expected)
+
+
+def test_shift_fills_edges_with_zeros():
+    images = np.full((2, 28, 28), 255, dtype=np.uint8)
+    shifted = shift(images, [2, -3], [-1, 0])
+
+    # 1枚目: 右に2画素・上に1画素
+    assert not shifted[0, :, :2].any()
+    assert not shifted[0, -1:, :].any()
+    assert (shifted[0, :-1, 2:] == 255).all()
+    # 2枚目: 左に3画素
+    assert not shifted[1, :, -3:].any()
+    assert (shifted[1, :, :-3] == 255).all()
+
+
+def test_thicken_applies_iterations_per_sample():
+    images = np.zeros((3, 28, 28), dtype=np.uint8)
+    images[:, 14, 14] = 255
+    thickened = thicken(images, [0, 1, 2])
+
+    np.testing.assert_array_equal(thickened[0], images[0])
+    assert (thickened[1] == 255).sum() == 3 * 3
+    assert (thickened[2] == 255).sum() == 5 * 5
+
+
+@pytest.mark.parametrize("dtype, high", [(np.uint8, 255), (np.float32, 1.0)])
+def test_add_noise_keeps_dtype_and_range(dtype, high):
+    images = np.zeros((4, 28, 28), dtype=dtype)
+    images[:2] = high
+    noisy = add_noise(images, [0, 50, 0, 50], np.random.default_rng(0))
+
+    assert noisy.dtype == dtype
+    assert noisy.min() >= 0 and noisy.max() <= high
+    np.testing.assert_array_equal(noisy[[0, 2]], images[[0, 2]])
+    assert (noisy[[1, 3]] != images[[1, 3]]).any()
+
+
+def test_augmented_batches_cover_each_index_once_per_epoch():
+    n = 23
+    images = np.zeros((n, 28, 28), dtype=np.uint8)
+    labels = np.arange(n)
+
+    batches = list(
+        augmented_batches(images, labels, 5, np.random.default_rng(0), epochs=2)
+    )
+    seen = np.concatenate([y for _, y in batches])
+    assert len(seen) == 2 * n
+    np.testing.assert_array_equal(np.sort(seen[:n]), labels)
+    np.testing.assert_array_equal(np.sort(seen[n:]), labels)
+    assert all(X.dtype == np.float32 and X.shape[1] == 784 for X, _ in batches)
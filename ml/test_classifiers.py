@@ -0,0 +1,37 @@
+"""
+classifiers.py の分類器の構成のテスト。
+"""
+
+import numpy as np
+import pytest
+from sklearn.decomposition import PCA
+
+from classifiers import build_classifier, scale_gamma
+from inference_engine import ApproxKernelEngine, ProjectedEngine, as_engine
+
+
+@pytest.mark.parametrize("model_type", ["rff", "nystroem"])
+def test_pca_is_fitted_once_for_approximate_kernels(model_type, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    y = np.arange(200) % 10
+
+    fits = []
+    original = PCA.fit_transform
+
+    def counting_fit_transform(self, *args, **kwargs):
+        fits.append(self)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(PCA, "fit_transform", counting_fit_transform)
+    clf = build_classifier(model_type, X, n_components=50, pca=16).fit(X, y)
+    assert len(fits) == 1
+
+    # gammaは射影後のデータから求め、推論時は射影と近似カーネルのエンジンになる
+    projection = clf.steps[0][1]
+    feature_map = clf.steps[1][1].steps[0][1]
+    assert feature_map.gamma == scale_gamma(projection.transform(X))
+    engine = as_engine(clf)
+    assert isinstance(engine, ProjectedEngine)
+    assert isinstance(engine.engine, ApproxKernelEngine)
+    np.testing.assert_array_equal(engine.scores(X)[0], clf.predict(X))
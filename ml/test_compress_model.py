@@ -0,0 +1,34 @@
+"""
+compress_model.py のサポートベクターの圧縮のテスト。
+"""
+
+import numpy as np
+
+import bench_models
+from classifiers import build_classifier
+from compress_model import compress_engine, report, support_vector_count
+from inference_engine import ProjectedEngine, as_engine, export_model
+
+
+def test_report_for_pca_model(tmp_path, monkeypatch, capsys):
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    y = np.arange(200) % 10
+    clf = build_classifier("svc", X, C=10.0, pca=16).fit(X, y)
+
+    original = as_engine(clf)
+    compressed = compress_engine(clf, ratio=0.5, dtype="uint8")
+    assert isinstance(compressed, ProjectedEngine)
+    assert support_vector_count(compressed) < support_vector_count(original)
+
+    original_path = str(tmp_path / "original.bin")
+    compressed_path = str(tmp_path / "compressed.bin")
+    export_model(original, original_path)
+    export_model(compressed, compressed_path)
+
+    # 比較用のデータ生成は重いため、小さなデータに置き換える
+    monkeypatch.setattr(bench_models, "load_split", lambda seed: (X, X, y, y))
+    report(original, compressed, original_path, compressed_path, seed=0)
+    output = capsys.readouterr().out
+    assert f"{support_vector_count(compressed):>8}" in output
+    assert "精度の差" in output
@@ -0,0 +1,19 @@
+"""
+load_test.py の ServeClient のテスト。
+"""
+
+import pytest
+
+import load_test
+
+
+def test_serve_client_fails_requests_when_workers_cannot_start(monkeypatch):
+    def spawn(self):
+        raise OSError("起動できません")
+
+    monkeypatch.setattr(load_test.ServeClient, "_spawn", spawn)
+    client = load_test.ServeClient(2, env={}, timeout=5.0)
+    for _ in range(3):
+        with pytest.raises(OSError, match="起動できません"):
+            client.predict("5.png")
+    client.close()
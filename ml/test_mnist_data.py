@@ -0,0 +1,111 @@
+"""
+mnist_data.py の読み込みのテスト。小さな合成IDXファイルを一時ディレクトリに作って使います。
+"""
+
+import numpy as np
+import pytest
+
+from mnist_data import (
+    convert,
+    load_mnist,
+    load_subset,
+    read_idx,
+    stratified_subset,
+    write_idx,
+)
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(0)
+    images = rng.integers(0, 256, size=(50, 28, 28), dtype=np.uint8)
+    labels = np.repeat(np.arange(10, dtype=np.uint8), 5)
+    rng.shuffle(labels)
+    return images, labels
+
+
+@pytest.fixture
+def mnist_dir(tmp_path, dataset, monkeypatch):
+    """
+    trainは非圧縮、testは .gz のIDXファイルを置いたディレクトリ。
+    """
+    # .gz を展開したファイルの書き出し先も一時ディレクトリにする
+    monkeypatch.setenv("ML_DATASET_CACHE_DIR", str(tmp_path / "cache"))
+    images, labels = dataset
+    directory = tmp_path / "mnist"
+    directory.mkdir()
+    write_idx(str(directory / "train-images-idx3-ubyte"), images)
+    write_idx(str(directory / "train-labels-idx1-ubyte"), labels)
+    write_idx(str(directory / "t10k-images-idx3-ubyte.gz"), images[:20])
+    write_idx(str(directory / "t10k-labels-idx1-ubyte.gz"), labels[:20])
+    return str(directory)
+
+
+def test_load_raw_idx(mnist_dir, dataset):
+    images, labels = dataset
+    X, y = load_mnist("train", mnist_dir)
+    assert isinstance(X, np.memmap)
+    assert X.shape == (50, 784)
+    np.testing.assert_array_equal(X, images.reshape(50, -1))
+    np.testing.assert_array_equal(y, labels)
+
+
+def test_load_gzipped_idx(mnist_dir, dataset):
+    images, labels = dataset
+    X, y = load_mnist("test", mnist_dir)
+    assert isinstance(X, np.memmap)
+    np.testing.assert_array_equal(X, images[:20].reshape(20, -1))
+    np.testing.assert_array_equal(y, labels[:20])
+
+
+def test_convert_to_npy(mnist_dir, dataset):
+    images, labels = dataset
+    convert(mnist_dir)
+
+    X, y = load_mnist("train", mnist_dir)
+    assert X.filename.endswith("train-images.npy")
+    assert isinstance(X, np.memmap)
+    np.testing.assert_array_equal(X, images.reshape(50, -1))
+    np.testing.assert_array_equal(y, labels)
+
+    X, y = load_mnist("test", mnist_dir)
+    assert X.filename.endswith("test-images.npy")
+    np.testing.assert_array_equal(X, images[:20].reshape(20, -1))
+
+
+def test_stratified_subset_counts(mnist_dir, dataset):
+    images, labels = dataset
+    X, y = load_subset(20, "train", seed=1, directory=mnist_dir)
+    np.testing.assert_array_equal(np.bincount(y, minlength=10), np.full(10, 2))
+
+    index = stratified_subset(labels, 20, seed=1)
+    np.testing.assert_array_equal(X, images.reshape(50, -1)[index])
+
+    # 割り切れない件数は端数の大きいラベルから1件ずつ割り振る
+    uneven = np.array([0] * 6 + [1] * 3 + [2] * 1)
+    counts = np.bincount(uneven[stratified_subset(uneven, 5)], minlength=3)
+    np.testing.assert_array_equal(counts, [3, 2, 0])
+
+    with pytest.raises(ValueError):
+        stratified_subset(labels, 51)
+
+
+def test_rejects_truncated_file(tmp_path, dataset):
+    images, _ = dataset
+    path = str(tmp_path / "truncated")
+    write_idx(path, images)
+    with open(path, "r+b") as f:
+        f.truncate(1000)
+    with pytest.raises(ValueError):
+        read_idx(path)
+
+
+def test_rejects_bad_magic(tmp_path, dataset):
+    images, _ = dataset
+    path = tmp_path / "bad-magic"
+    write_idx(str(path), images)
+    data = bytearray(path.read_bytes())
+    data[2] = 0x42
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        read_idx(str(path))
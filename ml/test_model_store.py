@@ -0,0 +1,65 @@
+"""
+model_store.py のモデル公開のテスト。
+"""
+
+import os
+import time
+
+import numpy as np
+from sklearn import svm
+
+from model_store import ReloadingModel, publish_model, published_model_path
+
+
+def test_overwriting_legacy_pickle_keeps_published_version(tmp_path):
+    models_dir = tmp_path / "models"
+    rng = np.random.default_rng(0)
+    clf = svm.SVC().fit(rng.random((20, 784)), np.arange(20) % 10)
+
+    manifest = publish_model(clf, models_dir=str(models_dir), legacy_dir=str(tmp_path))
+    published = models_dir / manifest["pickle"]
+    legacy = tmp_path / "svm_model.pkl"
+    assert legacy.read_bytes() == published.read_bytes()
+    assert not os.path.samefile(legacy, published)
+
+    # 既存のスクリプトのように svm_model.pkl を直接上書きしても公開済みのモデルは変わらない
+    original = published.read_bytes()
+    with open(legacy, "wb") as f:
+        f.write(b"overwritten")
+    assert published.read_bytes() == original
+    assert published_model_path(manifest, str(models_dir)).endswith(".bin")
+
+
+def _wait_for_reload(model):
+    deadline = time.monotonic() + 5
+    while model._loading and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_failed_reload_is_not_retried_until_republished():
+    state = {"version": "v1", "loads": 0}
+    now = [0.0]
+
+    def load():
+        state["loads"] += 1
+        if state["version"] == "broken":
+            raise Exception("壊れたモデル")
+        return state["version"]
+
+    model = ReloadingModel(
+        load, lambda: state["version"], poll_interval=1.0, clock=lambda: now[0]
+    )
+    state["version"] = "broken"
+    for _ in range(5):
+        now[0] += 1.0
+        assert model.get() == ("v1", "v1")
+        _wait_for_reload(model)
+    # 壊れたモデルの読み込みは1回だけ
+    assert state["loads"] == 2
+
+    state["version"] = "v2"
+    now[0] += 1.0
+    model.get()
+    _wait_for_reload(model)
+    assert model.get() == ("v2", "v2")
+    assert state["loads"] == 3
@@ -0,0 +1,63 @@
+"""
+parallel_svc.py の一対一分類器の並列訓練のテスト。
+"""
+
+import os
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+import pytest
+from sklearn import svm
+
+from parallel_svc import ParallelSVC
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _assert_same_model(clf, reference, X):
+    assert clf.n_features_in_ == reference.n_features_in_
+    np.testing.assert_array_equal(clf.support_, reference.support_)
+    np.testing.assert_array_equal(clf._dual_coef_, reference._dual_coef_)
+    np.testing.assert_array_equal(clf._intercept_, reference._intercept_)
+    np.testing.assert_array_equal(clf.predict(X), reference.predict(X))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+@pytest.mark.parametrize("weighting", [None, "class_weight", "sample_weight"])
+def test_matches_svc(n_jobs, weighting):
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    # class_weight="balanced" が効くよう、クラスごとの件数を偏らせる
+    y = np.minimum(np.arange(200) % 13, 9)
+
+    params = {"C": 10.0}
+    fit_params = {}
+    if weighting == "class_weight":
+        params["class_weight"] = "balanced"
+    elif weighting == "sample_weight":
+        fit_params["sample_weight"] = rng.uniform(0.5, 2.0, len(y))
+
+    reference = svm.SVC(kernel="rbf", **params).fit(X, y, **fit_params)
+    clf = ParallelSVC(n_jobs=n_jobs, **params).fit(X, y, **fit_params)
+    _assert_same_model(clf, reference, X)
+
+
+def test_exports(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    y = np.arange(200) % 10
+    clf = ParallelSVC(C=10.0, n_jobs=1).fit(X, y)
+
+    # export_model.py は n_features_in_ で予測結果の一致を確認する
+    model_path = str(tmp_path / "ovo.pkl")
+    joblib.dump(clf, model_path)
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ML_DIR, "export_model.py"), model_path],
+        capture_output=True,
+        text=True,
+        cwd=ML_DIR,
+    )
+    assert completed.returncode == 0, completed.stdout
+    assert os.path.exists(str(tmp_path / "ovo.bin"))
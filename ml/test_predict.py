@@ -0,0 +1,94 @@
+"""
+predict.py の推論結果の整形のテスト。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import warnings
+
+import numpy as np
+import pytest
+from sklearn import svm
+
+from predict import score_features
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_PATH = os.path.join(ML_DIR, "..", "test", "images", "digits", "5.png")
+
+
+def test_candidate_confidences_are_comparable():
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    y = np.arange(200) % 10
+    clf = svm.SVC(kernel="rbf", C=10.0).fit(X, y)
+
+    for result in score_features(clf, X[:20], top_k=10):
+        confidences = [candidate["confidence"] for candidate in result["top_k"]]
+        assert all(a >= b for a, b in zip(confidences, confidences[1:]))
+        assert sum(confidences) <= 1.0 + 1e-9
+        assert result["top_k"][0]["digit"] == result["digit"]
+        assert 0.5 <= result["confidence"] <= 1.0
+
+
+def test_confidence_does_not_overflow_for_large_scores():
+    from classifiers import build_classifier, fit_classifier
+
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 784))
+    y = np.arange(200) % 10
+    clf = build_classifier("rff", X, n_components=100)
+    fit_classifier(clf, X, y)
+    # 線形分類器の係数を大きくして、スコアの絶対値が exp の範囲を超えるようにする
+    clf.steps[-1][1].coef_ *= 1e4
+    clf.steps[-1][1].intercept_ *= 1e4
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = score_features(clf, X[:20], top_k=3)
+    for result in results:
+        assert 0.0 <= result["confidence"] <= 1.0
+        assert all(np.isfinite(c["confidence"]) for c in result["top_k"])
+
+
+def _serve_request(clf, **request):
+    from predict import handle_request
+
+    request = {"id": "1", "image_path": IMAGE_PATH, **request}
+    return handle_request(json.dumps(request), clf)
+
+
+@pytest.fixture(scope="module")
+def clf():
+    rng = np.random.default_rng(0)
+    return svm.SVC(kernel="rbf", C=10.0).fit(
+        rng.random((200, 784)), np.arange(200) % 10
+    )
+
+
+@pytest.mark.parametrize("top_k", ["3", -1, 0, 2.5, True, None])
+def test_serve_rejects_invalid_top_k(clf, top_k):
+    response = _serve_request(clf, top_k=top_k)
+    assert response["id"] == "1"
+    assert "top_k" in response["error"]
+    assert "digit" not in response
+
+
+def test_serve_caps_top_k_at_class_count(clf):
+    response = _serve_request(clf, top_k=50)
+    assert len(response["top_k"]) == 10
+
+
+def test_invalid_cache_settings_fall_back_to_defaults():
+    env = dict(os.environ, PREDICT_CACHE_SIZE="abc", PREDICT_CACHE_TTL="5m")
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ML_DIR, "predict.py"), "missing.png"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    # インポート時に落ちず、通常どおりJSONのエラーを返す
+    assert "Traceback" not in completed.stderr
+    assert "PREDICT_CACHE_SIZE" in completed.stderr
+    assert "error" in json.loads(completed.stdout)
@@ -0,0 +1,70 @@
+"""
+profiling.py の環境変数の扱いのテスト。
+"""
+
+import contextlib
+import tracemalloc
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def reset_warnings(monkeypatch):
+    monkeypatch.setattr(profiling, "_warned", set())
+
+
+@pytest.mark.parametrize(
+    "name, value",
+    [
+        ("ML_PROFILE_SAMPLE_RATE", "abc"),
+        ("ML_PROFILE_MIN_INTERVAL", "1s"),
+        ("ML_PROFILE_TOP", "many"),
+    ],
+)
+def test_invalid_setting_disables_profiling(name, value, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("ML_PROFILE", "cprofile")
+    monkeypatch.setenv("ML_PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv(name, value)
+
+    for _ in range(3):
+        assert isinstance(profiling.maybe_profile("predict"), contextlib.nullcontext)
+    assert capsys.readouterr().err.count("警告") == 1
+    assert not list(tmp_path.glob("*.prof"))
+
+
+def test_unwritable_directory_disables_profiling(tmp_path, monkeypatch, capsys):
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    monkeypatch.setenv("ML_PROFILE", "cprofile")
+    monkeypatch.setenv("ML_PROFILE_DIR", str(not_a_directory / "profiles"))
+
+    assert isinstance(profiling.maybe_profile("predict"), contextlib.nullcontext)
+    assert "警告" in capsys.readouterr().err
+
+
+def test_unknown_mode_is_warned_once(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("ML_PROFILE", "cprofile,heap")
+    monkeypatch.setenv("ML_PROFILE_DIR", str(tmp_path))
+
+    for _ in range(3):
+        with profiling.maybe_profile("serve"):
+            pass
+    assert capsys.readouterr().err.count("heap") == 1
+    assert len(list(tmp_path.glob("serve-*.prof"))) == 3
+
+
+def test_unwritable_output_does_not_break_profiled_code(tmp_path, monkeypatch, capsys):
+    directory = tmp_path / "profiles"
+    monkeypatch.setenv("ML_PROFILE", "cprofile,tracemalloc")
+    monkeypatch.setenv("ML_PROFILE_DIR", str(directory))
+
+    for _ in range(3):
+        with profiling.maybe_profile("serve"):
+            # 計測中に出力先が消えても、処理は最後まで実行される
+            directory.rmdir()
+        directory.mkdir()
+        assert not tracemalloc.is_tracing()
+    assert capsys.readouterr().err.count("警告") == 1
+    assert not list(directory.iterdir())
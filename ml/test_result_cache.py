@@ -0,0 +1,26 @@
+"""
+result_cache.py のヒット・ミスの集計のテスト。
+"""
+
+import numpy as np
+
+from result_cache import ResultCache
+
+
+def test_miss_is_counted_even_if_result_is_never_stored():
+    cache = ResultCache()
+    bytes_key = cache.bytes_key(b"image", 3)
+    features_key = cache.features_key(np.zeros(784), 3)
+
+    # バイト列の段の検索は途中の検索なので数えず、特徴量の段で外れた時点で数える
+    cache.lookup(bytes_key=bytes_key, record_miss=False)
+    cache.lookup(bytes_key=bytes_key, features_key=features_key)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # 推論が失敗して store() されなくても、ミスは1回のまま
+    cache.lookup(bytes_key=bytes_key, features_key=features_key)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    cache.store({"prediction": 5}, bytes_key=bytes_key, features_key=features_key)
+    assert cache.lookup(bytes_key=bytes_key) == ({"prediction": 5}, "bytes")
+    assert (cache.hits, cache.misses) == (1, 2)
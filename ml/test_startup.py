@@ -0,0 +1,75 @@
+"""
+predict.py の起動処理のテスト。
+
+既定では、重いモジュールを必要になるまで読み込まないこと（遅延インポート）だけを
+確認します。コールドスタート時間をコミット済みのベースライン
+（baselines/startup.json の median_seconds）と比べるテストは実行時間がマシンに
+依存するため benchmark マーカーを付けており、既定では実行しません。
+
+    pytest -m benchmark test_startup.py
+
+中央値がベースラインの (1 + tolerance) 倍（1.0 = 2倍まで）を超えると失敗します。
+ベースラインの更新: python bench_startup.py --update-baseline
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bench_startup import DEFAULT_TOLERANCE, load_baseline, measure_reference
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ("numpy", "PIL", "sklearn", "joblib", "scipy")
+
+
+def _loaded_heavy_modules(code):
+    """
+    新しいプロセスでcodeを実行した後に読み込まれている重いモジュールを返します。
+    """
+    script = (
+        "import json, sys\n"
+        f"{code}\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        cwd=ML_DIR,
+    )
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_heavy_modules():
+    assert _loaded_heavy_modules("import predict") == []
+
+
+def test_missing_file_does_not_load_heavy_modules():
+    code = (
+        "import predict\n"
+        "sys.argv = ['predict.py', 'missing.png']\n"
+        "try:\n"
+        "    predict.main()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+    )
+    assert _loaded_heavy_modules(code) == []
+
+
+@pytest.mark.benchmark
+def test_cold_start_within_baseline():
+    baseline = load_baseline()
+    assert baseline is not None, "baselines/startup.json がコミットされていません"
+
+    median = measure_reference(runs=5)
+    limit = baseline["median_seconds"] * (
+        1 + baseline.get("tolerance", DEFAULT_TOLERANCE)
+    )
+    assert median <= limit, (
+        f"コールドスタート中央値 {median * 1e3:.1f}ms が"
+        f"上限 {limit * 1e3:.1f}ms を超えています"
+    )
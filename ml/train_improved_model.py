@@ -4,95 +4,72 @@
 より実際のテストデータに近い訓練データを生成
 """
 
+import argparse
 import numpy as np
-from sklearn import svm
-import joblib
-import os
-from PIL import Image, ImageDraw, ImageFont
 
+from classifiers import DEFAULT_COMPONENTS, add_model_arguments, build_classifier
+from dataset_cache import cached_dataset, to_float32
+from glyph_atlas import get_atlas
+from model_store import publish_model
+from profiling import maybe_profile
+from sharded_generation import add_generation_arguments, generate_sharded
 
-def create_font_based_digit(digit, size=(28, 28), variations=1):
+
+def create_font_based_digit(digit, size=(28, 28), variations=1, rng=None):
     """
     フォントベースで数字画像を生成
+    グリフは1回だけ描画してキャッシュし（glyph_atlas）、平行移動・ノイズ・
+    回転は配列演算でまとめて加えます。
+    rngを省略した場合は毎回異なる乱数を使います。
     """
-    images = []
-
-    for _ in range(variations):
-        # 28x28の黒画像を作成
-        img = Image.new("L", size, color=0)
-        draw = ImageDraw.Draw(img)
-
-        # ランダム性を追加
-        x_offset = np.random.randint(-2, 3)
-        y_offset = np.random.randint(-2, 3)
-
-        try:
-            # デフォルトフォントを使用
-            font = ImageFont.load_default()
-
-            # テキストのサイズを取得して中央配置
-            bbox = draw.textbbox((0, 0), str(digit), font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-
-            text_x = (size[0] - text_width) // 2 + x_offset
-            text_y = (size[1] - text_height) // 2 + y_offset
-
-            draw.text((text_x, text_y), str(digit), fill=255, font=font)
-
-        except Exception as e:
-            print(f"フォント描画エラー（数字{digit}）: {e}")
-            # フォールバック: 中央に大きなテキスト
-            draw.text((10 + x_offset, 8 + y_offset), str(digit), fill=255)
-
-        # 軽微なノイズを追加
-        img_array = np.array(img)
-        noise = np.random.normal(0, 5, img_array.shape)
-        img_array = np.clip(img_array + noise, 0, 255)
+    rng = rng or np.random.default_rng()
+    return list(get_atlas(size).render(np.full(variations, digit), rng))
 
-        # 軽微な回転を追加
-        if np.random.random() < 0.3:
-            rotation_angle = np.random.randint(-10, 11)
-            img_rotated = Image.fromarray(img_array.astype(np.uint8))
-            img_rotated = img_rotated.rotate(rotation_angle, fillcolor=0)
-            img_array = np.array(img_rotated)
 
-        images.append(img_array)
-
-    return images
-
-
-def generate_balanced_dataset():
+def generate_balanced_dataset(seed=0, n_jobs=1):
     """
     バランスの取れた訓練データセットを生成
+    画素値はuint8の (N, 784) 配列で返します。
+    seedが同じであれば、n_jobs（プロセス数）によらず同じデータを返します。
     """
     print("改善されたデータセットを生成中...")
 
-    data = []
-    labels = []
+    # 各数字について大量のバリエーションを生成（各数字500サンプル）
+    tasks = [digit for digit in range(10) for _ in range(500)]
+    return generate_sharded(_render_digits, tasks, seed=seed, n_jobs=n_jobs)
 
-    # 各数字について大量のバリエーションを生成
-    for digit in range(10):
-        print(f"数字 {digit} のデータを生成中...")
 
-        # 各数字500サンプル生成
-        digit_images = create_font_based_digit(digit, variations=500)
-
-        for img_array in digit_images:
-            # 正規化してリストに追加
-            img_normalized = img_array.flatten() / 255.0
-            data.append(img_normalized)
-            labels.append(digit)
+def _render_digits(digits, rng):
+    """
+    数字のリストをrngの乱数でまとめて描画します。
+    """
+    # 軽微なノイズと、30%の画像に軽微な回転を加える
+    images = get_atlas().render(digits, rng, noise_std=5.0, rotation_probability=0.3)
 
-    return np.array(data), np.array(labels)
+    # 画素値はuint8のまま返す（訓練の直前にfloat32へ変換する）
+    return images.reshape(len(digits), -1), np.asarray(digits)
 
 
-def train_improved_svm():
+def train_improved_svm(
+    model_type="svc",
+    n_components=DEFAULT_COMPONENTS,
+    pca=None,
+    seed=0,
+    n_jobs=None,
+    use_cache=True,
+):
     """
     改善されたSVMモデルの訓練
     """
     # データセットを生成
-    X, y = generate_balanced_dataset()
+    # 同じ条件で生成済みのデータはキャッシュから読み込む（dataset_cache.py）
+    X, y = cached_dataset(
+        "balanced_dataset",
+        lambda: generate_balanced_dataset(seed=seed, n_jobs=n_jobs),
+        params={"seed": seed},
+        code_files=[__file__],
+        use_cache=use_cache,
+    )
 
     print(f"データセットサイズ: {len(X)} サンプル")
     print("各数字のサンプル数:")
@@ -111,12 +88,21 @@ def train_improved_svm():
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42, stratify=y
     )
+    # uint8のまま分割し、訓練の直前に0〜1のfloat32へ変換する
+    X_train = to_float32(X_train)
+    X_test = to_float32(X_test)
 
     print("SVMモデルを訓練中...")
 
     # SVMモデル
-    clf = svm.SVC(
-        kernel="rbf", gamma="scale", C=1.0, random_state=42, class_weight="balanced"
+    clf = build_classifier(
+        model_type,
+        X_train,
+        C=1.0,
+        class_weight="balanced",
+        n_components=n_components,
+        pca=pca,
+        n_jobs=n_jobs,
     )
 
     # 訓練
@@ -141,17 +127,38 @@ def train_improved_svm():
     cm = confusion_matrix(y_test, y_pred)
     print(cm)
 
-    # モデルを保存
-    model_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
-    joblib.dump(clf, model_path)
-    print(f"\nモデルを保存しました: {model_path}")
+    # バージョン付きで公開し、マニフェストを差し替える
+    # （常駐中のpredict.py --serveは書き込み完了後に新しいモデルへ切り替える）
+    manifest = publish_model(
+        clf,
+        metadata={
+            "model": model_type,
+            "pca": pca,
+            "script": "train_improved_model",
+            "accuracy": test_accuracy,
+        },
+    )
+    print(f"モデルを公開しました: バージョン {manifest['version']}")
 
     return clf, test_accuracy
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_model_arguments(parser)
+    add_generation_arguments(parser)
+    args = parser.parse_args()
+
     try:
-        model, accuracy = train_improved_svm()
+        with maybe_profile("train_improved_model"):
+            model, accuracy = train_improved_svm(
+                args.model,
+                args.components,
+                args.pca,
+                args.seed,
+                args.jobs,
+                not args.no_cache,
+            )
         print(f"\n訓練が完了しました！テスト精度: {accuracy:.4f}")
     except Exception as e:
         print(f"エラーが発生しました: {e}")
@@ -1,38 +1,53 @@
 #!/usr/bin/env python3
 """
 MNISTデータセットで数字認識用のSVMモデルを訓練するスクリプト。
+MNISTはローカルのIDX / .npyファイルから読み込みます（mnist_data.py）。
 """
 
-from sklearn import datasets, svm, metrics
+import argparse
+from sklearn import metrics
 from sklearn.model_selection import train_test_split
-import joblib
 import sys
-import os
 
+from classifiers import DEFAULT_COMPONENTS, add_model_arguments, build_classifier
+from dataset_cache import to_float32
+from mnist_data import load_subset
+from model_store import publish_model
+from profiling import maybe_profile
 
-def train_svm_model():
+
+def train_svm_model(
+    model_type="svc",
+    n_components=DEFAULT_COMPONENTS,
+    pca=None,
+    n_samples=10000,
+    seed=0,
+    mnist_dir=None,
+    n_jobs=None,
+):
     """
     MNISTデータセットでSVMモデルを訓練し、保存します。
+    訓練用の分割から数字の割合を保ったn_samples件を選んで使います。
     """
     print("MNISTデータセットを読み込み中...")
-    mnist = datasets.fetch_openml("mnist_784", version=1, parser="auto")
-    X, y = mnist.data, mnist.target.astype(int)
-
-    X_subset = X[:10000]
-    y_subset = y[:10000]
+    # メモリマップから選んだ行だけをuint8で読み込む
+    X_subset, y_subset = load_subset(n_samples, "train", seed, mnist_dir)
 
     X_train, X_val, y_train, y_val = train_test_split(
-        X_subset, y_subset, test_size=0.2, random_state=42
+        X_subset, y_subset, test_size=0.2, random_state=42, stratify=y_subset
     )
 
     print(f"訓練データセットサイズ: {len(X_train)}")
     print(f"検証データセットサイズ: {len(X_val)}")
 
-    X_train = X_train / 255.0
-    X_val = X_val / 255.0
+    # 訓練の直前に0〜1のfloat32へ変換する
+    X_train = to_float32(X_train)
+    X_val = to_float32(X_val)
 
     print("SVMモデルを訓練中...")
-    clf = svm.SVC(kernel="rbf", gamma="scale", C=10, random_state=42)
+    clf = build_classifier(
+        model_type, X_train, C=10, n_components=n_components, pca=pca, n_jobs=n_jobs
+    )
     clf.fit(X_train, y_train)
 
     y_pred = clf.predict(X_val)
@@ -42,16 +57,52 @@ def train_svm_model():
     print("分類レポート:")
     print(metrics.classification_report(y_val, y_pred))
 
-    model_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
-    joblib.dump(clf, model_path)
-    print(f"モデルを保存しました: {model_path}")
+    # バージョン付きで公開し、マニフェストを差し替える
+    # （常駐中のpredict.py --serveは書き込み完了後に新しいモデルへ切り替える）
+    manifest = publish_model(
+        clf,
+        metadata={
+            "model": model_type,
+            "pca": pca,
+            "script": "train_model",
+            "accuracy": accuracy,
+            "samples": n_samples,
+        },
+    )
+    print(f"モデルを公開しました: バージョン {manifest['version']}")
 
     return clf, accuracy
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_model_arguments(parser)
+    parser.add_argument(
+        "--samples", type=int, default=10000, help="訓練に使うMNISTの件数"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="部分集合の乱数シード")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="--model ovo の訓練に使うプロセス数（既定: CPUコア数）",
+    )
+    parser.add_argument(
+        "--mnist-dir", help="MNISTのディレクトリ（既定: MNIST_DIR または data/mnist）"
+    )
+    args = parser.parse_args()
+
     try:
-        model, accuracy = train_svm_model()
+        with maybe_profile("train_model"):
+            model, accuracy = train_svm_model(
+                args.model,
+                args.components,
+                args.pca,
+                args.samples,
+                args.seed,
+                args.mnist_dir,
+                args.jobs,
+            )
         print(f"訓練が成功しました！ 最終精度: {accuracy:.4f}")
     except Exception as e:
         print(f"訓練中にエラーが発生しました: {e}")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+データセット全体をメモリに載せずに訓練するストリーミング訓練スクリプト。
+
+訓練データをchunk_size件ずつのチャンクとして受け取り、固定した近似カーネルの
+特徴写像（rff / nystroem。最初のチャンクで作成）の上の線形分類器
+（平均化したSGDClassifier）を partial_fit で少しずつ訓練します。メモリ使用量は
+チャンクの大きさで決まり、訓練するサンプル数には依存しません。
+特徴写像の値は次元数に応じて小さくなりSGDが収束しにくいため、最初のチャンクで
+二乗平均が1になる倍率を求めて掛けてから学習し、公開時に係数へ戻します。
+
+- synthetic: glyph_atlas.py の数字を augment.py で拡張しながら生成し続けます
+- mnist: mnist_data.py のメモリマップから読み、拡張してから使います
+
+--checkpoint-every チャンクごとに訓練の状態を models/streaming-checkpoint.pkl に
+書き出し、--resume で途中から再開できます。各チャンクの乱数は --seed と
+チャンク番号から SeedSequence で導くため、再開しても同じデータで続きを訓練します。
+訓練後のモデル（特徴写像 + 線形分類器のPipeline）は他の訓練スクリプトと同じく
+公開され、predict.py は近似カーネルモデルとして推論します。
+
+    python train_streaming.py --samples 300000 --chunk-size 2000
+    python train_streaming.py --source mnist --samples 600000 --resume
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from augment import augment
+from classifiers import DEFAULT_COMPONENTS, build_classifier
+from dataset_cache import to_float32
+from model_store import MODELS_DIR, atomic_write, publish_model
+from profiling import maybe_profile
+
+CHECKPOINT_PATH = os.path.join(MODELS_DIR, "streaming-checkpoint.pkl")
+# チャンクごとのデータ拡張（augment.augment の引数）
+AUGMENT_PARAMS = {
+    "max_shift": 2,
+    "max_angle": 10,
+    "rotation_probability": 0.3,
+    "elastic_alpha": 8.0,
+    "max_thickness": 1,
+    "noise_std": 5.0,
+}
+# 検証データの件数と、チャンクの乱数と区別するためのキー
+HOLDOUT_SIZE = 2000
+HOLDOUT_KEY = 2**31
+
+
+def _chunk_rng(seed, *key):
+    """
+    seedのSeedSequenceから、keyで決まる子の乱数生成器を返します。
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def synthetic_chunks(chunk_size, seed=0, start=0):
+    """
+    start番目から、拡張したフォントの数字のチャンク (X, y) を生成し続けます。
+    Xは0〜1のfloat32の (chunk_size, 784) 配列です。
+    """
+    from glyph_atlas import get_atlas
+
+    atlas = get_atlas()
+    offsets = np.zeros(chunk_size, dtype=np.intp)
+    step = start
+    while True:
+        rng = _chunk_rng(seed, step)
+        digits = rng.integers(0, 10, size=chunk_size)
+        images = augment(atlas.shifted(digits, offsets, offsets), rng, **AUGMENT_PARAMS)
+        yield to_float32(images.reshape(chunk_size, -1)), digits
+        step += 1
+
+
+def memmap_chunks(images, labels, chunk_size, seed=0, start=0):
+    """
+    メモリマップした (N, 784) のuint8画像から、start番目以降のチャンクを返し続けます。
+    エポックごとに順序をシャッフルし、各チャンクは読み込んでから拡張します。
+    """
+    n = len(images)
+    per_epoch = -(-n // chunk_size)
+    epoch = order = None
+    step = start
+    while True:
+        if step // per_epoch != epoch:
+            epoch = step // per_epoch
+            order = _chunk_rng(seed, HOLDOUT_KEY + 1, epoch).permutation(n)
+        offset = (step % per_epoch) * chunk_size
+        index = np.sort(order[offset : offset + chunk_size])
+        batch = np.asarray(images[index]).reshape(len(index), 28, 28)
+        batch = augment(batch, _chunk_rng(seed, step), **AUGMENT_PARAMS)
+        yield to_float32(batch.reshape(len(index), -1)), np.asarray(labels[index])
+        step += 1
+
+
+def export_pipeline(feature_map, head, feature_scale):
+    """
+    倍率を掛けた特徴で訓練した線形分類器の係数に倍率を掛け戻し、
+    特徴写像と組み合わせたPipeline（classifiers.py の rff / nystroem と同じ構成）を返します。
+    """
+    import copy
+
+    from sklearn.pipeline import Pipeline
+
+    linear = copy.deepcopy(head)
+    linear.coef_ = head.coef_ * feature_scale
+    return Pipeline([("feature_map", feature_map), ("linear", linear)])
+
+
+def load_checkpoint(path):
+    """
+    チェックポイント（特徴写像・線形分類器・倍率・次のチャンク番号・設定）を読み込みます。
+    """
+    import joblib
+
+    return joblib.load(path)
+
+
+def save_checkpoint(path, state):
+    """
+    チェックポイントを一時ファイルからのrenameで書き出します。
+    """
+    import joblib
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    atomic_write(path, lambda tmp_path: joblib.dump(state, tmp_path))
+
+
+def train_streaming(
+    source="synthetic",
+    model_type="rff",
+    n_components=DEFAULT_COMPONENTS,
+    n_samples=300000,
+    chunk_size=2000,
+    seed=0,
+    alpha=1e-5,
+    checkpoint_every=20,
+    checkpoint_path=CHECKPOINT_PATH,
+    resume=False,
+    mnist_dir=None,
+):
+    """
+    チャンクを順に受け取ってモデルを訓練し、公開します。
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    config = {
+        "source": source,
+        "model": model_type,
+        "components": n_components,
+        "chunk_size": chunk_size,
+        "seed": seed,
+        "alpha": alpha,
+    }
+    n_steps = -(-n_samples // chunk_size)
+
+    state = None
+    if resume and os.path.exists(checkpoint_path):
+        state = load_checkpoint(checkpoint_path)
+        if state["config"] != config:
+            raise Exception(
+                f"チェックポイントの設定が異なります: {state['config']}"
+                "（同じ設定で実行するか、--resumeを外してください）"
+            )
+        print(f"チェックポイントから再開します: チャンク {state['step']}")
+    start = state["step"] if state else 0
+
+    if source == "mnist":
+        from mnist_data import load_mnist, load_subset
+
+        images, labels = load_mnist("train", mnist_dir)
+        chunks = memmap_chunks(images, labels, chunk_size, seed, start)
+        holdout_X, holdout_y = load_subset(HOLDOUT_SIZE, "test", seed, mnist_dir)
+        holdout_X = to_float32(holdout_X)
+    else:
+        chunks = synthetic_chunks(chunk_size, seed, start)
+        holdout_X, holdout_y = next(synthetic_chunks(HOLDOUT_SIZE, seed, HOLDOUT_KEY))
+
+    pending = []
+    if state is None:
+        # 特徴写像と倍率は最初のチャンクで決め、以降は固定する
+        first_X, first_y = next(chunks)
+        feature_map = build_classifier(
+            model_type, first_X, n_components=n_components, random_state=seed
+        )[0].fit(first_X)
+        state = {
+            "feature_map": feature_map,
+            "feature_scale": 1.0
+            / np.sqrt(np.mean(feature_map.transform(first_X) ** 2)),
+            "head": SGDClassifier(
+                loss="hinge", alpha=alpha, average=True, random_state=seed
+            ),
+            "step": 0,
+            "config": config,
+        }
+        pending.append((first_X, first_y))
+
+    feature_map, head = state["feature_map"], state["head"]
+    feature_scale = state["feature_scale"]
+    classes = np.arange(10)
+    started = time.perf_counter()
+    print(f"ストリーミング訓練: {n_steps} チャンク × {chunk_size} 件（{source}）")
+
+    for step in range(start, n_steps):
+        X, y = pending.pop() if pending else next(chunks)
+        head.partial_fit(feature_map.transform(X) * feature_scale, y, classes=classes)
+
+        done = step + 1
+        if done % checkpoint_every == 0 or done == n_steps:
+            state["step"] = done
+            save_checkpoint(checkpoint_path, state)
+            accuracy = export_pipeline(feature_map, head, feature_scale).score(
+                holdout_X, holdout_y
+            )
+            rate = (done - start) * chunk_size / (time.perf_counter() - started)
+            print(
+                f"  チャンク {done}/{n_steps}  サンプル {done * chunk_size}  "
+                f"検証精度 {accuracy:.4f}  {rate:.0f} 件/秒"
+            )
+
+    model = export_pipeline(feature_map, head, feature_scale)
+    accuracy = model.score(holdout_X, holdout_y)
+    print(f"検証精度: {accuracy:.4f}")
+
+    # バージョン付きで公開し、マニフェストを差し替える
+    # （常駐中のpredict.py --serveは書き込み完了後に新しいモデルへ切り替える）
+    manifest = publish_model(
+        model,
+        metadata={
+            "model": model_type,
+            "script": "train_streaming",
+            "source": source,
+            "samples": n_steps * chunk_size,
+            "accuracy": accuracy,
+        },
+    )
+    print(f"モデルを公開しました: バージョン {manifest['version']}")
+
+    return model, accuracy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--source",
+        choices=("synthetic", "mnist"),
+        default="synthetic",
+        help="synthetic: 拡張したフォントの数字を生成 / mnist: ローカルのMNIST",
+    )
+    parser.add_argument(
+        "--model",
+        choices=("rff", "nystroem"),
+        default="rff",
+        help="近似カーネルの特徴写像（最初のチャンクで作成して固定）",
+    )
+    parser.add_argument(
+        "--components",
+        type=int,
+        default=DEFAULT_COMPONENTS,
+        help="特徴写像の次元数",
+    )
+    parser.add_argument(
+        "--samples", type=int, default=300000, help="訓練するサンプル数"
+    )
+    parser.add_argument("--chunk-size", type=int, default=2000, help="チャンクの件数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    parser.add_argument("--alpha", type=float, default=1e-5, help="SGDの正則化の強さ")
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=20,
+        help="チェックポイントを書き出す間隔（チャンク数）",
+    )
+    parser.add_argument(
+        "--checkpoint", default=CHECKPOINT_PATH, help="チェックポイントのパス"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="チェックポイントから再開する"
+    )
+    parser.add_argument(
+        "--mnist-dir", help="MNISTのディレクトリ（既定: MNIST_DIR または data/mnist）"
+    )
+    args = parser.parse_args()
+
+    try:
+        with maybe_profile("train_streaming"):
+            model, accuracy = train_streaming(
+                args.source,
+                args.model,
+                args.components,
+                args.samples,
+                args.chunk_size,
+                args.seed,
+                args.alpha,
+                args.checkpoint_every,
+                args.checkpoint,
+                args.resume,
+                args.mnist_dir,
+            )
+        print(f"訓練が完了しました！精度: {accuracy:.4f}")
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        import traceback
+
+        traceback.print_exc()
+        sys.exit(1)
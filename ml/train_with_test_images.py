@@ -4,11 +4,27 @@
 実際のテスト画像の特徴をモデルに学習させる
 """
 
+import argparse
 import numpy as np
-from sklearn import svm
-import joblib
 import os
-from PIL import Image, ImageOps
+from PIL import Image
+
+from augment import add_noise
+from classifiers import (
+    DEFAULT_COMPONENTS,
+    add_model_arguments,
+    build_classifier,
+    fit_classifier,
+)
+from dataset_cache import cached_dataset, to_float32
+from glyph_atlas import get_atlas
+from model_store import publish_model
+from profiling import maybe_profile
+from sharded_generation import add_generation_arguments, generate_sharded
+from predict import preprocess_array
+
+# テスト画像1枚あたりの重み（以前は50回複製していたものと同じ）
+FIXTURE_WEIGHT = 50
 
 
 def preprocess_image_for_training(image_path):
@@ -16,189 +32,236 @@ def preprocess_image_for_training(image_path):
     predict.pyと同じ前処理を適用
     """
     try:
-        image = Image.open(image_path)
-        image = image.convert("L")
+        with Image.open(image_path) as image:
+            return preprocess_array(image)
 
-        # 背景色検出
-        width, height = image.size
-        corner_pixels = [
-            image.getpixel((0, 0)),
-            image.getpixel((width - 1, 0)),
-            image.getpixel((0, height - 1)),
-            image.getpixel((width - 1, height - 1)),
-        ]
-
-        edge_pixels = []
-        for i in range(0, width, max(1, width // 10)):
-            edge_pixels.append(image.getpixel((i, 0)))
-            edge_pixels.append(image.getpixel((i, height - 1)))
-
-        for i in range(0, height, max(1, height // 10)):
-            edge_pixels.append(image.getpixel((0, i)))
-            edge_pixels.append(image.getpixel((width - 1, i)))
-
-        all_pixels = corner_pixels + edge_pixels
-        avg_value = np.mean(all_pixels)
-
-        if avg_value > 127:  # 白背景
-            image = ImageOps.invert(image)
-
-        # 正方形にリサイズ
-        max_dim = max(width, height)
-        square_image = Image.new("L", (max_dim, max_dim), color=0)
-        paste_x = (max_dim - width) // 2
-        paste_y = (max_dim - height) // 2
-        square_image.paste(image, (paste_x, paste_y))
+    except Exception as e:
+        print(f"前処理エラー: {e}")
+        return None
 
-        # 28x28にリサイズ
-        resized_image = square_image.resize((28, 28), Image.Resampling.LANCZOS)
-        image_array = np.array(resized_image)
 
-        # 正規化
-        image_array = image_array.astype(np.float32) / 255.0
+def _preprocess_test_images(image_paths):
+    """
+    テスト画像を前処理し、特徴量と数字のラベルを返します。
+    """
+    features = []
+    labels = []
 
-        return image_array.flatten()
+    for image_path in image_paths:
+        processed = preprocess_image_for_training(image_path)
+        if processed is not None:
+            digit = int(os.path.basename(image_path)[0])
+            features.append(processed)
+            labels.append(digit)
+            print(
+                f"テスト画像 {os.path.basename(image_path)} を読み込みました"
+                f"（数字: {digit}）"
+            )
 
-    except Exception as e:
-        print(f"前処理エラー: {e}")
-        return None
+    return np.array(features).reshape(-1, 28 * 28), np.array(labels)
 
 
-def load_test_images():
+def load_test_images(seed=0, use_cache=True, copies=1, noise_std=0.01):
     """
     テスト画像を読み込んで訓練データに追加
+    前処理済みの特徴量はキャッシュします（dataset_cache.py）。
+    copiesが2以上の場合は各画像をcopies回複製し、標準偏差noise_stdの
+    ノイズを加えたバリエーションにします（1の場合は元の画像のみ）。
     """
     print("テスト画像を読み込み中...")
 
-    test_data = []
-    test_labels = []
+    rng = np.random.default_rng(seed)
 
     # テストディレクトリから画像を読み込み
     test_dir = os.path.join(os.path.dirname(__file__), "..", "test", "images", "digits")
 
+    # 各数字の通常版と黒背景版を読み込み
+    image_paths = []
     for digit in range(10):
-        # 各数字の通常版と黒背景版を読み込み
-        patterns = [f"{digit}.png", f"{digit}_black.png"]
-
-        for pattern in patterns:
+        for pattern in [f"{digit}.png", f"{digit}_black.png"]:
             image_path = os.path.join(test_dir, pattern)
             if os.path.exists(image_path):
-                processed = preprocess_image_for_training(image_path)
-                if processed is not None:
-                    # 同じ画像を複数回追加（重みを増やす）
-                    for _ in range(50):  # 各テスト画像を50回複製
-                        # 軽微なノイズバリエーションを追加
-                        noisy_image = processed + np.random.normal(
-                            0, 0.01, processed.shape
-                        )
-                        noisy_image = np.clip(noisy_image, 0, 1)
+                image_paths.append(image_path)
 
-                        test_data.append(noisy_image)
-                        test_labels.append(digit)
+    features, labels = cached_dataset(
+        "test_image_features",
+        lambda: _preprocess_test_images(image_paths),
+        params={"images": [os.path.basename(path) for path in image_paths]},
+        code_files=[os.path.join(os.path.dirname(__file__), "predict.py")],
+        source_files=image_paths,
+        use_cache=use_cache,
+    )
 
-                    print(f"テスト画像 {pattern} を読み込みました（数字: {digit}）")
+    features = to_float32(features)
+    if copies <= 1:
+        return features, np.asarray(labels)
 
-    return np.array(test_data), np.array(test_labels)
+    # 各テスト画像を複製し、軽微なノイズバリエーションを追加
+    copied = np.repeat(features, copies, axis=0)
+    return add_noise(copied, noise_std, rng), np.repeat(labels, copies)
 
 
-def generate_synthetic_data():
+def add_fixture_arguments(parser):
+    """
+    テスト画像の重み付けの引数を追加します。
+    """
+    parser.add_argument(
+        "--fixture-weight",
+        type=float,
+        default=FIXTURE_WEIGHT,
+        help="テスト画像1枚あたりの合計の重み（合成データ1件が1）",
+    )
+    parser.add_argument(
+        "--fixture-copies",
+        type=int,
+        default=1,
+        help="テスト画像のノイズ付き複製の数（1の場合は複製せず重みだけを付ける）",
+    )
+
+
+def generate_synthetic_data(seed=0, n_jobs=1):
     """
     シンプルな合成データを生成（テスト画像の特徴に近づける）
+    画素値はuint8の (N, 784) 配列で返します。
+    seedが同じであれば、n_jobs（プロセス数）によらず同じデータを返します。
     """
     print("合成データを生成中...")
 
-    from PIL import ImageDraw, ImageFont
+    # 各数字100パターン
+    tasks = [digit for digit in range(10) for _ in range(100)]
+    return generate_sharded(_render_digits, tasks, seed=seed, n_jobs=n_jobs)
 
-    data = []
-    labels = []
 
-    for digit in range(10):
-        for variation in range(100):  # 各数字100パターン
-            # 28x28の黒画像
-            img = Image.new("L", (28, 28), color=0)
-            draw = ImageDraw.Draw(img)
-
-            # ランダム性
-            x_offset = np.random.randint(-2, 3)
-            y_offset = np.random.randint(-2, 3)
-
-            try:
-                # デフォルトフォントでテキスト描画
-                font = ImageFont.load_default()
-                bbox = draw.textbbox((0, 0), str(digit), font=font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-
-                text_x = (28 - text_width) // 2 + x_offset
-                text_y = (28 - text_height) // 2 + y_offset
-
-                draw.text((text_x, text_y), str(digit), fill=255, font=font)
-
-            except Exception:
-                # フォールバック
-                draw.text((10 + x_offset, 8 + y_offset), str(digit), fill=255)
-
-            # ノイズ追加
-            img_array = np.array(img)
-            noise = np.random.normal(0, 10, img_array.shape)
-            img_array = np.clip(img_array + noise, 0, 255)
-
-            # 正規化
-            img_normalized = img_array.flatten() / 255.0
-            data.append(img_normalized)
-            labels.append(digit)
+def _render_digits(digits, rng):
+    """
+    数字のリストをrngの乱数でまとめて描画します。
+    """
+    # デフォルトフォントのグリフをずらしてノイズを追加（回転なし）
+    images = get_atlas().render(digits, rng, noise_std=10.0, rotation_probability=0)
 
-    return np.array(data), np.array(labels)
+    # 画素値はuint8のまま返す（訓練の直前にfloat32へ変換する）
+    return images.reshape(len(digits), -1), np.asarray(digits)
 
 
-def train_hybrid_model():
+def build_hybrid_dataset(
+    seed=0,
+    n_jobs=None,
+    use_cache=True,
+    fixture_weight=FIXTURE_WEIGHT,
+    fixture_copies=1,
+):
     """
-    テスト画像と合成データを組み合わせたモデルを訓練
+    テスト画像と合成データを結合し、シャッフルした (X, y, sample_weight) を返します。
+    テスト画像は合計の重みがfixture_weightになるよう、fixture_copies枚の
+    複製それぞれにfixture_weight / fixture_copiesの重みを付けます。
+    すべての重みが1の場合、sample_weightはNoneです。
     """
-    # テスト画像を読み込み
-    test_X, test_y = load_test_images()
+    # テスト画像のノイズと合成データで別々の乱数列を使う
+    test_seed, synthetic_seed = np.random.SeedSequence(seed).spawn(2)
 
-    # 合成データを生成
-    synthetic_X, synthetic_y = generate_synthetic_data()
-
-    # データを結合
-    X = np.vstack([test_X, synthetic_X])
+    # テスト画像を読み込み
+    test_X, test_y = load_test_images(test_seed, use_cache, copies=fixture_copies)
+
+    # 合成データを生成（同じ条件で生成済みのデータはキャッシュから読み込む）
+    synthetic_X, synthetic_y = cached_dataset(
+        "synthetic_data",
+        lambda: generate_synthetic_data(synthetic_seed, n_jobs),
+        params={"seed": seed},
+        code_files=[__file__],
+        use_cache=use_cache,
+    )
+
+    # 結合後の配列を確保し、合成データはuint8から直接float32に変換して書き込む
+    n_test = len(test_y)
+    X = np.empty((n_test + len(synthetic_y), test_X.shape[1]), dtype=np.float32)
+    X[:n_test] = test_X
+    X[n_test:] = to_float32(synthetic_X)
     y = np.hstack([test_y, synthetic_y])
+    weights = np.ones(len(y))
+    weights[: len(test_y)] = fixture_weight / max(fixture_copies, 1)
 
     print(f"合計データセットサイズ: {len(X)} サンプル")
-    print("各数字のサンプル数:")
+    print("各数字の重み（サンプル数）:")
     for i in range(10):
-        count = np.sum(y == i)
-        print(f"  数字 {i}: {count} サンプル")
+        mask = y == i
+        print(f"  数字 {i}: {weights[mask].sum():g}（{np.sum(mask)} サンプル）")
 
     # データをシャッフル
     from sklearn.utils import shuffle
 
-    X, y = shuffle(X, y, random_state=42)
+    X, y, weights = shuffle(X, y, weights, random_state=42)
+    return X, y, None if np.all(weights == 1) else weights
+
+
+def train_hybrid_model(
+    model_type="svc",
+    n_components=DEFAULT_COMPONENTS,
+    pca=None,
+    seed=0,
+    n_jobs=None,
+    use_cache=True,
+    fixture_weight=FIXTURE_WEIGHT,
+    fixture_copies=1,
+):
+    """
+    テスト画像と合成データを組み合わせたモデルを訓練
+    テスト画像は既定では複製せず、sample_weightで重みを付けます。
+    """
+    X, y, weights = build_hybrid_dataset(
+        seed, n_jobs, use_cache, fixture_weight, fixture_copies
+    )
 
     print("SVMモデルを訓練中...")
 
     # SVMモデル
-    clf = svm.SVC(kernel="rbf", gamma="scale", C=1.0, random_state=42)
+    clf = build_classifier(
+        model_type, X, C=1.0, n_components=n_components, pca=pca, n_jobs=n_jobs
+    )
 
     # 訓練
-    clf.fit(X, y)
+    fit_classifier(clf, X, y, sample_weight=weights)
 
-    # 評価
-    accuracy = clf.score(X, y)
+    # 評価（重み付きの訓練精度）
+    accuracy = clf.score(X, y, sample_weight=weights)
     print(f"訓練精度: {accuracy:.4f}")
 
-    # モデルを保存
-    model_path = os.path.join(os.path.dirname(__file__), "svm_model.pkl")
-    joblib.dump(clf, model_path)
-    print(f"モデルを保存しました: {model_path}")
+    # バージョン付きで公開し、マニフェストを差し替える
+    # （常駐中のpredict.py --serveは書き込み完了後に新しいモデルへ切り替える）
+    manifest = publish_model(
+        clf,
+        metadata={
+            "model": model_type,
+            "pca": pca,
+            "script": "train_with_test_images",
+            "accuracy": accuracy,
+            "fixture_weight": fixture_weight,
+            "fixture_copies": fixture_copies,
+        },
+    )
+    print(f"モデルを公開しました: バージョン {manifest['version']}")
 
     return clf, accuracy
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_model_arguments(parser)
+    add_generation_arguments(parser)
+    add_fixture_arguments(parser)
+    args = parser.parse_args()
+
     try:
-        model, accuracy = train_hybrid_model()
+        with maybe_profile("train_with_test_images"):
+            model, accuracy = train_hybrid_model(
+                args.model,
+                args.components,
+                args.pca,
+                args.seed,
+                args.jobs,
+                not args.no_cache,
+                args.fixture_weight,
+                args.fixture_copies,
+            )
         print(f"訓練が完了しました！精度: {accuracy:.4f}")
     except Exception as e:
         print(f"エラーが発生しました: {e}")
@@ -19,7 +19,8 @@ app.use('/api', predictRoute);
 app.get('/api/health', (req, res) => {
   res.json({ 
     status: 'サーバーが実行中です', 
-    timestamp: new Date().toISOString() 
+    timestamp: new Date().toISOString(),
+    python: predictRoute.getPythonStats()
   });
 });
 
@@ -44,6 +45,7 @@ const server = app.listen(PORT, () => {
 
 process.on('SIGTERM', () => {
   console.log('SIGTERM受信: サーバーを正常終了中...');
+  predictRoute.closeWorkerPool();
   server.close(() => {
     console.log('サーバーが正常終了しました');
     process.exit(0);
@@ -52,6 +54,7 @@ process.on('SIGTERM', () => {
 
 process.on('SIGINT', () => {
   console.log('SIGINT受信: サーバーを正常終了中...');
+  predictRoute.closeWorkerPool();
   server.close(() => {
     console.log('サーバーが正常終了しました');
     process.exit(0);
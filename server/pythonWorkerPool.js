@@ -0,0 +1,163 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+const STDERR_TAIL_LIMIT = 4096;
+
+// `predict.py --serve` を常駐させ、改行区切りJSONで予測を依頼するワーカープール
+class PythonWorkerPool {
+  constructor({ pythonPath, scriptPath, size = 2, timeoutMs = 30000 }) {
+    this.pythonPath = pythonPath;
+    this.scriptPath = scriptPath;
+    this.size = Math.max(1, size);
+    this.timeoutMs = timeoutMs;
+    this.workers = [];
+    this.idle = [];
+    this.queue = [];
+    this.nextId = 1;
+    this.closed = false;
+    // これまでに起動したワーカープロセスの数（再起動を含む）
+    this.spawned = 0;
+  }
+
+  predict(imagePath, { requestId } = {}) {
+    if (this.closed) {
+      return Promise.reject(new Error('Pythonワーカープールは終了しています'));
+    }
+
+    return new Promise((resolve, reject) => {
+      this.queue.push({ imagePath, requestId, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    while (this.queue.length > 0) {
+      let worker = this.idle.pop();
+      if (!worker && this.workers.length < this.size) {
+        worker = this.spawnWorker();
+      }
+      if (!worker) {
+        return;
+      }
+      this.runTask(worker, this.queue.shift());
+    }
+  }
+
+  spawnWorker() {
+    const child = spawn(this.pythonPath, [this.scriptPath, '--serve']);
+    const worker = { child, task: null, timer: null, stderr: '' };
+    this.spawned++;
+
+    console.log(`Pythonワーカーを起動しました (pid: ${child.pid})`);
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      this.handleLine(worker, line);
+    });
+
+    child.stderr.on('data', (data) => {
+      worker.stderr = (worker.stderr + data.toString()).slice(-STDERR_TAIL_LIMIT);
+    });
+
+    child.on('exit', (code) => {
+      this.removeWorker(worker, new Error(`Pythonワーカーがコード${code}で終了しました: ${worker.stderr}`));
+    });
+
+    child.on('error', (error) => {
+      this.removeWorker(worker, new Error(`Pythonワーカーの起動に失敗しました: ${error.message}`));
+    });
+
+    // 終了直後のワーカーへの書き込み（EPIPEなど）でサーバーが落ちないようにする
+    child.stdin.on('error', (error) => {
+      child.kill();
+      this.removeWorker(worker, new Error(`Pythonワーカーへの書き込みに失敗しました: ${error.message}`));
+    });
+
+    this.workers.push(worker);
+    return worker;
+  }
+
+  runTask(worker, task) {
+    const id = String(this.nextId++);
+    worker.task = { ...task, id };
+    worker.timer = setTimeout(() => {
+      worker.child.kill();
+      this.removeWorker(worker, new Error(`Pythonワーカーが${this.timeoutMs}ms以内に応答しませんでした`));
+    }, this.timeoutMs);
+
+    const request = { id, image_path: task.imagePath };
+    if (task.requestId) {
+      request.request_id = task.requestId;
+    }
+    worker.child.stdin.write(JSON.stringify(request) + '\n');
+  }
+
+  handleLine(worker, line) {
+    const task = worker.task;
+    if (!task) {
+      return;
+    }
+
+    let result;
+    try {
+      result = JSON.parse(line);
+    } catch (error) {
+      // 不正な出力をしたワーカーは再利用せず、終了させて次のワーカーに任せる
+      worker.child.kill();
+      this.removeWorker(worker, new Error(`Python出力のパースに失敗しました: ${line}`));
+      return;
+    }
+
+    if (result.id !== task.id) {
+      return;
+    }
+
+    this.finishTask(worker);
+    delete result.id;
+    task.resolve(result);
+  }
+
+  finishTask(worker) {
+    clearTimeout(worker.timer);
+    worker.timer = null;
+    worker.task = null;
+
+    if (this.closed) {
+      return;
+    }
+    this.idle.push(worker);
+    this.dispatch();
+  }
+
+  removeWorker(worker, error) {
+    const index = this.workers.indexOf(worker);
+    if (index === -1) {
+      return;
+    }
+
+    this.workers.splice(index, 1);
+    this.idle = this.idle.filter((w) => w !== worker);
+    clearTimeout(worker.timer);
+
+    if (worker.task) {
+      worker.task.reject(error);
+      worker.task = null;
+    }
+
+    // 待機中のリクエストがあれば新しいワーカーで処理を続ける
+    if (!this.closed) {
+      this.dispatch();
+    }
+  }
+
+  close() {
+    this.closed = true;
+    for (const task of this.queue.splice(0)) {
+      task.reject(new Error('Pythonワーカープールは終了しています'));
+    }
+    for (const worker of this.workers) {
+      worker.child.stdin.end();
+    }
+  }
+}
+
+module.exports = PythonWorkerPool;
@@ -5,7 +5,11 @@ const fs = require('fs').promises;
 const fsSync = require('fs');
 const UPLOAD_DIR = path.join(__dirname, '..', 'uploads');
 const { spawn } = require('child_process');
+const crypto = require('crypto');
+const PythonWorkerPool = require('../pythonWorkerPool');
 const router = express.Router();
+// クライアントから受け取るリクエストIDの形式（それ以外は新しく採番する）
+const REQUEST_ID_PATTERN = /^[A-Za-z0-9._-]{1,128}$/;
 const storage = multer.diskStorage({
   destination: async (req, file, cb) => {
     const uploadDir = path.join(__dirname, '..', 'uploads');
@@ -57,24 +61,61 @@ async function validateMagicBytes(filePath) {
   }
 }
 
-function callPythonScript(imagePath) {
+const PYTHON_SCRIPT_PATH = path.join(__dirname, '..', '..', 'ml', 'predict.py');
+const WORKER_POOL_SIZE = parseInt(process.env.PYTHON_WORKER_POOL_SIZE || '0', 10);
+const WORKER_TIMEOUT_MS = parseInt(process.env.PYTHON_WORKER_TIMEOUT_MS || '30000', 10);
+let workerPool = null;
+// これまでに起動したPythonプロセスの数（ワーカープール分は終了したプールも含む）
+let spawnedProcesses = 0;
+let closedPoolProcesses = 0;
+
+function resolvePythonPath() {
+  let pythonPath = process.env.PYTHON_PATH || 'python3';
+
+  if (!path.isAbsolute(pythonPath)) {
+    pythonPath = path.join(__dirname, '..', '..', pythonPath);
+  }
+
+  if (process.platform === 'win32') {
+    const venvPythonWin = path.join(__dirname, '..', '..', 'venv', 'Scripts', 'python.exe');
+    pythonPath = venvPythonWin;
+  }
+
+  return pythonPath;
+}
+
+function getWorkerPool(size) {
+  if (!workerPool) {
+    workerPool = new PythonWorkerPool({
+      pythonPath: resolvePythonPath(),
+      scriptPath: PYTHON_SCRIPT_PATH,
+      size,
+      timeoutMs: WORKER_TIMEOUT_MS
+    });
+  }
+  return workerPool;
+}
+
+function callPythonScript(imagePath, options = {}) {
+  const poolSize = options.poolSize !== undefined ? options.poolSize : WORKER_POOL_SIZE;
+  if (options.pool !== false && poolSize > 0) {
+    return getWorkerPool(poolSize).predict(imagePath, { requestId: options.requestId });
+  }
+
   return new Promise((resolve, reject) => {
-    const pythonScriptPath = path.join(__dirname, '..', '..', 'ml', 'predict.py');
-    let pythonPath = process.env.PYTHON_PATH || 'python3';
-    
-    if (!path.isAbsolute(pythonPath)) {
-      pythonPath = path.join(__dirname, '..', '..', pythonPath);
-    }
-    
-    if (process.platform === 'win32') {
-      const venvPythonWin = path.join(__dirname, '..', '..', 'venv', 'Scripts', 'python.exe');
-      pythonPath = venvPythonWin;
-    }
-    
+    const pythonScriptPath = PYTHON_SCRIPT_PATH;
+    const pythonPath = resolvePythonPath();
+
     console.log(`Python実行パス: ${pythonPath}`);
     console.log(`Pythonスクリプトパス: ${pythonScriptPath}`);
     
-    const pythonProcess = spawn(pythonPath, [pythonScriptPath, imagePath]);
+    const args = [pythonScriptPath, imagePath];
+    if (options.requestId) {
+      // 値が「-」で始まっても引数として解釈されないよう、=で連結して渡す
+      args.push(`--request-id=${options.requestId}`);
+    }
+    const pythonProcess = spawn(pythonPath, args);
+    spawnedProcesses++;
     let stdout = '';
     let stderr = '';
     
@@ -135,6 +176,12 @@ function cleanupFileSync(filePath) {
 
 router.post('/predict', upload.single('image'), async (req, res) => {
   let uploadedFilePath = null;
+  // リクエストIDはPython側の結果にも含まれ、ログの突き合わせに使う
+  const clientRequestId = req.get('X-Request-Id');
+  const requestId = REQUEST_ID_PATTERN.test(clientRequestId || '')
+    ? clientRequestId
+    : crypto.randomUUID();
+  res.set('X-Request-Id', requestId);
   
   try {
     if (!req.file) {
@@ -157,13 +204,16 @@ router.post('/predict', upload.single('image'), async (req, res) => {
     console.log(`ファイルサイズ: ${req.file.size} バイト`);
     console.log(`一意ファイル名: ${path.basename(uploadedFilePath)}`);
     
-    const result = await callPythonScript(uploadedFilePath);
+    const result = await callPythonScript(uploadedFilePath, { requestId });
     
     if (result.error) {
       throw new Error(result.error);
     }
     
-    console.log(`予測結果: ${result.digit} (信頼度: ${result.confidence})`);
+    console.log(`予測結果: ${result.digit} (信頼度: ${result.confidence}) [${requestId}]`);
+    if (result.timings) {
+      console.log(`処理時間 [${requestId}]: ${JSON.stringify(result.timings)}`);
+    }
     
     // Clean up the file before sending response to ensure it's deleted
     const cleanupSuccess = cleanupFileSync(uploadedFilePath);
@@ -173,6 +223,9 @@ router.post('/predict', upload.single('image'), async (req, res) => {
       success: true,
       prediction: result.digit,
       confidence: result.confidence,
+      candidates: result.top_k || [],
+      ...(result.timings && { timings: result.timings }),
+      requestId,
       filename: req.file.originalname,
       fileKey: req.body.fileKey
     });
@@ -182,7 +235,8 @@ router.post('/predict', upload.single('image'), async (req, res) => {
     
     res.status(500).json({
       error: '予測に失敗しました',
-      message: error.message
+      message: error.message,
+      requestId
     });
     
   } finally {
@@ -193,4 +247,17 @@ router.post('/predict', upload.single('image'), async (req, res) => {
   }
 });
 
+router.getPythonStats = () => ({
+  spawned: spawnedProcesses + closedPoolProcesses + (workerPool ? workerPool.spawned : 0),
+  workers: workerPool ? workerPool.workers.length : 0
+});
+
+router.closeWorkerPool = () => {
+  if (workerPool) {
+    closedPoolProcesses += workerPool.spawned;
+    workerPool.close();
+    workerPool = null;
+  }
+};
+
 module.exports = router;
\ No newline at end of file